@@ -0,0 +1,254 @@
+# Alert admission control
+# A distributed flood makes the logger emit a STARTED alert for every new
+# source / target pair, and all of them queue up for the API in front of
+# the few signature hits that matter. Alerts on their way to the API are
+# now split in priority classes, each one rate limited by a token bucket;
+# what a bucket turns away is counted and reported as one "N suppressed"
+# record instead of thousands of rows. The log file still gets every
+# alert (logger.py writes it before the API path).
+
+import threading
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+
+from alert_aggregator import alert_key
+
+
+# ============================================================
+# Classes, buckets, summaries
+# ============================================================
+#   classes     SIGNATURE > BEHAVIOR > SYSTEM (the alert's type; unknown
+#               types rank last). The shipper queues of db_integration.py
+#               are per class and batches take the higher classes first,
+#               so a signature hit waits for other signature hits, not
+#               for the backlog of a flood
+#   buckets     `rate` alerts per second per class, up to `burst` at once;
+#               a STARTED alert (or a SYSTEM event) finding its bucket
+#               empty is suppressed
+#   attacks     the ONGOING / ENDED records of an attack take no token:
+#               they follow their STARTED record's fate, so a row the API
+#               opened for an attack always gets its updates and its end.
+#               The verdicts are kept per attack (attack_id, or the
+#               aggregator's key in "record" storage) until its ENDED
+#               record, at most `max_attacks` (oldest forgotten; an
+#               attack no longer known is let through)
+#   summaries   suppressed alerts, and alerts the shipper queue had to
+#               drop (overflow()), are counted per class with their kinds
+#               and a sample of sources; every `summary_interval` seconds
+#               each class with a count becomes one SYSTEM record
+#               ("N BEHAVIOR alerts suppressed ...")
+# ============================================================
+
+PRIORITIES = ("SIGNATURE", "BEHAVIOR", "SYSTEM")
+_LEVELS = {name: level for level, name in enumerate(PRIORITIES)}
+
+# class -> (alerts per second, burst)
+DEFAULT_LIMITS = {
+    "SIGNATURE": (200.0, 1000),
+    "BEHAVIOR": (50.0, 500),
+    "SYSTEM": (5.0, 50),
+}
+
+CONTINUATIONS = ("ONGOING", "ENDED")
+
+MAX_KINDS = 20
+SAMPLE_SIZE = 10
+
+
+def priority(record):
+    """Priority level of an alert record (0 = highest)."""
+    return _LEVELS.get(record.get("type"), len(PRIORITIES) - 1)
+
+
+def is_continuation(record):
+    """ONGOING / ENDED record of an attack (never rate limited or dropped for room)."""
+    return record.get("status") in CONTINUATIONS
+
+
+def _attack(record):
+    """Key of the attack a record belongs to."""
+    return record.get("attack_id") or alert_key(record.get("type"), record.get("subtype"), record.get("message"),
+                                                record.get("src_ip"), record.get("dst_ip"), record.get("dst_port"))
+
+
+class _Overflow:
+    """Alerts of one class that didn't reach the API since the last summary."""
+    __slots__ = ("count", "kinds", "sources", "first_seen", "last_seen")
+
+    def __init__(self):
+        self.count = 0
+        self.kinds = {}
+        self.sources = []
+        self.first_seen = None
+        self.last_seen = None
+
+    def add(self, record):
+        self.count += 1
+        kind = record.get("subtype") or record.get("pattern") or record.get("message") or "?"
+        if kind in self.kinds or len(self.kinds) < MAX_KINDS:
+            self.kinds[kind] = self.kinds.get(kind, 0) + 1
+        else:
+            self.kinds["other"] = self.kinds.get("other", 0) + 1
+        source = record.get("src_ip")
+        if source and len(self.sources) < SAMPLE_SIZE and source not in self.sources:
+            self.sources.append(source)
+        timestamp = record.get("timestamp")
+        if timestamp:
+            if self.first_seen is None or timestamp < self.first_seen:
+                self.first_seen = timestamp
+            if self.last_seen is None or timestamp > self.last_seen:
+                self.last_seen = timestamp
+
+
+class AlertAdmission:
+    """
+    Per-class token buckets for the alerts sent to the API.
+    """
+    def __init__(self, limits=None, summary_interval=5.0, max_attacks=100000):
+        """
+        Args:
+            limits: class -> (alerts per second, burst); missing classes use DEFAULT_LIMITS,
+                    None as a class's limit lets all of its alerts through
+            summary_interval: seconds between "N suppressed" records of a class
+            max_attacks: attacks whose verdict is remembered for their ONGOING / ENDED records
+        """
+        limits = {**DEFAULT_LIMITS, **(limits or {})}
+        self.limits = [limits.get(name) for name in PRIORITIES]
+        self.summary_interval = summary_interval
+
+        self._tokens = [float(limit[1]) if limit else 0.0 for limit in self.limits]
+        self._refilled = [None] * len(PRIORITIES)
+        self._overflow = [_Overflow() for _ in PRIORITIES]
+        self._summarized_at = None
+        self.max_attacks = max_attacks
+        self._attacks = OrderedDict()   # attack -> its STARTED record was admitted
+        self._lock = threading.Lock()   # the INPUT and FORWARD threads both admit alerts
+
+        # Statistics
+        self.admitted = [0] * len(PRIORITIES)
+        self.suppressed = [0] * len(PRIORITIES)
+        self.overflowed = [0] * len(PRIORITIES)
+        self.continued = [0] * len(PRIORITIES)
+        self.summaries_sent = 0
+
+    def admit(self, record, now):
+        """
+        Take a token from the bucket of the record's class (ONGOING / ENDED
+        records follow their attack's STARTED record instead).
+
+        Args:
+            record: alert record on its way to the API
+            now: time.monotonic()
+
+        Returns:
+            bool: send it; False means it was counted for the next summary
+        """
+        level = priority(record)
+        limit = self.limits[level]
+        status = record.get("status")
+        with self._lock:
+            if status in CONTINUATIONS:
+                attack = _attack(record)
+                admitted = self._attacks.pop(attack, None) if status == "ENDED" else self._attacks.get(attack)
+                if admitted is False:
+                    self.suppressed[level] += 1
+                    self._overflow[level].add(record)
+                    return False
+                self.continued[level] += 1
+                return True
+
+            admitted = True
+            if limit is not None:
+                rate, burst = limit
+                last = self._refilled[level]
+                if last is not None:
+                    self._tokens[level] = min(burst, self._tokens[level] + (now - last) * rate)
+                self._refilled[level] = now
+                admitted = self._tokens[level] >= 1.0
+                if admitted:
+                    self._tokens[level] -= 1.0
+            if status == "STARTED":
+                self._attacks[_attack(record)] = admitted
+                if len(self._attacks) > self.max_attacks:
+                    self._attacks.popitem(last=False)
+            if not admitted:
+                self.suppressed[level] += 1
+                self._overflow[level].add(record)
+                return False
+            self.admitted[level] += 1
+            return True
+
+    def overflow(self, record):
+        """Count an admitted record that had to be dropped afterwards (shipper queue full)."""
+        level = priority(record)
+        with self._lock:
+            self.overflowed[level] += 1
+            self._overflow[level].add(record)
+
+    def summaries(self, now, force=False):
+        """
+        "N suppressed" records of the classes that lost alerts, at most one
+        per class every `summary_interval` seconds.
+
+        Args:
+            now: time.monotonic()
+            force: don't wait for the interval (shutdown)
+
+        Returns:
+            list of (priority level, record)
+        """
+        with self._lock:
+            if self._summarized_at is None:
+                self._summarized_at = now
+            if not force and now - self._summarized_at < self.summary_interval:
+                return []
+            self._summarized_at = now
+
+            records = []
+            for level, overflow in enumerate(self._overflow):
+                if not overflow.count:
+                    continue
+                self._overflow[level] = _Overflow()
+                name = PRIORITIES[level]
+                records.append((level, {
+                    "timestamp": datetime.utcnow().isoformat(),
+                    "status": None,
+                    "type": "SYSTEM",
+                    "subtype": None,
+                    "pattern": None,
+                    "src_ip": "system",
+                    "dst_ip": None,
+                    "src_port": None,
+                    "dst_port": None,
+                    "message": f"{overflow.count} {name} alerts suppressed (alert ingestion overload)",
+                    "details": {
+                        "level": "WARNING",
+                        "class": name,
+                        "suppressed": overflow.count,
+                        "kinds": overflow.kinds,
+                        "src_sample": overflow.sources,
+                        "first_seen": overflow.first_seen,
+                        "last_seen": overflow.last_seen,
+                    },
+                    "uuid": str(uuid.uuid4()),
+                }))
+            self.summaries_sent += len(records)
+            return records
+
+    def get_stats(self):
+        """Get alert admission statistics"""
+        with self._lock:
+            stats = {
+                name: {
+                    'admitted': self.admitted[level],
+                    'suppressed': self.suppressed[level],
+                    'overflowed': self.overflowed[level],
+                    'continued': self.continued[level],
+                    'tokens': round(self._tokens[level], 1) if self.limits[level] else None,
+                }
+                for level, name in enumerate(PRIORITIES)
+            }
+            stats['attacks'] = len(self._attacks)
+            stats['summaries'] = self.summaries_sent
+            return stats
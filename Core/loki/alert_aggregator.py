@@ -0,0 +1,166 @@
+# Alert aggregation
+# Repeats of the same attack are folded into one alert: STARTED the first
+# time, a few ONGOING updates while it lasts, ENDED once it has been quiet
+# for `cooldown` seconds. The INPUT and FORWARD threads raise alerts while
+# the main loop ends them, so the state is split into shards, each behind
+# its own lock: two threads only wait for each other when their alerts
+# land in the same shard.
+
+import heapq
+import itertools
+import threading
+import uuid
+from collections import namedtuple
+
+
+# ============================================================
+# Keys, shards, expiry
+# ============================================================
+# AlertKey identifies one attack. Port scans hit many ports, so their key
+# has dst_port None (one alert per source / target pair); every other
+# alert is per destination port. The grouping follows the subtype, not
+# the wording of the message.
+#
+# A key always lands in the same shard (hash of the key). Each shard has
+#   alerts   key -> state dict (first_seen, last_seen, packet_count...)
+#   expiry   min-heap of (due time, seq, key, state); an entry is pushed
+#            when an alert starts. When it comes due, an alert seen since
+#            is pushed back at last_seen + cooldown, an alert that already
+#            ended is skipped, the others end.
+#
+# expire() and get_stats() merge the shards. A state removed by expire()
+# is no longer reachable from any shard, so the caller reads it without
+# a lock; hit() hands out copies.
+#
+# The shards are plain data (tuples, dicts, numbers): an agent running in
+# its own process keeps its own AlertAggregator, nothing is shared.
+# ============================================================
+
+AlertKey = namedtuple("AlertKey", "type subtype message src_ip dst_ip dst_port")
+
+STARTED = "STARTED"
+ONGOING = "ONGOING"
+
+
+def alert_key(alert_type, subtype, message, src_ip, dst_ip, dst_port):
+    """AlertKey of an alert (port scans are grouped over every destination port)."""
+    return AlertKey(alert_type, subtype, message, src_ip, dst_ip, None if subtype == "PORT_SCAN" else dst_port)
+
+
+class _Shard:
+    __slots__ = ("lock", "alerts", "expiry", "suppressed")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.alerts = {}
+        self.expiry = []
+        self.suppressed = 0
+
+
+class AlertAggregator:
+    """
+    Lock-sharded table of the attacks in progress.
+    """
+    def __init__(self, shards=16, cooldown=10, update_interval=5, max_updates=3):
+        """
+        Args:
+            shards: number of independently locked shards
+            cooldown: seconds without a hit after which an attack has ended
+            update_interval: seconds between ONGOING updates
+            max_updates: ONGOING updates per attack at most
+        """
+        self.cooldown = cooldown
+        self.update_interval = update_interval
+        self.max_updates = max_updates
+        self._shards = [_Shard() for _ in range(shards)]
+        self._seq = itertools.count()   # tie-breaker, heap entries never compare keys
+
+    def _shard(self, key):
+        return self._shards[hash(key) % len(self._shards)]
+
+    def hit(self, key, timestamp, src_port, dst_port, details=None, subtype=None, pattern=None):
+        """
+        Count one occurrence of an alert.
+
+        Returns:
+            (status, state): status is STARTED for the first occurrence,
+            ONGOING when an update is due and None when the repeat is
+            suppressed; state is a copy of the alert state after this hit
+            (its details are copied too unless suppressed)
+        """
+        shard = self._shard(key)
+        with shard.lock:
+            state = shard.alerts.get(key)
+            if state is None:
+                state = shard.alerts[key] = {
+                    'attack_id': str(uuid.uuid4()),   # the same on every record of this attack
+                    'first_seen': timestamp,
+                    'last_seen': timestamp,
+                    'last_logged': timestamp,
+                    'packet_count': 1,
+                    'update_count': 0,
+                    'src_port': src_port,
+                    'dst_port': dst_port,
+                    'subtype': subtype,
+                    'pattern': pattern,
+                    'details': dict(details or {}),
+                }
+                heapq.heappush(shard.expiry, (timestamp + self.cooldown, next(self._seq), key, state))
+                return STARTED, dict(state, details=dict(state['details']))
+
+            state['last_seen'] = timestamp
+            state['packet_count'] += 1
+            if details:
+                state['details'].update(details)
+            if pattern and state['pattern'] is None:
+                state['pattern'] = pattern
+
+            if (timestamp - state['last_logged'] >= self.update_interval and
+                    state['update_count'] < self.max_updates):
+                state['last_logged'] = timestamp
+                state['update_count'] += 1
+                return ONGOING, dict(state, details=dict(state['details']))
+
+            shard.suppressed += 1
+            return None, dict(state)
+
+    def expire(self, now):
+        """
+        Remove the attacks quiet for `cooldown` seconds, shard by shard
+        (only the due heap entries are looked at).
+
+        Returns:
+            list of (key, state) of the ended attacks
+        """
+        ended = []
+        for shard in self._shards:
+            with shard.lock:
+                expiry = shard.expiry
+                while expiry and expiry[0][0] <= now:
+                    _, _, key, state = heapq.heappop(expiry)
+                    if shard.alerts.get(key) is not state:
+                        continue  # ended already (a new attack on the same key has its own entry)
+                    due = state['last_seen'] + self.cooldown
+                    if due > now:
+                        heapq.heappush(expiry, (due, next(self._seq), key, state))
+                        continue
+                    del shard.alerts[key]
+                    ended.append((key, state))
+        return ended
+
+    def __len__(self):
+        return sum(len(shard.alerts) for shard in self._shards)
+
+    @property
+    def suppressed(self):
+        """Repeats suppressed so far, over every shard."""
+        return sum(shard.suppressed for shard in self._shards)
+
+    def get_stats(self):
+        """Get alert aggregation statistics"""
+        return {
+            'shards': len(self._shards),
+            'active_alerts': len(self),
+            'suppressed_alerts': self.suppressed,
+            'scheduled_expiries': sum(len(shard.expiry) for shard in self._shards),
+        }
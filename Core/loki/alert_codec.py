@@ -0,0 +1,138 @@
+# Binary alert encoding
+# Alerts going from the IDS to the API over the local Unix socket
+# (db_integration.py -> api/alert_socket.py) are framed and packed with
+# struct instead of JSON: no HTTP request to parse, no JSON document to
+# re-parse per alert. `details` travels as the JSON text the database
+# stores anyway.
+
+import json
+import os
+import struct
+
+
+# ============================================================
+# Frame layout
+# ============================================================
+#   length (u32)     size of what follows
+#   header           one fixed struct (HEADER), unpacked in one call:
+#                      version (u8)
+#                      byte length of each STR_FIELDS value (u16 each)
+#                      byte length of the details JSON (u32)
+#                      INT_FIELDS (u32 each)
+#                      FLOAT_FIELDS (f64 each)
+#   strings          the STR_FIELDS values then the details JSON, UTF-8,
+#                    back to back
+#
+# Missing / None values are sentinels: length NONE_STR / NONE_JSON,
+# int NONE_INT, float NaN. Keys outside the field lists aren't sent.
+# A layout change bumps VERSION.
+#
+# An empty frame (SYNC_FRAME) asks the API to confirm the alerts sent
+# before it: it answers one byte, SYNC_OK once they are all stored,
+# SYNC_FAILED if storing some of them failed.
+# ============================================================
+
+ALERT_SOCKET_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "database", "alerts.sock")
+
+VERSION = 4
+
+STR_FIELDS = ("timestamp", "status", "type", "subtype", "pattern", "src_ip", "dst_ip",
+              "message", "first_seen", "last_seen", "severity", "uuid", "incident_id",
+              "attack_id")
+INT_FIELDS = ("src_port", "dst_port", "packet_count", "total_packets")
+FLOAT_FIELDS = ("duration_seconds", "attack_rate_pps", "total_duration_seconds", "average_rate_pps")
+
+NONE_STR = 0xFFFF
+NONE_JSON = 0xFFFFFFFF
+NONE_INT = 0xFFFFFFFF
+NAN = float("nan")
+
+HEADER = struct.Struct(f"!B{len(STR_FIELDS)}HI{len(INT_FIELDS)}I{len(FLOAT_FIELDS)}d")
+_DETAILS = 1 + len(STR_FIELDS)                  # index of the details length in the header
+_INTS = _DETAILS + 1
+_FLOATS = _INTS + len(INT_FIELDS)
+
+MAX_FRAME = 1 << 20
+
+_length = struct.Struct("!I")
+
+SYNC_FRAME = _length.pack(0)
+SYNC_OK = b"\x01"
+SYNC_FAILED = b"\x00"
+
+
+class AlertCodecError(ValueError):
+    """A frame that can't be decoded."""
+
+
+def encode_alert(record):
+    """
+    Frame one alert record (dict as built by the logger).
+
+    Returns:
+        bytes: length prefix + header + strings
+
+    Raises:
+        AlertCodecError: a value doesn't fit its field (strings over 64 KiB, negative port...)
+    """
+    get = record.get
+    strings = [None if value is None else str(value).encode("utf-8") for value in map(get, STR_FIELDS)]
+    if sum(map(len, filter(None, strings))) >= NONE_STR:
+        raise AlertCodecError("alert strings over 64 KiB")
+    details = get("details")
+    if details is not None:
+        if not isinstance(details, str):
+            details = json.dumps(details)
+        details = details.encode("utf-8")
+
+    try:
+        header = HEADER.pack(
+            VERSION,
+            *[NONE_STR if data is None else len(data) for data in strings],
+            NONE_JSON if details is None else len(details),
+            *[NONE_INT if value is None else value for value in map(get, INT_FIELDS)],
+            *[NAN if value is None else value for value in map(get, FLOAT_FIELDS)],
+        )
+    except struct.error as e:
+        raise AlertCodecError(f"alert doesn't fit a frame: {e}") from None
+    body = b"".join([header, *filter(None, strings), details or b""])
+    return _length.pack(len(body)) + body
+
+
+def decode_alert(body):
+    """
+    Unpack one frame (without its length prefix).
+
+    Returns:
+        dict of the present fields, `details` as JSON text
+
+    Raises:
+        AlertCodecError: truncated or malformed frame
+    """
+    try:
+        values = HEADER.unpack_from(body, 0)
+    except struct.error as e:
+        raise AlertCodecError(f"bad alert frame: {e}") from None
+    if values[0] != VERSION:
+        raise AlertCodecError(f"alert frame version {values[0]}, expected {VERSION}")
+
+    record = {}
+    pos = HEADER.size
+    for name, size in zip(STR_FIELDS, values[1:_DETAILS]):
+        if size != NONE_STR:
+            record[name] = body[pos:pos + size].decode("utf-8", "replace")
+            pos += size
+    size = values[_DETAILS]
+    if size != NONE_JSON:
+        record["details"] = body[pos:pos + size].decode("utf-8", "replace")
+        pos += size
+    if pos > len(body):
+        raise AlertCodecError("strings run past the frame")
+
+    for name, value in zip(INT_FIELDS, values[_INTS:_FLOATS]):
+        if value != NONE_INT:
+            record[name] = value
+    for name, value in zip(FLOAT_FIELDS, values[_FLOATS:]):
+        if value == value:  # not NaN
+            record[name] = value
+    return record
@@ -0,0 +1,248 @@
+# Durable alert spool
+# Alerts the shipper (db_integration.py) couldn't deliver are appended to
+# segment files on disk instead of waiting in memory, and replayed in
+# bulk, oldest first, once the API answers again. They survive an API
+# outage of any length (up to the size bound) and an IDS restart.
+
+import json
+import os
+import re
+import time
+
+
+# ============================================================
+# Layout
+# ============================================================
+# SPOOL_DIR/segment-00000001.jsonl, segment-00000002.jsonl, ...
+#
+#   - one alert per line (JSON), append-only; a segment is closed once
+#     it reaches `segment_bytes` and the next number is opened. A
+#     restarted IDS always opens a new segment, it never appends to an
+#     old one (whose last line may be torn)
+#   - total size is bounded by `max_bytes`: past it, the OLDEST segments
+#     are deleted (and their alerts counted as dropped)
+#   - the reader walks the oldest segment; a segment whose alerts were
+#     all delivered is deleted. The read position isn't persisted: after
+#     a crash a segment is replayed from its start, and the API skips
+#     alerts whose uuid it already has, so each alert lands once
+#
+# Only the shipper thread touches the spool, so there is no lock.
+# Every append is flushed to the OS (survives an IDS crash); fsync (which
+# survives a power cut) runs at most every `fsync_interval` seconds and
+# never on a packet thread.
+# ============================================================
+
+SPOOL_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+                         "logs", "alert_spool")
+
+_SEGMENT = re.compile(r"^segment-(\d{8})\.jsonl$")
+
+
+class AlertSpool:
+    """
+    Append-only, size-bounded on-disk queue of undelivered alerts.
+    """
+    def __init__(self, directory=SPOOL_DIR, segment_bytes=4 << 20, max_bytes=64 << 20, fsync_interval=1.0):
+        """
+        Args:
+            directory: where the segment files live (created on first use)
+            segment_bytes: size at which a segment is closed
+            max_bytes: total size kept at most (oldest segments dropped)
+            fsync_interval: seconds between fsyncs of the open segment (0 = every append)
+        """
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.max_bytes = max_bytes
+        self.fsync_interval = fsync_interval
+
+        self._segments = None       # seq -> [alerts, bytes], oldest first (opened lazily)
+        self._file = None           # segment being appended to
+        self._write_seq = None
+        self._dirty = False
+        self._synced_at = 0.0
+        self._read_offset = 0       # in the oldest segment
+        self._read_alerts = 0       # alerts of the oldest segment already delivered
+        self._peeked = None         # (offset after the peeked alerts, alert count) waiting for ack()
+        self.pending = 0
+
+        # Statistics
+        self.alerts_spooled = 0
+        self.alerts_replayed = 0
+        self.alerts_dropped = 0
+        self.bad_lines = 0
+        self.fsyncs = 0
+
+    def open(self):
+        """Find the segments left by a previous run (done on first use otherwise)."""
+        if self._segments is not None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        self._segments = {}
+        for name in sorted(os.listdir(self.directory)):
+            match = _SEGMENT.match(name)
+            if match:
+                path = os.path.join(self.directory, name)
+                self._segments[int(match.group(1))] = [_count_lines(path), os.path.getsize(path)]
+        self.pending = sum(alerts for alerts, _ in self._segments.values())
+
+    def _path(self, seq):
+        return os.path.join(self.directory, f"segment-{seq:08d}.jsonl")
+
+    def append(self, alerts):
+        """Spool a list of alert dicts (they must be JSON serializable)."""
+        self.open()
+        data = "".join(json.dumps(alert, separators=(",", ":")) + "\n" for alert in alerts).encode("utf-8")
+
+        if self._file is None or self._segments[self._write_seq][1] >= self.segment_bytes:
+            self._rotate()
+        while len(self._segments) > 1 and self._size() + len(data) > self.max_bytes:
+            self._drop_oldest()
+
+        self._file.write(data)
+        self._file.flush()
+        segment = self._segments[self._write_seq]
+        segment[0] += len(alerts)
+        segment[1] += len(data)
+        self.pending += len(alerts)
+        self.alerts_spooled += len(alerts)
+        self._dirty = True
+        self.sync(force=False)
+
+    def _rotate(self):
+        """Close the open segment and start the next one."""
+        if self._file is not None:
+            self.sync()
+            self._file.close()
+        self._write_seq = max(self._segments, default=0) + 1
+        self._segments[self._write_seq] = [0, 0]
+        self._file = open(self._path(self._write_seq), "ab")
+        # make the new directory entry durable too
+        fd = os.open(self.directory, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def _size(self):
+        return sum(size for _, size in self._segments.values())
+
+    def _drop_oldest(self):
+        seq = next(iter(self._segments))
+        alerts, _ = self._segments.pop(seq)
+        undelivered = alerts - self._read_alerts
+        self.pending -= undelivered
+        self.alerts_dropped += undelivered
+        self._read_offset = self._read_alerts = 0
+        self._peeked = None
+        os.unlink(self._path(seq))
+
+    def sync(self, force=True):
+        """
+        fsync the open segment if anything was appended since the last one.
+
+        Args:
+            force: ignore fsync_interval
+        """
+        if not self._dirty:
+            return
+        now = time.monotonic()
+        if force or now - self._synced_at >= self.fsync_interval:
+            os.fsync(self._file.fileno())
+            self._dirty = False
+            self._synced_at = now
+            self.fsyncs += 1
+
+    def peek(self, count):
+        """
+        The next `count` undelivered alerts at most, oldest first (one
+        segment at a time). Call ack() once they are delivered.
+
+        Returns:
+            list of alert dicts (empty when nothing is spooled)
+        """
+        self.open()
+        while self._segments:
+            seq = next(iter(self._segments))
+            alerts, offset, lines = [], self._read_offset, 0
+            with open(self._path(seq), "rb") as f:
+                f.seek(offset)
+                while len(alerts) < count:
+                    line = f.readline()
+                    if not line.endswith(b"\n"):
+                        break  # end of the segment (or a line torn by a crash)
+                    offset += len(line)
+                    lines += 1
+                    try:
+                        alerts.append(json.loads(line))
+                    except ValueError:
+                        self.bad_lines += 1
+            if alerts:
+                self._peeked = (offset, lines)
+                return alerts
+            if lines:
+                self._advance(offset, lines)  # only unreadable lines, skip them
+                continue
+            if seq == self._write_seq:
+                break
+            self._finish_segment(seq)
+        return []
+
+    def ack(self):
+        """Mark the alerts of the last peek() as delivered."""
+        if self._peeked is None:
+            return
+        offset, lines = self._peeked
+        self._peeked = None
+        self.alerts_replayed += lines
+        self._advance(offset, lines)
+
+    def _advance(self, offset, lines):
+        """Move the read position past `lines` lines of the oldest segment."""
+        self._read_offset = offset
+        self._read_alerts += lines
+        self.pending -= lines
+        seq = next(iter(self._segments))
+        if self._read_alerts >= self._segments[seq][0]:
+            self._finish_segment(seq)
+
+    def _finish_segment(self, seq):
+        """Delete a fully delivered segment (the open one is closed first, the next append reopens one)."""
+        if seq == self._write_seq:
+            self._file.close()
+            self._file = None
+            self._dirty = False
+        del self._segments[seq]
+        self._read_offset = self._read_alerts = 0
+        os.unlink(self._path(seq))
+
+    def close(self):
+        """fsync and close the open segment."""
+        if self._file is not None:
+            self.sync()
+            self._file.close()
+            self._file = None
+
+    def __len__(self):
+        return self.pending
+
+    def get_stats(self):
+        """Get alert spool statistics"""
+        return {
+            'pending': self.pending,
+            'segments': len(self._segments or ()),
+            'bytes': self._size() if self._segments else 0,
+            'alerts_spooled': self.alerts_spooled,
+            'alerts_replayed': self.alerts_replayed,
+            'alerts_dropped': self.alerts_dropped,
+            'bad_lines': self.bad_lines,
+            'fsyncs': self.fsyncs,
+        }
+
+
+def _count_lines(path):
+    """Complete (newline-terminated) lines of a segment file."""
+    count = 0
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            count += chunk.count(b"\n")
+    return count
@@ -0,0 +1,256 @@
+"""
+Local alert intake for the IDS.
+
+The IDS and the API run on the same Pi, so instead of POSTing JSON the
+IDS can stream binary frames (alert_codec.py) over a Unix socket. Frames
+are decoded as they arrive and written in batches through the same insert
+path as POST /api/alerts/bulk.
+
+A slow database pushes back: the queue between the readers and the
+writer is bounded, so once it is full we stop reading, the socket buffer
+fills up and the IDS's shipper thread waits (its own queue absorbs it).
+
+The IDS ends each batch with a sync frame and waits for our answer, so
+it knows which batches are stored and which to keep in its spool. Alerts
+are numbered in the order they are queued; a sync is answered once every
+alert queued before it went through `on_batch`, SYNC_FAILED if a failed
+batch overlapped the alerts of that connection since its previous sync.
+"""
+import asyncio
+import errno
+import os
+import socket
+from collections import deque
+from typing import Any, Dict, List
+
+from fastapi import HTTPException
+
+# engine modules live next to api/ (api_server.py puts Core/loki on sys.path)
+from alert_codec import ALERT_SOCKET_PATH, MAX_FRAME, SYNC_FAILED, SYNC_OK, AlertCodecError, decode_alert
+
+from .models.database import AsyncSessionLocal
+from .models import crud
+from .routes.alerts import prepare_alert_data
+
+
+async def store_alerts(alerts: List[Dict[str, Any]]) -> int:
+    """Insert decoded alerts in one transaction (alerts missing required fields are skipped)."""
+    rows = []
+    for alert in alerts:
+        try:
+            rows.append(prepare_alert_data(alert))
+        except HTTPException:
+            pass
+    async with AsyncSessionLocal() as db:
+        return await crud.create_alerts(db, rows)
+
+
+class AlertSocketServer:
+    """Unix stream socket server handing decoded alerts to `on_batch` in batches."""
+
+    def __init__(self, on_batch=store_alerts, path: str = ALERT_SOCKET_PATH,
+                 batch_size: int = 500, max_pending: int = 10000):
+        """
+        Args:
+            on_batch: async callable(list of alert dicts)
+            path: socket path (must match the IDS's DatabaseIntegration)
+            batch_size: alerts per on_batch call at most
+            max_pending: decoded alerts waiting for on_batch before we stop reading
+        """
+        self.on_batch = on_batch
+        self.path = path
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self._queue = None              # lists of decoded alerts, one per read
+        self._pending = 0               # alerts in them
+        self._room = None               # set when _pending drops
+        self._queued = 0                # alerts queued so far (their sequence numbers)
+        self._stored = 0                # ...and handed to on_batch
+        self._failed_end = 0            # sequence end of the last failed batch
+        self._syncs = deque()           # (target, since, future) waiting for _stored >= target
+        self._server = None
+        self._writer_task = None
+        self._clients = set()
+
+        # Statistics
+        self.connections = 0
+        self.submitted = 0
+        self.frames = 0
+        self.bad_frames = 0
+        self.syncs = 0
+        self.batches = 0
+        self.failed_batches = 0
+
+    async def start(self):
+        """
+        Listen on the socket (replacing a stale one from a previous run).
+
+        Raises:
+            OSError: the path can't be bound, or another API is listening on it
+        """
+        if os.path.exists(self.path):
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(self.path)
+            except OSError:
+                os.unlink(self.path)
+            else:
+                raise OSError(errno.EADDRINUSE, "another API is listening", self.path)
+            finally:
+                probe.close()
+        self._queue = asyncio.Queue()
+        self._room = asyncio.Event()
+        self._server = await asyncio.start_unix_server(self._handle, path=self.path)
+        os.chmod(self.path, 0o660)
+        self._writer_task = asyncio.create_task(self._write_loop())
+
+    async def stop(self):
+        """Stop listening and write what was already decoded."""
+        if self._server:
+            self._server.close()
+            for client in self._clients:
+                client.close()
+            await self._server.wait_closed()
+        if self._writer_task:
+            self._writer_task.cancel()
+        while self._queue and not self._queue.empty():
+            await self._flush(self._queue.get_nowait())
+        while self._syncs:
+            future = self._syncs.popleft()[2]
+            if not future.done():
+                future.set_result(False)
+        if self._server and os.path.exists(self.path):
+            os.unlink(self.path)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Read frames from one IDS connection until it closes."""
+        self.connections += 1
+        self._clients.add(writer)
+        buffer = bytearray()
+        synced = self._queued   # sequence of this connection's last sync
+        try:
+            while True:
+                chunk = await reader.read(1 << 18)
+                if not chunk:
+                    break
+                buffer += chunk
+
+                # every complete frame in the buffer, a partial one waits for the next read
+                pos = 0
+                alerts = []
+                syncs = []
+                end = len(buffer)
+                while end - pos >= 4:
+                    size = int.from_bytes(buffer[pos:pos + 4], "big")
+                    if size > MAX_FRAME:
+                        raise AlertCodecError(f"frame of {size} bytes")
+                    start = pos + 4
+                    pos = start + size
+                    if pos > end:
+                        pos = start - 4
+                        break
+                    if not size:
+                        self._enqueue(alerts)
+                        alerts = []
+                        syncs.append(self._sync(synced))
+                        synced = self._queued
+                        continue
+                    try:
+                        alerts.append(decode_alert(buffer[start:pos]))
+                    except AlertCodecError:
+                        self.bad_frames += 1
+                del buffer[:pos]
+                self._enqueue(alerts)
+
+                for sync in syncs:
+                    writer.write(SYNC_OK if await sync else SYNC_FAILED)
+                if syncs:
+                    await writer.drain()
+                while self._pending >= self.max_pending:
+                    self._room.clear()
+                    await self._room.wait()
+        except AlertCodecError as e:
+            # lost framing, nothing after this can be trusted
+            self.bad_frames += 1
+            print(f"[!] Alert socket: {e}, closing the connection")
+        except ConnectionError:
+            pass
+        finally:
+            self._clients.discard(writer)
+            writer.close()
+
+    def _enqueue(self, alerts):
+        if alerts:
+            self.frames += len(alerts)
+            self._pending += len(alerts)
+            self._queued += len(alerts)
+            self._queue.put_nowait(alerts)
+
+    def submit(self, alerts: List[Dict[str, Any]]) -> bool:
+        """
+        Queue alerts from another intake (POST /api/alerts) for the batch writer.
+
+        Returns:
+            bool: queued; False if the writer isn't running or is full (store them directly)
+        """
+        if self._writer_task is None or self._writer_task.done() or self._pending >= self.max_pending:
+            return False
+        self.submitted += len(alerts)
+        self._pending += len(alerts)
+        self._queued += len(alerts)
+        self._queue.put_nowait(alerts)
+        return True
+
+    def _sync(self, since):
+        """Future of the answer to a sync: True once the alerts queued up to now are stored."""
+        future = asyncio.get_running_loop().create_future()
+        self.syncs += 1
+        if self._queued <= self._stored:
+            future.set_result(self._failed_end <= since)
+        else:
+            self._syncs.append((self._queued, since, future))
+        return future
+
+    async def _write_loop(self):
+        """Hand queued alerts to on_batch, as many as are waiting (up to batch_size)."""
+        while True:
+            alerts = await self._queue.get()
+            while len(alerts) < self.batch_size and not self._queue.empty():
+                alerts += self._queue.get_nowait()
+            for start in range(0, len(alerts), self.batch_size):
+                await self._flush(alerts[start:start + self.batch_size])
+
+    async def _flush(self, batch):
+        try:
+            await self.on_batch(batch)
+            self.batches += 1
+        except Exception as e:
+            self.failed_batches += 1
+            self._failed_end = self._stored + len(batch)
+            print(f"[!] Alert socket insert error: {e}")
+        self._stored += len(batch)
+        self._pending -= len(batch)
+        self._room.set()
+
+        while self._syncs and self._syncs[0][0] <= self._stored:
+            _, since, future = self._syncs.popleft()
+            if not future.done():
+                future.set_result(self._failed_end <= since)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get alert socket statistics"""
+        return {
+            'listening': self._server is not None and self._server.is_serving(),
+            'connections': self.connections,
+            'submitted': self.submitted,
+            'frames': self.frames,
+            'bad_frames': self.bad_frames,
+            'syncs': self.syncs,
+            'batches': self.batches,
+            'failed_batches': self.failed_batches,
+            'pending': self._pending,
+        }
+
+
+# Global instance
+alert_socket = AlertSocketServer()
@@ -4,11 +4,15 @@ Main FastAPI application for Loki IDS Web Interface.
 from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from fastapi.responses import FileResponse
 import os
+import zlib
+from typing import Optional
 
 from .models.database import init_db
-from .routes import alerts, signatures, stats, system, websocket, iot
+from .alert_socket import alert_socket
+from .routes import alerts, incidents, signatures, stats, system, websocket, iot
 
 # Create FastAPI app
 app = FastAPI(
@@ -26,8 +30,80 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
+class GZipRequestMiddleware:
+    """
+    Decompress request bodies sent with Content-Encoding: gzip
+    (the IDS compresses big alert batches and signature stats).
+    """
+    def __init__(self, app, max_size: int = 64 * 1024 * 1024, max_compressed: Optional[int] = None):
+        self.app = app
+        self.max_size = max_size
+        self.max_compressed = max_compressed if max_compressed is not None else max_size // 4
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or (b"content-encoding", b"gzip") not in scope["headers"]:
+            await self.app(scope, receive, send)
+            return
+
+        declared = dict(scope["headers"]).get(b"content-length")
+        if declared and declared.isdigit() and int(declared) > self.max_compressed:
+            await self._reject(send, 413, b"Request body too large")
+            return
+
+        # inflate chunk by chunk as they arrive, both sizes capped as we go
+        decompressor = zlib.decompressobj(wbits=31)
+        parts = []
+        received = 0
+        size = 0
+        more_body = True
+        while more_body:
+            message = await receive()
+            chunk = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            received += len(chunk)
+            if received > self.max_compressed:
+                await self._reject(send, 413, b"Request body too large")
+                return
+            try:
+                part = decompressor.decompress(chunk, self.max_size - size + 1)
+            except zlib.error:
+                await self._reject(send, 400, b"Invalid gzip body")
+                return
+            size += len(part)
+            if size > self.max_size or decompressor.unconsumed_tail:
+                await self._reject(send, 413, b"Request body too large")
+                return
+            parts.append(part)
+        body = b"".join(parts)
+
+        headers = [(k, v) for k, v in scope["headers"] if k not in (b"content-encoding", b"content-length")]
+        headers.append((b"content-length", str(len(body)).encode()))
+        delivered = False
+
+        async def receive_body():
+            nonlocal delivered
+            if delivered:
+                return await receive()
+            delivered = True
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        await self.app({**scope, "headers": headers}, receive_body, send)
+
+    @staticmethod
+    async def _reject(send, status, detail):
+        await send({"type": "http.response.start", "status": status,
+                    "headers": [(b"content-type", b"text/plain"), (b"content-length", str(len(detail)).encode())]})
+        await send({"type": "http.response.body", "body": detail})
+
+
+# Compressed bodies both ways (large signature lists, IDS alert batches)
+app.add_middleware(GZipMiddleware, minimum_size=4096)
+app.add_middleware(GZipRequestMiddleware)
+
 # Include routers
 app.include_router(alerts.router, prefix="/api")
+app.include_router(incidents.router, prefix="/api")
 app.include_router(signatures.router, prefix="/api")
 app.include_router(stats.router, prefix="/api")
 app.include_router(system.router, prefix="/api")
@@ -40,6 +116,13 @@ async def startup_event():
     """Initialize database and IoT services on startup."""
     await init_db()
     print("[*] Database initialized")
+
+    # Local alert intake for the IDS (binary frames over a Unix socket)
+    try:
+        await alert_socket.start()
+        print(f"[*] Alert socket listening on {alert_socket.path}")
+    except OSError as e:
+        print(f"[!] Alert socket unavailable ({e}), the IDS will use HTTP")
     
     # Initialize MQTT client (optional, won't fail if unavailable)
     try:
@@ -68,6 +151,7 @@ async def startup_event():
 @app.on_event("shutdown")
 async def shutdown_event():
     """Cleanup on shutdown."""
+    await alert_socket.stop()
     try:
         from .iot import shutdown_mqtt
         shutdown_mqtt()
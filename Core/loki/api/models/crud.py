@@ -2,13 +2,15 @@
 CRUD operations for database models.
 """
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, desc, and_
+from sqlalchemy import select, delete, func, desc, and_, case
 from sqlalchemy.orm import selectinload
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from typing import List, Optional, Dict, Any
 from datetime import datetime, timedelta
+import hashlib
 import json
 
-from .database import Alert, Signature, StatsCache
+from .database import Alert, AlertHistory, Incident, Signature, SignatureStats, StatsCache
 
 
 # Alert CRUD
@@ -21,6 +23,128 @@ async def create_alert(db: AsyncSession, alert_data: dict) -> Alert:
     return alert
 
 
+ALERT_COLUMNS = frozenset(Alert.__table__.columns.keys()) - {"id"}
+
+# Records of an attack ("attack" storage, see below) update these columns
+# of its row; the others keep what the first record stored
+ATTACK_LIFECYCLE_COLUMNS = ("timestamp", "status", "details", "duration_seconds", "packet_count",
+                            "attack_rate_pps", "total_duration_seconds", "total_packets",
+                            "average_rate_pps", "first_seen", "last_seen", "incident_id")
+
+# Keep a compact alert_history row per attack record (status, packets, rate).
+# Off by default: its two indexes cost about as much per record as the upsert itself
+ALERT_HISTORY = False
+
+
+async def create_alerts(db: AsyncSession, alerts: List[Dict[str, Any]], chunk_size: int = 500) -> int:
+    """
+    Store a batch of alerts in ONE transaction (IDS alert shipper).
+
+    Alerts carrying an attack_id ("attack" storage on the IDS) are upserted:
+    the STARTED record creates the attack's row, its ONGOING and ENDED
+    records update the status and counters of that row (an older record
+    arriving late only fills what is missing). Other alerts are inserted, one row per
+    record. Either way a resent alert is stored once (the IDS resends
+    batches it isn't sure were stored).
+
+    Args:
+        alerts: alert dicts, keys that aren't Alert columns are ignored
+
+    Returns:
+        int: number of records stored
+    """
+    rows = [{k: v for k, v in alert.items() if k in ALERT_COLUMNS} for alert in alerts]
+    attacks = [row for row in rows if row.get("attack_id")]
+    if attacks:
+        rows = [row for row in rows if not row.get("attack_id")]
+        await _upsert_attacks(db, attacks, chunk_size)
+
+    seen = await _stored_uuids(db, {row["uuid"] for row in rows if row.get("uuid")})
+    fresh = []
+    for row in rows:
+        uuid = row.get("uuid")
+        if uuid:
+            if uuid in seen:
+                continue
+            seen.add(uuid)
+        fresh.append(row)
+    if fresh:
+        db.add_all([Alert(**row) for row in fresh])
+    if fresh or attacks:
+        await db.commit()
+    return len(fresh) + len(attacks)
+
+
+async def _upsert_attacks(db: AsyncSession, records: List[Dict[str, Any]], chunk_size: int) -> None:
+    """Fold attack records into one row per attack_id (plus their alert_history rows)."""
+    rows = []
+    for record in records:
+        row = {column: record.get(column) for column in ALERT_COLUMNS}
+        row["uuid"] = None  # the row stands for many records; their uuids are in alert_history
+        row["severity"] = record.get("severity") or "MEDIUM"
+        rows.append(row)
+    rows.sort(key=lambda row: row["timestamp"] or "")  # a batch may hold several records of one attack
+
+    # a newer record overwrites the columns it has, an older one (resent or
+    # late) only fills the columns still empty
+    stmt = sqlite_insert(Alert)
+    newer = stmt.excluded.timestamp >= Alert.timestamp
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Alert.attack_id],
+        set_={column: case(
+                  (newer, func.coalesce(getattr(stmt.excluded, column), getattr(Alert, column))),
+                  else_=func.coalesce(getattr(Alert, column), getattr(stmt.excluded, column)))
+              for column in ATTACK_LIFECYCLE_COLUMNS}
+    )
+    for i in range(0, len(rows), chunk_size):
+        await db.execute(stmt, rows[i:i + chunk_size])
+
+    if ALERT_HISTORY:
+        history = [_history_row(record) for record in records if record.get("timestamp")]
+        stmt = sqlite_insert(AlertHistory).on_conflict_do_nothing(index_elements=[AlertHistory.uuid])
+        for i in range(0, len(history), chunk_size):
+            await db.execute(stmt, history[i:i + chunk_size])
+
+
+def _history_row(record: Dict[str, Any]) -> Dict[str, Any]:
+    """alert_history row of an attack record (ONGOING and ENDED records name their counters differently)."""
+    def number(*fields):
+        for field in fields:
+            value = record.get(field)
+            if value not in (None, ""):
+                return float(value)
+        return None
+
+    packets = number("packet_count", "total_packets")
+    return {
+        "attack_id": record["attack_id"],
+        "uuid": record.get("uuid"),
+        "timestamp": record["timestamp"],
+        "status": record.get("status"),
+        "packet_count": int(packets) if packets is not None else None,
+        "rate_pps": number("attack_rate_pps", "average_rate_pps"),
+        "duration_seconds": number("duration_seconds", "total_duration_seconds"),
+    }
+
+
+async def get_alert_history(db: AsyncSession, attack_id: str) -> List[AlertHistory]:
+    """The alert_history rows of an attack, oldest first."""
+    result = await db.execute(
+        select(AlertHistory).where(AlertHistory.attack_id == attack_id).order_by(AlertHistory.timestamp)
+    )
+    return result.scalars().all()
+
+
+async def _stored_uuids(db: AsyncSession, uuids: set, chunk: int = 500) -> set:
+    """The subset of `uuids` already in the alerts table."""
+    uuids = list(uuids)
+    stored = set()
+    for start in range(0, len(uuids), chunk):
+        result = await db.execute(select(Alert.uuid).where(Alert.uuid.in_(uuids[start:start + chunk])))
+        stored.update(result.scalars())
+    return stored
+
+
 async def get_alerts(
     db: AsyncSession,
     skip: int = 0,
@@ -32,9 +156,10 @@ async def get_alerts(
     src_ip: Optional[str] = None,
     dst_ip: Optional[str] = None,
     start_time: Optional[str] = None,
-    end_time: Optional[str] = None
+    end_time: Optional[str] = None,
+    incident_ids: Optional[List[str]] = None
 ) -> tuple[List[Alert], int]:
-    """Get alerts with filtering and pagination."""
+    """Get alerts with filtering and pagination (incident_ids: see get_incident_family)."""
     query = select(Alert)
     
     # Apply filters
@@ -55,6 +180,8 @@ async def get_alerts(
         conditions.append(Alert.timestamp >= start_time)
     if end_time:
         conditions.append(Alert.timestamp <= end_time)
+    if incident_ids is not None:
+        conditions.append(Alert.incident_id.in_(incident_ids))
     
     if conditions:
         query = query.where(and_(*conditions))
@@ -80,15 +207,98 @@ async def get_alert_by_id(db: AsyncSession, alert_id: int) -> Optional[Alert]:
 
 
 async def delete_alert(db: AsyncSession, alert_id: int) -> bool:
-    """Delete an alert."""
+    """Delete an alert (and the history of its attack)."""
     alert = await get_alert_by_id(db, alert_id)
     if alert:
+        if alert.attack_id:
+            await db.execute(delete(AlertHistory).where(AlertHistory.attack_id == alert.attack_id))
         await db.delete(alert)
         await db.commit()
         return True
     return False
 
 
+# Incident CRUD
+INCIDENT_FIELDS = ("status", "merged_into", "first_seen", "last_seen", "alert_count",
+                   "attackers", "victims", "attacker_sample", "victim_sample", "kinds", "summary")
+INCIDENT_JSON_FIELDS = ("attacker_sample", "victim_sample", "kinds")
+
+
+async def upsert_incidents(db: AsyncSession, incidents: List[Dict[str, Any]], chunk_size: int = 500) -> int:
+    """
+    Store incident records sent by the IDS in ONE transaction: each one
+    replaces the stored snapshot of its incident (keyed by incident_id).
+
+    Returns:
+        int: number of records stored
+    """
+    now = datetime.utcnow().isoformat()
+    rows = []
+    for incident in incidents:
+        row = {field: incident.get(field) for field in INCIDENT_FIELDS}
+        for field in INCIDENT_JSON_FIELDS:
+            row[field] = json.dumps(row[field]) if row[field] is not None else None
+        row["incident_id"] = incident["incident_id"]
+        row["updated_at"] = now
+        rows.append(row)
+    if not rows:
+        return 0
+
+    stmt = sqlite_insert(Incident)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Incident.incident_id],
+        set_={field: getattr(stmt.excluded, field) for field in (*INCIDENT_FIELDS, "updated_at")}
+    )
+    for i in range(0, len(rows), chunk_size):
+        await db.execute(stmt, rows[i:i + chunk_size])
+    await db.commit()
+    return len(rows)
+
+
+async def get_incidents(
+    db: AsyncSession,
+    skip: int = 0,
+    limit: int = 50,
+    status: Optional[str] = None,
+    ip: Optional[str] = None
+) -> tuple[List[Incident], int]:
+    """
+    Get incidents, most recently active first. MERGED incidents are only
+    listed when asked for by status (their alerts show up in the incident
+    that took them over).
+    """
+    conditions = [Incident.status == status] if status else [Incident.status != "MERGED"]
+    if ip:
+        conditions.append(Incident.attacker_sample.like(f"%{ip}%") | Incident.victim_sample.like(f"%{ip}%"))
+
+    total = await db.scalar(select(func.count()).select_from(Incident).where(and_(*conditions)))
+    result = await db.execute(
+        select(Incident).where(and_(*conditions)).order_by(desc(Incident.last_seen)).offset(skip).limit(limit)
+    )
+    return result.scalars().all(), total
+
+
+async def get_incident(db: AsyncSession, incident_id: str) -> Optional[Incident]:
+    """Get an incident by its IDS-assigned id."""
+    result = await db.execute(select(Incident).where(Incident.incident_id == incident_id))
+    return result.scalar_one_or_none()
+
+
+async def get_incident_family(db: AsyncSession, incident_id: str) -> List[str]:
+    """
+    The incident id plus the ids of every incident merged into it (directly
+    or through other merged incidents): alerts keep the id they were
+    tagged with when they were raised.
+    """
+    family = [incident_id]
+    frontier = [incident_id]
+    while frontier:
+        result = await db.execute(select(Incident.incident_id).where(Incident.merged_into.in_(frontier)))
+        frontier = [merged for merged in result.scalars() if merged not in family]
+        family.extend(frontier)
+    return family
+
+
 # Signature CRUD
 async def get_signatures(
     db: AsyncSession, 
@@ -186,6 +396,190 @@ async def delete_signature(db: AsyncSession, sig_id: int) -> bool:
     return False
 
 
+SIGNATURE_IMPORT_FIELDS = (
+    "pattern", "action", "description", "enabled",
+    "proto", "src_ports", "dst_ports", "nocase", "offset", "depth", "sid", "field",
+)
+
+
+async def bulk_upsert_signatures(db: AsyncSession, signatures: List[Dict[str, Any]], chunk_size: int = 2000) -> int:
+    """
+    Insert or update many signatures (matched by name) in ONE transaction.
+
+    Args:
+        signatures: dicts with a name plus any of SIGNATURE_IMPORT_FIELDS
+        chunk_size: rows per INSERT statement (keeps executemany batches bounded)
+
+    Returns:
+        int: number of rows written
+    """
+    if not signatures:
+        return 0
+
+    now = datetime.utcnow().isoformat()
+    rows = [
+        {
+            "name": sig["name"],
+            "pattern": sig["pattern"],
+            "action": sig.get("action", "alert"),
+            "description": sig.get("description", ""),
+            "enabled": sig.get("enabled", 1),
+            "proto": sig.get("proto") or "any",
+            "src_ports": sig.get("src_ports") or "any",
+            "dst_ports": sig.get("dst_ports") or "any",
+            "nocase": sig.get("nocase", 0),
+            "offset": sig.get("offset"),
+            "depth": sig.get("depth"),
+            "sid": sig.get("sid"),
+            "field": sig.get("field") or "any",
+            "created_at": now,
+        }
+        for sig in signatures
+    ]
+
+    stmt = sqlite_insert(Signature)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Signature.name],
+        set_={
+            **{field: getattr(stmt.excluded, field) for field in SIGNATURE_IMPORT_FIELDS},
+            "updated_at": now,
+        }
+    )
+    for i in range(0, len(rows), chunk_size):
+        await db.execute(stmt, rows[i:i + chunk_size])
+    await db.commit()
+    return len(rows)
+
+
+async def get_ruleset_etag(db: AsyncSession) -> tuple[str, int]:
+    """
+    Hash of the enabled ruleset (what the IDS actually loads).
+    Any change to an enabled signature's content changes the ETag.
+    """
+    result = await db.execute(
+        select(
+            Signature.name, Signature.pattern, Signature.action,
+            Signature.proto, Signature.src_ports, Signature.dst_ports,
+            Signature.nocase, Signature.offset, Signature.depth, Signature.field
+        )
+        .where(Signature.enabled == 1)
+        .order_by(Signature.name)
+    )
+    rows = result.all()
+
+    digest = hashlib.sha256()
+    for row in rows:
+        digest.update(json.dumps(list(row)).encode('utf-8'))
+        digest.update(b"\n")
+
+    return digest.hexdigest()[:16], len(rows)
+
+
+# Per-rule signature stats
+async def add_signature_stats(db: AsyncSession, deltas: Dict[str, list]) -> int:
+    """
+    Add counter deltas reported by the IDS to the running totals.
+    All rules are upserted in one statement / one transaction.
+
+    Args:
+        deltas: rule name -> [matches, bytes_scanned, cost_ns, profiled_packets, last_match (unix time or None)]
+    """
+    if not deltas:
+        return 0
+
+    now = datetime.utcnow().isoformat()
+    rows = []
+    for name, (matches, bytes_scanned, cost_ns, profiled, last_match) in deltas.items():
+        rows.append({
+            "name": name,
+            "matches": int(matches),
+            "bytes_scanned": int(bytes_scanned),
+            "cost_ns": int(cost_ns),
+            "profiled_packets": int(profiled),
+            "last_match": datetime.utcfromtimestamp(last_match).isoformat() if last_match else None,
+            "updated_at": now,
+        })
+
+    stmt = sqlite_insert(SignatureStats)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[SignatureStats.name],
+        set_={
+            "matches": SignatureStats.matches + stmt.excluded.matches,
+            "bytes_scanned": SignatureStats.bytes_scanned + stmt.excluded.bytes_scanned,
+            "cost_ns": SignatureStats.cost_ns + stmt.excluded.cost_ns,
+            "profiled_packets": SignatureStats.profiled_packets + stmt.excluded.profiled_packets,
+            "last_match": func.coalesce(stmt.excluded.last_match, SignatureStats.last_match),
+            "updated_at": stmt.excluded.updated_at,
+        }
+    )
+    await db.execute(stmt, rows)
+    await db.commit()
+    return len(rows)
+
+
+def signature_stats_dict(stats: Optional[SignatureStats]) -> Dict[str, Any]:
+    """Counters of one rule, plus the derived cost figures the dashboard shows."""
+    if stats is None:
+        return {"matches": 0, "bytes_scanned": 0, "last_match": None, "avg_cost_ns": None, "hits_per_mb": 0.0}
+
+    mb_scanned = (stats.bytes_scanned or 0) / 1e6
+    return {
+        "matches": stats.matches or 0,
+        "bytes_scanned": stats.bytes_scanned or 0,
+        "last_match": stats.last_match,
+        "avg_cost_ns": round(stats.cost_ns / stats.profiled_packets) if stats.profiled_packets else None,
+        "hits_per_mb": round((stats.matches or 0) / mb_scanned, 3) if mb_scanned else 0.0,
+    }
+
+
+async def get_signature_stats(db: AsyncSession, names: Optional[List[str]] = None) -> Dict[str, Dict[str, Any]]:
+    """Per-rule stats keyed by signature name (all rules, or only `names`)."""
+    query = select(SignatureStats)
+    if names is not None:
+        query = query.where(SignatureStats.name.in_(names))
+    result = await db.execute(query)
+    return {stats.name: signature_stats_dict(stats) for stats in result.scalars().all()}
+
+
+async def get_noisy_rules_report(db: AsyncSession, limit: int = 10) -> Dict[str, Any]:
+    """
+    Which enabled rules fire the most, cost the most, or never fire at all.
+    """
+    result = await db.execute(
+        select(Signature, SignatureStats)
+        .outerjoin(SignatureStats, SignatureStats.name == Signature.name)
+        .where(Signature.enabled == 1)
+    )
+
+    rules = []
+    for signature, stats in result.all():
+        rules.append({
+            "id": signature.id,
+            "name": signature.name,
+            "pattern": signature.pattern,
+            **signature_stats_dict(stats)
+        })
+
+    noisy = sorted((r for r in rules if r["matches"]), key=lambda r: r["matches"], reverse=True)
+    expensive = sorted(
+        (r for r in rules if r["avg_cost_ns"] is not None),
+        key=lambda r: r["avg_cost_ns"], reverse=True
+    )
+    # scanned traffic but never matched anything
+    dead = [r for r in rules if not r["matches"] and r["bytes_scanned"]]
+    dead.sort(key=lambda r: r["name"])
+
+    return {
+        "noisy": noisy[:limit],
+        "expensive": expensive[:limit],
+        "dead": dead[:limit],
+        "dead_count": len(dead),
+        "total_matches": sum(r["matches"] for r in rules),
+        "bytes_scanned": max((r["bytes_scanned"] for r in rules), default=0),
+        "rules": len(rules),
+    }
+
+
 # Statistics
 async def get_alert_stats(db: AsyncSession) -> Dict[str, Any]:
     """Get alert statistics."""
@@ -231,3 +625,31 @@ async def get_alert_stats(db: AsyncSession) -> Dict[str, Any]:
     }
 
 
+# IDS runtime stats (published by the IDS, stored in stats_cache)
+IDS_STATS_PREFIX = "ids:"
+
+
+async def set_ids_stats(db: AsyncSession, key: str, value: Dict[str, Any]) -> None:
+    """Store one block of IDS runtime stats."""
+    cache_key = f"{IDS_STATS_PREFIX}{key}"
+    entry = await db.get(StatsCache, cache_key)
+    if entry is None:
+        entry = StatsCache(key=cache_key)
+        db.add(entry)
+    entry.value = json.dumps(value)
+    entry.updated_at = datetime.utcnow().isoformat()
+    await db.commit()
+
+
+async def get_ids_stats(db: AsyncSession) -> Dict[str, Any]:
+    """All IDS runtime stats blocks, keyed without the prefix."""
+    result = await db.execute(
+        select(StatsCache).where(StatsCache.key.like(f"{IDS_STATS_PREFIX}%"))
+    )
+    return {
+        entry.key[len(IDS_STATS_PREFIX):]: {
+            **json.loads(entry.value or "{}"),
+            "updated_at": entry.updated_at
+        }
+        for entry in result.scalars().all()
+    }
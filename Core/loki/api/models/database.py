@@ -5,7 +5,7 @@ Uses SQLite for lightweight, file-based storage.
 import os
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from sqlalchemy.orm import declarative_base
-from sqlalchemy import Column, Integer, String, Text, DateTime, Index
+from sqlalchemy import Column, Integer, String, Text, DateTime, Float, Index
 from datetime import datetime
 
 # Get project root directory
@@ -44,7 +44,7 @@ class Alert(Base):
     timestamp = Column(String, nullable=False, index=True)
     status = Column(String, index=True)  # STARTED, ONGOING, ENDED
     type = Column(String, nullable=False, index=True)  # SIGNATURE, BEHAVIOR, SYSTEM
-    subtype = Column(String, index=True)  # PORT_SCAN, TCP_FLOOD, UDP_FLOOD, ICMP_FLOOD, etc.
+    subtype = Column(String, index=True)  # PORT_SCAN, TCP_FLOOD, UDP_FLOOD, ICMP_FLOOD, PAYLOAD_ANOMALY, DNS_TUNNELING, etc.
     pattern = Column(String, index=True)  # Pattern for SIGNATURE alerts (e.g., "UNION SELECT", "<script>")
     src_ip = Column(String, nullable=False, index=True)
     dst_ip = Column(String, index=True)
@@ -63,8 +63,14 @@ class Alert(Base):
     average_rate_pps = Column(String)  # For ENDED alerts
     first_seen = Column(String)  # For ENDED alerts
     last_seen = Column(String)  # For ENDED alerts
+    uuid = Column(String)  # Set by the IDS, a resent alert is stored once
+    incident_id = Column(String)  # Incident the IDS grouped this alert into
+    attack_id = Column(String)  # Set by the IDS in "attack" storage: one row per attack, updated in place
     
     __table_args__ = (
+        Index('idx_alert_uuid', 'uuid', unique=True),
+        Index('idx_alert_incident', 'incident_id'),
+        Index('idx_alert_attack', 'attack_id', unique=True),
         Index('idx_timestamp', 'timestamp'),
         Index('idx_src_ip', 'src_ip'),
         Index('idx_type', 'type'),
@@ -74,6 +80,51 @@ class Alert(Base):
     )
 
 
+class AlertHistory(Base):
+    """Compact trail of the records folded into an attack row (one per STARTED / ONGOING / ENDED record)."""
+    __tablename__ = "alert_history"
+
+    id = Column(Integer, primary_key=True)
+    attack_id = Column(String, nullable=False)
+    uuid = Column(String)  # the record's uuid, a resent record is stored once
+    timestamp = Column(String, nullable=False)
+    status = Column(String)
+    packet_count = Column(Integer)
+    rate_pps = Column(Float)
+    duration_seconds = Column(Float)
+
+    __table_args__ = (
+        Index('idx_alert_history_attack', 'attack_id', 'timestamp'),
+        Index('idx_alert_history_uuid', 'uuid', unique=True),
+    )
+
+
+class Incident(Base):
+    """Attack campaigns: alerts the IDS grouped by shared attacker or victim (upserted by incident_id)."""
+    __tablename__ = "incidents"
+
+    id = Column(Integer, primary_key=True, index=True)
+    incident_id = Column(String, nullable=False)
+    status = Column(String, index=True)  # OPEN, CLOSED, MERGED
+    merged_into = Column(String)  # MERGED: the incident that took this one over
+    first_seen = Column(String)
+    last_seen = Column(String)
+    alert_count = Column(Integer, default=0)  # attacks (STARTED alerts)
+    attackers = Column(Integer, default=0)
+    victims = Column(Integer, default=0)
+    attacker_sample = Column(Text)  # JSON list of addresses
+    victim_sample = Column(Text)  # JSON list of addresses
+    kinds = Column(Text)  # JSON: subtype (or alert type) -> attacks
+    summary = Column(Text)
+    updated_at = Column(String)
+
+    __table_args__ = (
+        Index('idx_incident_id', 'incident_id', unique=True),
+        Index('idx_incident_last_seen', 'last_seen'),
+        Index('idx_incident_merged_into', 'merged_into'),
+    )
+
+
 class Signature(Base):
     """Signature rules for detection."""
     __tablename__ = "signatures"
@@ -86,6 +137,28 @@ class Signature(Base):
     enabled = Column(Integer, default=1)  # 1 = enabled, 0 = disabled
     created_at = Column(String)
     updated_at = Column(String)
+    # Match constraints (Snort/Suricata subset), defaults = match any packet anywhere
+    proto = Column(String, default="any")  # any, tcp, udp, icmp
+    src_ports = Column(String, default="any")  # e.g. "any", "80,443", "1024:", "!22"
+    dst_ports = Column(String, default="any")
+    nocase = Column(Integer, default=0)
+    offset = Column(Integer)  # pattern must start at or after this payload offset
+    depth = Column(Integer)  # ...and end within this many bytes from the offset
+    sid = Column(Integer)  # Snort/Suricata rule id, for imported rules
+    field = Column(String, default="any")  # any, uri, header, host, body (HTTP fields)
+
+
+class SignatureStats(Base):
+    """Running per-rule counters reported by the IDS (keyed by signature name)."""
+    __tablename__ = "signature_stats"
+
+    name = Column(String, primary_key=True)
+    matches = Column(Integer, default=0)
+    bytes_scanned = Column(Integer, default=0)  # payload bytes scanned by the rule's group
+    cost_ns = Column(Integer, default=0)  # time spent in the rule on profiled packets
+    profiled_packets = Column(Integer, default=0)
+    last_match = Column(String)
+    updated_at = Column(String)
 
 
 class StatsCache(Base):
@@ -133,6 +206,46 @@ class IoTDeviceState(Base):
     )
 
 
+# Columns added after the first release. create_all() only creates missing
+# tables, so existing databases get these through ALTER TABLE (and their
+# indexes through MIGRATED_INDEXES).
+MIGRATED_COLUMNS = {
+    "alerts": {
+        "uuid": "VARCHAR",
+        "incident_id": "VARCHAR",
+        "attack_id": "VARCHAR",
+    },
+    "signatures": {
+        "proto": "VARCHAR DEFAULT 'any'",
+        "src_ports": "VARCHAR DEFAULT 'any'",
+        "dst_ports": "VARCHAR DEFAULT 'any'",
+        "nocase": "INTEGER DEFAULT 0",
+        "offset": "INTEGER",
+        "depth": "INTEGER",
+        "sid": "INTEGER",
+        "field": "VARCHAR DEFAULT 'any'",
+    },
+}
+
+
+MIGRATED_INDEXES = {
+    "idx_alert_uuid": "CREATE UNIQUE INDEX IF NOT EXISTS idx_alert_uuid ON alerts (uuid)",
+    "idx_alert_incident": "CREATE INDEX IF NOT EXISTS idx_alert_incident ON alerts (incident_id)",
+    "idx_alert_attack": "CREATE UNIQUE INDEX IF NOT EXISTS idx_alert_attack ON alerts (attack_id)",
+}
+
+
+def _migrate_columns(conn):
+    """Add any missing MIGRATED_COLUMNS / MIGRATED_INDEXES to existing tables (sync, run via run_sync)."""
+    for table, columns in MIGRATED_COLUMNS.items():
+        existing = {row[1] for row in conn.exec_driver_sql(f"PRAGMA table_info({table})").fetchall()}
+        for column, ddl in columns.items():
+            if column not in existing:
+                conn.exec_driver_sql(f'ALTER TABLE {table} ADD COLUMN "{column}" {ddl}')
+    for ddl in MIGRATED_INDEXES.values():
+        conn.exec_driver_sql(ddl)
+
+
 async def init_db():
     """Initialize database tables and enable WAL mode for better concurrency."""
     async with engine.begin() as conn:
@@ -144,6 +257,7 @@ async def init_db():
 
         # Create tables
         await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(_migrate_columns)
 
 
 async def get_db():
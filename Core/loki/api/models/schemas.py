@@ -5,6 +5,7 @@ from pydantic import BaseModel, Field, validator
 from typing import Optional, List, Dict, Any
 from datetime import datetime
 from enum import Enum
+import re
 
 
 class AlertType(str, Enum):
@@ -20,6 +21,10 @@ class AlertSubtype(str, Enum):
     TCP_FLOOD = "TCP_FLOOD"
     UDP_FLOOD = "UDP_FLOOD"
     ICMP_FLOOD = "ICMP_FLOOD"
+    PAYLOAD_ANOMALY = "PAYLOAD_ANOMALY"
+    DNS_TUNNELING = "DNS_TUNNELING"
+    DNS_SUBDOMAIN_FLOOD = "DNS_SUBDOMAIN_FLOOD"
+    DNS_NXDOMAIN_FLOOD = "DNS_NXDOMAIN_FLOOD"
 
 
 class AlertStatus(str, Enum):
@@ -52,6 +57,9 @@ class AlertBase(BaseModel):
     average_rate_pps: Optional[float] = None  # For ENDED alerts
     first_seen: Optional[str] = None  # For ENDED alerts
     last_seen: Optional[str] = None  # For ENDED alerts
+    uuid: Optional[str] = None  # Set by the IDS
+    incident_id: Optional[str] = None  # Incident the IDS grouped this alert into
+    attack_id: Optional[str] = None  # Set by the IDS in "attack" storage (one row per attack)
 
 
 class AlertCreate(AlertBase):
@@ -72,12 +80,88 @@ class AlertListResponse(BaseModel):
     page_size: int
 
 
+class AlertHistoryEntry(BaseModel):
+    timestamp: str
+    status: Optional[AlertStatus] = None
+    packet_count: Optional[int] = None
+    rate_pps: Optional[float] = None
+    duration_seconds: Optional[float] = None
+
+
+class AlertHistoryResponse(BaseModel):
+    alert_id: int
+    attack_id: Optional[str] = None
+    history: List[AlertHistoryEntry]
+
+
+class IncidentStatus(str, Enum):
+    """Incident lifecycle status."""
+    OPEN = "OPEN"
+    CLOSED = "CLOSED"
+    MERGED = "MERGED"
+
+
+class IncidentResponse(BaseModel):
+    incident_id: str
+    status: IncidentStatus
+    merged_into: Optional[str] = None
+    first_seen: Optional[str] = None
+    last_seen: Optional[str] = None
+    alert_count: int = 0  # attacks (STARTED alerts)
+    attackers: int = 0
+    victims: int = 0
+    attacker_sample: List[str] = []
+    victim_sample: List[str] = []
+    kinds: Dict[str, int] = {}  # subtype (or alert type) -> attacks
+    summary: Optional[str] = None
+    merged: List[str] = []  # incidents merged into this one (single incident only)
+
+
+class IncidentListResponse(BaseModel):
+    incidents: List[IncidentResponse]
+    total: int
+    page: int
+    page_size: int
+
+
+SIGNATURE_PROTOS = ("any", "tcp", "udp", "icmp")
+SIGNATURE_FIELDS = ("any", "uri", "header", "host", "body")
+PORT_SPEC_RE = re.compile(r'^(any|!?\d*:?\d*(,\d*:?\d*)*)$')
+
+
+def _validate_proto(v):
+    if v is not None and v not in SIGNATURE_PROTOS:
+        raise ValueError(f'Proto must be one of: {", ".join(SIGNATURE_PROTOS)}')
+    return v
+
+
+def _validate_field(v):
+    if v is not None and v not in SIGNATURE_FIELDS:
+        raise ValueError(f'Field must be one of: {", ".join(SIGNATURE_FIELDS)}')
+    return v
+
+
+def _validate_ports(v):
+    if v is not None and not PORT_SPEC_RE.match(v):
+        raise ValueError('Ports must be "any" or a list like "80,443", "1024:", "!22"')
+    return v
+
+
 class SignatureBase(BaseModel):
     name: str
     pattern: str
     action: str = "alert"  # Only 'alert' now (drop removed)
     description: Optional[str] = None
     enabled: Optional[int] = 1
+    # Match constraints (Snort/Suricata subset)
+    proto: Optional[str] = "any"
+    src_ports: Optional[str] = "any"
+    dst_ports: Optional[str] = "any"
+    nocase: Optional[int] = 0
+    offset: Optional[int] = Field(None, ge=0)
+    depth: Optional[int] = Field(None, ge=1)
+    sid: Optional[int] = None
+    field: Optional[str] = "any"  # which part of an HTTP request to scan
     
     @validator('action')
     def validate_action(cls, v):
@@ -85,6 +169,10 @@ class SignatureBase(BaseModel):
             raise ValueError('Action must be "alert" (drop action has been removed)')
         return v
 
+    _check_proto = validator('proto', allow_reuse=True)(_validate_proto)
+    _check_ports = validator('src_ports', 'dst_ports', allow_reuse=True)(_validate_ports)
+    _check_field = validator('field', allow_reuse=True)(_validate_field)
+
 
 class SignatureCreate(SignatureBase):
     pass
@@ -96,6 +184,13 @@ class SignatureUpdate(BaseModel):
     action: Optional[str] = "alert"  # Only 'alert' now
     description: Optional[str] = None
     enabled: Optional[int] = None
+    proto: Optional[str] = None
+    src_ports: Optional[str] = None
+    dst_ports: Optional[str] = None
+    nocase: Optional[int] = None
+    offset: Optional[int] = Field(None, ge=0)
+    depth: Optional[int] = Field(None, ge=1)
+    field: Optional[str] = None
     
     @validator('action')
     def validate_action(cls, v):
@@ -103,16 +198,26 @@ class SignatureUpdate(BaseModel):
             raise ValueError('Action must be "alert" (drop action has been removed)')
         return v
 
+    _check_proto = validator('proto', allow_reuse=True)(_validate_proto)
+    _check_ports = validator('src_ports', 'dst_ports', allow_reuse=True)(_validate_ports)
+    _check_field = validator('field', allow_reuse=True)(_validate_field)
+
 
 class SignatureResponse(SignatureBase):
     id: int
     created_at: Optional[str] = None
     updated_at: Optional[str] = None
+    stats: Optional[Dict[str, Any]] = None  # hit counters reported by the IDS
     
     class Config:
         from_attributes = True
 
 
+class SignatureStatsReport(BaseModel):
+    # rule name -> [matches, bytes_scanned, cost_ns, profiled_packets, last_match (unix time or None)]
+    rules: Dict[str, List[Optional[float]]]
+
+
 class SystemStatus(BaseModel):
     ids_running: bool
     uptime: Optional[str] = None
@@ -7,7 +7,7 @@ from typing import Optional, List
 import json
 
 from ..models.database import get_db
-from ..models.schemas import AlertResponse, AlertListResponse, AlertType, AlertSubtype, AlertStatus
+from ..models.schemas import AlertResponse, AlertListResponse, AlertHistoryResponse, AlertType, AlertSubtype, AlertStatus
 from ..models import crud
 
 router = APIRouter(prefix="/alerts", tags=["alerts"])
@@ -18,13 +18,14 @@ async def get_alerts(
     page: int = Query(1, ge=1),
     page_size: int = Query(50, ge=1, le=200),
     alert_type: Optional[str] = Query(None, description="Filter by alert type (SIGNATURE, BEHAVIOR, SYSTEM)"),
-    subtype: Optional[str] = Query(None, description="Filter by subtype (PORT_SCAN, TCP_FLOOD, UDP_FLOOD, ICMP_FLOOD)"),
+    subtype: Optional[str] = Query(None, description="Filter by subtype (PORT_SCAN, TCP_FLOOD, UDP_FLOOD, ICMP_FLOOD, PAYLOAD_ANOMALY, DNS_TUNNELING, DNS_SUBDOMAIN_FLOOD, DNS_NXDOMAIN_FLOOD)"),
     pattern: Optional[str] = Query(None, description="Filter by pattern (for SIGNATURE alerts, case-insensitive search)"),
     status: Optional[str] = Query(None, description="Filter by status (STARTED, ONGOING, ENDED)"),
     src_ip: Optional[str] = Query(None, description="Filter by source IP address"),
     dst_ip: Optional[str] = Query(None, description="Filter by destination IP address"),
     start_time: Optional[str] = Query(None),
     end_time: Optional[str] = Query(None),
+    incident_id: Optional[str] = Query(None, description="Filter by incident (includes the incidents merged into it)"),
     db: AsyncSession = Depends(get_db)
 ):
     """Get alerts with filtering and pagination."""
@@ -36,6 +37,8 @@ async def get_alerts(
     if status and status not in [e.value for e in AlertStatus]:
         raise HTTPException(status_code=400, detail=f"Invalid status. Must be one of: {[e.value for e in AlertStatus]}")
     
+    incident_ids = await crud.get_incident_family(db, incident_id) if incident_id else None
+
     skip = (page - 1) * page_size
     alerts, total = await crud.get_alerts(
         db=db,
@@ -48,7 +51,8 @@ async def get_alerts(
         src_ip=src_ip,
         dst_ip=dst_ip,
         start_time=start_time,
-        end_time=end_time
+        end_time=end_time,
+        incident_ids=incident_ids
     )
     
     # Parse details JSON strings and include new fields
@@ -76,7 +80,9 @@ async def get_alerts(
             "total_packets": alert.total_packets,
             "average_rate_pps": float(alert.average_rate_pps) if alert.average_rate_pps and alert.average_rate_pps != "" else None,
             "first_seen": alert.first_seen,
-            "last_seen": alert.last_seen
+            "last_seen": alert.last_seen,
+            "incident_id": alert.incident_id,
+            "attack_id": alert.attack_id
         }
         alert_list.append(alert_dict)
     
@@ -120,10 +126,61 @@ async def get_alert(
         total_packets=alert.total_packets,
         average_rate_pps=float(alert.average_rate_pps) if alert.average_rate_pps and alert.average_rate_pps != "" else None,
         first_seen=alert.first_seen,
-        last_seen=alert.last_seen
+        last_seen=alert.last_seen,
+        incident_id=alert.incident_id,
+        attack_id=alert.attack_id
     )
 
 
+@router.get("/{alert_id}/history", response_model=AlertHistoryResponse)
+async def get_alert_history(
+    alert_id: int,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Get the STARTED / ONGOING / ENDED records folded into an attack row
+    (empty for alerts stored one row per record).
+    """
+    alert = await crud.get_alert_by_id(db, alert_id)
+    if not alert:
+        raise HTTPException(status_code=404, detail="Alert not found")
+
+    history = await crud.get_alert_history(db, alert.attack_id) if alert.attack_id else []
+    return AlertHistoryResponse(
+        alert_id=alert.id,
+        attack_id=alert.attack_id,
+        history=[{
+            "timestamp": entry.timestamp,
+            "status": entry.status,
+            "packet_count": entry.packet_count,
+            "rate_pps": entry.rate_pps,
+            "duration_seconds": entry.duration_seconds,
+        } for entry in history]
+    )
+
+
+def prepare_alert_data(alert_data: dict) -> dict:
+    """
+    Validate an alert sent by the IDS and convert it to the column formats.
+
+    Raises:
+        HTTPException: 400 if required fields are missing
+    """
+    # Quick validation
+    if not isinstance(alert_data, dict) or 'src_ip' not in alert_data or 'message' not in alert_data:
+        raise HTTPException(status_code=400, detail="Missing required fields")
+
+    # Ensure details is a JSON string if it's a dict
+    if 'details' in alert_data and isinstance(alert_data['details'], dict):
+        alert_data['details'] = json.dumps(alert_data['details'])
+
+    # Convert numeric fields to strings (as per schema)
+    for field in ['duration_seconds', 'attack_rate_pps', 'total_duration_seconds', 'average_rate_pps']:
+        if field in alert_data and alert_data[field] is not None:
+            alert_data[field] = str(alert_data[field])
+    return alert_data
+
+
 @router.post("", status_code=202)
 async def create_alert_endpoint(
     alert_data: dict,
@@ -132,24 +189,22 @@ async def create_alert_endpoint(
 ):
     """
     Create a new alert (used by IDS Core to report detections).
-    Accepts alert data and stores it in the database using background processing.
+    The alert joins the batches of the alert socket writer (one transaction
+    for many alerts) when it is running, else it is stored right away.
     Returns 202 Accepted immediately without blocking.
     """
-    try:
-        # Quick validation
-        if 'src_ip' not in alert_data or 'message' not in alert_data:
-            raise HTTPException(status_code=400, detail="Missing required fields")
+    # alert_socket imports prepare_alert_data from this module
+    from ..alert_socket import alert_socket
 
-        # Ensure details is a JSON string if it's a dict
-        if 'details' in alert_data and isinstance(alert_data['details'], dict):
-            alert_data['details'] = json.dumps(alert_data['details'])
+    try:
+        alert_data = prepare_alert_data(alert_data)
 
-        # Convert numeric fields to strings (as per schema)
-        for field in ['duration_seconds', 'attack_rate_pps', 'total_duration_seconds', 'average_rate_pps']:
-            if field in alert_data and alert_data[field] is not None:
-                alert_data[field] = str(alert_data[field])
+        if alert_socket.submit([alert_data]):
+            return {
+                "status": "accepted",
+                "message": "Alert queued for processing"
+            }
 
-        # Process in background to not block the response
         alert = await crud.create_alert(db, alert_data)
 
         # Return immediately with minimal response
@@ -169,6 +224,34 @@ async def create_alert_endpoint(
         }
 
 
+@router.post("/bulk", status_code=202)
+async def create_alerts_bulk(
+    payload: dict,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Create a batch of alerts in one transaction (used by the IDS alert shipper).
+    Body: {"alerts": [alert, ...]}; alerts missing required fields are skipped.
+    """
+    alerts = payload.get('alerts')
+    if not isinstance(alerts, list):
+        raise HTTPException(status_code=400, detail="Expected {\"alerts\": [...]}")
+
+    rows = []
+    for alert_data in alerts:
+        try:
+            rows.append(prepare_alert_data(alert_data))
+        except HTTPException:
+            pass
+
+    inserted = await crud.create_alerts(db, rows)
+    return {
+        "status": "accepted",
+        "inserted": inserted,
+        "rejected": len(alerts) - len(rows)
+    }
+
+
 @router.delete("/{alert_id}")
 async def delete_alert(
     alert_id: int,
@@ -0,0 +1,92 @@
+"""
+Incident endpoints.
+
+The IDS groups alerts sharing an attacker or a victim into incidents
+(incident_correlator.py) and sends a snapshot of each incident whenever it
+changes. The dashboard lists incidents instead of their individual
+alerts; GET /api/alerts?incident_id=... returns the alerts of one.
+"""
+from fastapi import APIRouter, Depends, Query, HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
+import json
+
+from ..models.database import get_db, Incident
+from ..models.schemas import IncidentResponse, IncidentListResponse, IncidentStatus
+from ..models import crud
+
+router = APIRouter(prefix="/incidents", tags=["incidents"])
+
+
+def incident_to_dict(incident: Incident) -> dict:
+    """Incident row -> response dict (JSON columns parsed)."""
+    return {
+        "incident_id": incident.incident_id,
+        "status": incident.status,
+        "merged_into": incident.merged_into,
+        "first_seen": incident.first_seen,
+        "last_seen": incident.last_seen,
+        "alert_count": incident.alert_count or 0,
+        "attackers": incident.attackers or 0,
+        "victims": incident.victims or 0,
+        "attacker_sample": json.loads(incident.attacker_sample) if incident.attacker_sample else [],
+        "victim_sample": json.loads(incident.victim_sample) if incident.victim_sample else [],
+        "kinds": json.loads(incident.kinds) if incident.kinds else {},
+        "summary": incident.summary,
+    }
+
+
+@router.get("", response_model=IncidentListResponse)
+async def get_incidents(
+    page: int = Query(1, ge=1),
+    page_size: int = Query(50, ge=1, le=200),
+    status: Optional[str] = Query(None, description="Filter by status (OPEN, CLOSED, MERGED); MERGED ones are hidden otherwise"),
+    ip: Optional[str] = Query(None, description="Filter by attacker or victim address"),
+    db: AsyncSession = Depends(get_db)
+):
+    """Get incidents, most recently active first."""
+    if status and status not in [e.value for e in IncidentStatus]:
+        raise HTTPException(status_code=400, detail=f"Invalid status. Must be one of: {[e.value for e in IncidentStatus]}")
+
+    incidents, total = await crud.get_incidents(db, skip=(page - 1) * page_size, limit=page_size, status=status, ip=ip)
+    return IncidentListResponse(
+        incidents=[incident_to_dict(incident) for incident in incidents],
+        total=total,
+        page=page,
+        page_size=page_size
+    )
+
+
+@router.get("/{incident_id}", response_model=IncidentResponse)
+async def get_incident(
+    incident_id: str,
+    db: AsyncSession = Depends(get_db)
+):
+    """Get one incident, with the ids of the incidents merged into it."""
+    incident = await crud.get_incident(db, incident_id)
+    if not incident:
+        raise HTTPException(status_code=404, detail="Incident not found")
+    family = await crud.get_incident_family(db, incident_id)
+    return IncidentResponse(**incident_to_dict(incident), merged=family[1:])
+
+
+@router.post("/bulk")
+async def upsert_incidents_bulk(
+    payload: dict,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Store incident snapshots (used by the IDS).
+    Body: {"incidents": [incident, ...]}; records without an incident_id are skipped.
+    """
+    incidents = payload.get('incidents')
+    if not isinstance(incidents, list):
+        raise HTTPException(status_code=400, detail="Expected {\"incidents\": [...]}")
+
+    rows = [incident for incident in incidents if isinstance(incident, dict) and incident.get('incident_id')]
+    stored = await crud.upsert_incidents(db, rows)
+    return {
+        "status": "ok",
+        "stored": stored,
+        "rejected": len(incidents) - len(rows)
+    }
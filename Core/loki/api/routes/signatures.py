@@ -1,20 +1,52 @@
 """
 Signature management endpoints.
 """
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Query
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
+import io
+import shutil
+import tempfile
+import time
 import yaml
 
+from starlette.concurrency import run_in_threadpool
+
 from ..models.database import get_db
 from ..models.schemas import (
-    SignatureResponse, SignatureCreate, SignatureUpdate
+    SignatureResponse, SignatureCreate, SignatureUpdate, SignatureStatsReport
 )
 from ..models import crud
+from ..ruleset_notifier import ruleset_notifier
+from ..snort_import import ImportReport, parse_rules
+from ..signature_testbench import TestBenchJob, load_candidate_rules, signature_test_bench
 
 router = APIRouter(prefix="/signatures", tags=["signatures"])
 
 
+def signature_response(sig, stats=None) -> SignatureResponse:
+    """Build the API response for a Signature row."""
+    return SignatureResponse(
+        id=sig.id,
+        name=sig.name,
+        pattern=sig.pattern,
+        action=sig.action,
+        description=sig.description,
+        enabled=sig.enabled,
+        created_at=sig.created_at,
+        updated_at=sig.updated_at,
+        proto=sig.proto or "any",
+        src_ports=sig.src_ports or "any",
+        dst_ports=sig.dst_ports or "any",
+        nocase=sig.nocase or 0,
+        offset=sig.offset,
+        depth=sig.depth,
+        sid=sig.sid,
+        field=sig.field or "any",
+        stats=stats
+    )
+
+
 @router.get("")
 async def get_signatures(
     enabled_only: bool = False,
@@ -37,19 +69,11 @@ async def get_signatures(
         action=action,
         enabled=enabled
     )
+    stats = await crud.get_signature_stats(db, [sig.name for sig in signatures])
     
     return {
         "signatures": [
-            SignatureResponse(
-                id=sig.id,
-                name=sig.name,
-                pattern=sig.pattern,
-                action=sig.action,
-                description=sig.description,
-                enabled=sig.enabled,
-                created_at=sig.created_at,
-                updated_at=sig.updated_at
-            )
+            signature_response(sig, stats.get(sig.name, crud.signature_stats_dict(None)))
             for sig in signatures
         ],
         "total": total,
@@ -58,6 +82,118 @@ async def get_signatures(
     }
 
 
+@router.get("/version")
+async def get_ruleset_version(
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Current version of the enabled ruleset.
+    The IDS compares the ETag with the one it has compiled.
+    """
+    return await ruleset_notifier.get_info(db)
+
+
+@router.get("/changes")
+async def wait_for_ruleset_change(
+    etag: Optional[str] = None,
+    timeout: float = Query(25, ge=0, le=60),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Long-poll change notification channel for the IDS.
+    Returns immediately if the ruleset ETag differs from `etag`,
+    otherwise holds the request until a change happens or `timeout` expires.
+    """
+    return await ruleset_notifier.wait_for_change(db, etag, timeout)
+
+
+@router.post("/stats")
+async def report_signature_stats(
+    report: SignatureStatsReport,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Per-rule counter deltas pushed periodically by the IDS.
+    They are added to the running totals.
+    """
+    count = await crud.add_signature_stats(db, report.rules)
+    return {"updated": count}
+
+
+@router.get("/stats")
+async def get_signature_stats(
+    db: AsyncSession = Depends(get_db)
+):
+    """Running per-rule counters, keyed by signature name."""
+    return await crud.get_signature_stats(db)
+
+
+@router.get("/noisy")
+async def get_noisy_rules(
+    limit: int = Query(10, ge=1, le=100),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Noisy rules report: rules that match the most, the most expensive
+    ones (sampled cost per packet), and rules that never matched.
+    """
+    return await crud.get_noisy_rules_report(db, limit)
+
+
+@router.post("/test", status_code=202)
+async def test_signatures(
+    pcap: UploadFile = File(...),
+    rules: Optional[UploadFile] = File(None),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Run a ruleset over an uploaded pcap/pcapng with the IDS matcher.
+
+    Without a `rules` file the enabled signatures are tested; with one
+    (signatures YAML or Snort/Suricata rules) that candidate ruleset is,
+    without touching the database. Runs in the background: poll
+    GET /signatures/test/{job_id} for progress and results.
+    """
+    if rules is not None and rules.filename:
+        try:
+            signatures, import_report = await run_in_threadpool(load_candidate_rules, rules.file, rules.filename)
+        except (yaml.YAMLError, KeyError, AttributeError) as e:
+            raise HTTPException(status_code=400, detail=f"Invalid rules file: {str(e)}")
+        ruleset_name = rules.filename
+    else:
+        rows, _ = await crud.get_signatures(db, enabled_only=True, limit=None)
+        signatures = [signature_response(sig).dict() for sig in rows]
+        import_report = None
+        ruleset_name = "active signatures"
+
+    if not signatures:
+        raise HTTPException(status_code=400, detail="No signatures to test")
+
+    # copy the upload to our own temp file, the background job outlives the request
+    with tempfile.NamedTemporaryFile(prefix="loki-test-", suffix=".pcap", delete=False) as tmp:
+        await run_in_threadpool(shutil.copyfileobj, pcap.file, tmp, 1024 * 1024)
+
+    job = signature_test_bench.submit(
+        TestBenchJob(tmp.name, pcap.filename, signatures, ruleset_name, import_report)
+    )
+    return job.to_dict()
+
+
+@router.get("/test")
+async def list_signature_tests():
+    """Recent test bench runs, newest first (summary only)."""
+    return signature_test_bench.list_jobs()
+
+
+@router.get("/test/{job_id}")
+async def get_signature_test(job_id: str):
+    """Status, progress and results of a test bench run."""
+    job = signature_test_bench.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Test run not found")
+    return job.to_dict()
+
+
 @router.get("/{sig_id}", response_model=SignatureResponse)
 async def get_signature(
     sig_id: int,
@@ -68,16 +204,7 @@ async def get_signature(
     if not signature:
         raise HTTPException(status_code=404, detail="Signature not found")
     
-    return SignatureResponse(
-        id=signature.id,
-        name=signature.name,
-        pattern=signature.pattern,
-        action=signature.action,
-        description=signature.description,
-        enabled=signature.enabled,
-        created_at=signature.created_at,
-        updated_at=signature.updated_at
-    )
+    return signature_response(signature)
 
 
 @router.post("", response_model=SignatureResponse, status_code=201)
@@ -93,17 +220,9 @@ async def create_signature(
     
     sig_data = signature.dict()
     new_sig = await crud.create_signature(db, sig_data)
+    ruleset_notifier.notify()
     
-    return SignatureResponse(
-        id=new_sig.id,
-        name=new_sig.name,
-        pattern=new_sig.pattern,
-        action=new_sig.action,
-        description=new_sig.description,
-        enabled=new_sig.enabled,
-        created_at=new_sig.created_at,
-        updated_at=new_sig.updated_at
-    )
+    return signature_response(new_sig)
 
 
 @router.put("/{sig_id}", response_model=SignatureResponse)
@@ -128,17 +247,9 @@ async def update_signature(
     updated = await crud.update_signature(db, sig_id, update_data)
     if not updated:
         raise HTTPException(status_code=404, detail="Signature not found")
+    ruleset_notifier.notify()
     
-    return SignatureResponse(
-        id=updated.id,
-        name=updated.name,
-        pattern=updated.pattern,
-        action=updated.action,
-        description=updated.description,
-        enabled=updated.enabled,
-        created_at=updated.created_at,
-        updated_at=updated.updated_at
-    )
+    return signature_response(updated)
 
 
 @router.delete("/{sig_id}")
@@ -150,6 +261,7 @@ async def delete_signature(
     success = await crud.delete_signature(db, sig_id)
     if not success:
         raise HTTPException(status_code=404, detail="Signature not found")
+    ruleset_notifier.notify()
     return {"message": "Signature deleted successfully"}
 
 
@@ -172,30 +284,25 @@ async def reload_signatures(
         all_rules = yaml.safe_load(yaml_content)
         signatures = all_rules.get('signatures', [])
         
-        # Import signatures directly to database
-        loaded_count = 0
-        for sig_data in signatures:
-            existing = await crud.get_signature_by_name(db, sig_data['name'])
-            if existing:
-                # Update existing
-                await crud.update_signature(db, existing.id, {
-                    'pattern': sig_data['pattern'],
-                    'action': 'alert',  # Only alert now
-                    'description': sig_data.get('description', ''),
-                    'enabled': 1
-                })
-            else:
-                # Create new
-                await crud.create_signature(db, {
-                    'name': sig_data['name'],
-                    'pattern': sig_data['pattern'],
-                    'action': 'alert',  # Only alert now
-                    'description': sig_data.get('description', ''),
-                    'enabled': 1
-                })
-            loaded_count += 1
-        
-        await db.commit()
+        # Import signatures directly to database (one bulk upsert)
+        loaded_count = await crud.bulk_upsert_signatures(db, [
+            {
+                'name': sig_data['name'],
+                'pattern': sig_data['pattern'],
+                'action': 'alert',  # Only alert now
+                'description': sig_data.get('description', ''),
+                'enabled': 1,
+                'proto': sig_data.get('proto', 'any'),
+                'src_ports': str(sig_data.get('src_ports', 'any')),
+                'dst_ports': str(sig_data.get('dst_ports', 'any')),
+                'nocase': 1 if sig_data.get('nocase') else 0,
+                'offset': sig_data.get('offset'),
+                'depth': sig_data.get('depth'),
+                'field': sig_data.get('field', 'any'),
+            }
+            for sig_data in signatures
+        ])
+        ruleset_notifier.notify()
         
         return {
             "message": f"Imported {loaded_count} signatures from uploaded YAML file",
@@ -208,4 +315,47 @@ async def reload_signatures(
         raise HTTPException(status_code=500, detail=f"Error reloading signatures: {str(e)}")
 
 
+def _parse_snort_upload(upload, report, include_disabled):
+    """Parse an uploaded rules file line by line (runs in a worker thread)."""
+    lines = io.TextIOWrapper(upload, encoding='utf-8', errors='replace')
+    try:
+        # last definition wins when a file repeats a rule
+        return {sig['name']: sig for sig in parse_rules(lines, report, include_disabled)}
+    finally:
+        lines.detach()
+
 
+@router.post("/import/snort")
+async def import_snort_rules(
+    file: UploadFile = File(...),
+    include_disabled: bool = False,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Import a Snort/Suricata rules file.
+
+    Supported subset: content (one pattern per rule), nocase, offset, depth,
+    proto and ports. Everything else is listed in the report's "unsupported"
+    counters. All rules are written in a single transaction.
+    """
+    start = time.perf_counter()
+    report = ImportReport()
+
+    # parsing an ET-size file takes seconds, keep it off the event loop
+    signatures = await run_in_threadpool(_parse_snort_upload, file.file, report, include_disabled)
+
+    try:
+        report.imported = await crud.bulk_upsert_signatures(db, list(signatures.values()))
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(status_code=500, detail=f"Error importing rules: {str(e)}")
+
+    if report.imported:
+        ruleset_notifier.notify()
+
+    return {
+        "message": f"Imported {report.imported} of {report.rules_seen} rules from {file.filename}",
+        "filename": file.filename,
+        **report.to_dict(),
+        "elapsed_ms": round((time.perf_counter() - start) * 1000, 1)
+    }
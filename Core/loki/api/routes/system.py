@@ -4,10 +4,13 @@ System status and control endpoints.
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime, timedelta
+from typing import Dict, Any
 
 from ..models.database import get_db
 from ..models.schemas import SystemStatus, HealthResponse
 from ..models import crud
+from ..ruleset_notifier import ruleset_notifier
+from ..alert_socket import alert_socket
 
 router = APIRouter(prefix="/system", tags=["system"])
 
@@ -99,12 +102,33 @@ async def health_check(
 
 
 @router.post("/reload-signatures")
-async def reload_signatures():
+async def reload_signatures(
+    db: AsyncSession = Depends(get_db)
+):
     """
-    Reload signatures from database.
-    This endpoint is kept for API compatibility but does not interact with IDS.
+    Ask the IDS to re-check its signatures.
+    Wakes up the IDS change listener; it rebuilds only if the ruleset ETag changed.
     """
-    raise HTTPException(
-        status_code=501,
-        detail="Signature reloading is not available. This is a standalone API without IDS integration."
-    )
+    ruleset_notifier.notify()
+    return await ruleset_notifier.get_info(db)
+
+
+@router.get("/ids-stats")
+async def get_ids_stats(
+    db: AsyncSession = Depends(get_db)
+):
+    """Runtime stats published by the IDS (active ruleset, counters, ...)."""
+    stats = await crud.get_ids_stats(db)
+    stats["alert_socket"] = alert_socket.get_stats()
+    return stats
+
+
+@router.put("/ids-stats/{key}")
+async def put_ids_stats(
+    key: str,
+    stats: Dict[str, Any],
+    db: AsyncSession = Depends(get_db)
+):
+    """Used by the IDS Core to publish a block of runtime stats."""
+    await crud.set_ids_stats(db, key, stats)
+    return {"status": "ok"}
@@ -0,0 +1,61 @@
+"""
+Ruleset change notifications for the IDS.
+
+Every signature change bumps a version counter and wakes up the IDS,
+which is long-polling /api/signatures/changes. The IDS then refetches
+the enabled signatures and hot-swaps its compiled matcher.
+"""
+import asyncio
+from typing import Optional, Dict, Any
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .models import crud
+
+
+class RulesetNotifier:
+    """Tracks the ruleset version/ETag and wakes up long-polling clients."""
+
+    def __init__(self):
+        self.version = 0                      # bumped on every change (resets on API restart)
+        self._etag: Optional[str] = None      # cached ETag, None = must be recomputed
+        self._count = 0
+        self._changed = asyncio.Event()
+
+    def notify(self):
+        """Call after any change to the signatures table."""
+        self.version += 1
+        self._etag = None
+        # wake up everyone waiting on the current event, new waiters get a fresh one
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def get_info(self, db: AsyncSession) -> Dict[str, Any]:
+        """Current version info: version, etag, count."""
+        if self._etag is None:
+            self._etag, self._count = await crud.get_ruleset_etag(db)
+        return {
+            "version": self.version,
+            "etag": self._etag,
+            "count": self._count
+        }
+
+    async def wait_for_change(self, db: AsyncSession, etag: Optional[str], timeout: float) -> Dict[str, Any]:
+        """
+        Return as soon as the ruleset ETag differs from `etag`,
+        or after `timeout` seconds with the (unchanged) current info.
+        """
+        event = self._changed
+        info = await self.get_info(db)
+        if info["etag"] != etag:
+            return info
+
+        try:
+            await asyncio.wait_for(event.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+
+        return await self.get_info(db)
+
+
+ruleset_notifier = RulesetNotifier()
@@ -0,0 +1,236 @@
+"""
+Signature test bench.
+
+Runs a ruleset (the active signatures, or a candidate rules file) over an
+uploaded pcap with the IDS's own matcher, to see what it would cost and
+what it would hit on our own traffic before enabling it.
+
+Jobs run one at a time in a background thread. The pcap is read from a
+temp file packet by packet, so its size doesn't matter.
+"""
+import io
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+import yaml
+
+# engine modules live next to api/ (api_server.py puts Core/loki on sys.path)
+from signature_engine import SignatureScanning
+from payload_normalizer import PayloadNormalizer
+from pcap_reader import PcapReader, PcapError
+
+from .snort_import import ImportReport, parse_rules
+
+
+MAX_JOBS = 20            # jobs kept for the dashboard (oldest dropped)
+TOP_RULES = 100          # rules listed in a result
+PROFILE_EVERY = 50       # time every rule on one payload out of N (the IDS uses 1000)
+PROGRESS_EVERY = 1024    # packets between progress updates
+
+
+def load_candidate_rules(fileobj, filename: str) -> tuple:
+    """
+    Parse a candidate ruleset: a signatures YAML (like example_signatures.yaml)
+    or a Snort/Suricata rules file (anything else).
+
+    Returns:
+        (list of signature dicts, import report dict or None)
+    """
+    if filename.lower().endswith(('.yaml', '.yml')):
+        data = yaml.safe_load(fileobj) or {}
+        signatures = [
+            {
+                'name': sig['name'],
+                'pattern': sig['pattern'],
+                'action': 'alert',
+                'description': sig.get('description', ''),
+                'proto': sig.get('proto', 'any'),
+                'src_ports': str(sig.get('src_ports', 'any')),
+                'dst_ports': str(sig.get('dst_ports', 'any')),
+                'nocase': 1 if sig.get('nocase') else 0,
+                'offset': sig.get('offset'),
+                'depth': sig.get('depth'),
+                'field': sig.get('field', 'any'),
+            }
+            for sig in data.get('signatures', [])
+        ]
+        return signatures, None
+
+    report = ImportReport()
+    lines = io.TextIOWrapper(fileobj, encoding='utf-8', errors='replace')
+    try:
+        signatures = {sig['name']: sig for sig in parse_rules(lines, report)}
+    finally:
+        lines.detach()
+    report.imported = len(signatures)
+    return list(signatures.values()), report.to_dict()
+
+
+class TestBenchJob:
+    """One pcap x ruleset run."""
+
+    def __init__(self, pcap_path: str, pcap_name: str, signatures: List[Dict[str, Any]],
+                 ruleset_name: str, import_report: Optional[Dict[str, Any]] = None):
+        self.id = uuid.uuid4().hex[:12]
+        self.pcap_path = pcap_path
+        self.pcap_name = pcap_name
+        self.pcap_size = os.path.getsize(pcap_path)
+        self.signatures = signatures
+        self.rule_count = len(signatures)
+        self.ruleset_name = ruleset_name
+        self.import_report = import_report
+
+        self.status = "queued"   # queued -> running -> done | failed
+        self.error = None
+        self.created_at = time.time()
+        self.bytes_read = 0
+        self.packets = 0
+        self.result = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "status": self.status,
+            "pcap": self.pcap_name,
+            "pcap_size": self.pcap_size,
+            "ruleset": self.ruleset_name,
+            "rules": self.rule_count,
+            "import_report": self.import_report,
+            "progress": round(self.bytes_read / self.pcap_size, 3) if self.pcap_size else 1.0,
+            "packets": self.packets,
+            "error": self.error,
+            "result": self.result,
+        }
+
+
+class SignatureTestBench:
+    """Queues test bench jobs and runs them one at a time."""
+
+    def __init__(self):
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="signature-test")
+
+    def submit(self, job: TestBenchJob) -> TestBenchJob:
+        """Queue a job (the pcap file is deleted once it has run)."""
+        with self._lock:
+            self._jobs[job.id] = job
+            while len(self._jobs) > MAX_JOBS:
+                self._jobs.popitem(last=False)
+        self._executor.submit(self._run, job)
+        return job
+
+    def get(self, job_id: str) -> Optional[TestBenchJob]:
+        return self._jobs.get(job_id)
+
+    def list_jobs(self) -> List[Dict[str, Any]]:
+        """Recent jobs, newest first (without the per-rule results)."""
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return [{**job.to_dict(), "result": None} for job in reversed(jobs)]
+
+    def _run(self, job: TestBenchJob):
+        job.status = "running"
+        try:
+            job.result = run_test(job)
+            job.status = "done"
+        except PcapError as e:
+            job.status, job.error = "failed", str(e)
+        except Exception as e:
+            print(f"[!] Signature test {job.id} failed: {e}")
+            job.status, job.error = "failed", f"{type(e).__name__}: {e}"
+        finally:
+            job.signatures = []  # free the ruleset, the result is all we keep
+            try:
+                os.remove(job.pcap_path)
+            except OSError:
+                pass
+
+
+def run_test(job: TestBenchJob) -> Dict[str, Any]:
+    """
+    Run the job's ruleset over its pcap with the real SignatureScanning.
+
+    Only the CheckPacketPayload calls are timed, so MB/s is the matcher's
+    throughput, not the pcap decoding's. Like in the IDS, a packet counts
+    for the first rule it matches only.
+    """
+    start = time.perf_counter()
+
+    scanner = SignatureScanning(normalizer=PayloadNormalizer(), autoload=False)
+    scanner.profile_every = sys.maxsize  # profiled below, outside the timed calls
+    ruleset = scanner.build_rules(job.signatures, version="test-bench")
+    compile_ms = (time.perf_counter() - start) * 1000
+
+    payload_packets = payload_bytes = match_ns = 0
+    clock = time.perf_counter_ns
+    check = scanner.CheckPacketPayload
+
+    with open(job.pcap_path, 'rb') as f:
+        reader = PcapReader(f)
+        for packet in reader:
+            job.packets += 1
+            if job.packets % PROGRESS_EVERY == 0:
+                job.bytes_read = reader.bytes_read
+
+            payload = packet.payload
+            if not payload:
+                continue  # the IDS only scans packets with a payload
+            payload_packets += 1
+            payload_bytes += len(payload)
+
+            begin = clock()
+            check(payload, packet.proto, packet.src_port, packet.dst_port,
+                  flow=(packet.src_ip, packet.src_port, packet.dst_ip, packet.dst_port))
+            match_ns += clock() - begin
+
+            if payload_packets % PROFILE_EVERY == 0:
+                scanner.profile(ruleset, payload)
+
+        job.bytes_read = reader.bytes_read
+        pcap_stats = reader.get_stats()
+
+    stats = ruleset.stats
+    rules = []
+    for rule_id, rule in enumerate(ruleset.rules):
+        rules.append({
+            "name": rule['name'],
+            "matches": stats.matches[rule_id],
+            "hit_rate": round(stats.matches[rule_id] / payload_packets, 6) if payload_packets else 0.0,
+            "bytes_scanned": stats.group_bytes[ruleset.rule_groups[rule_id]],
+            "avg_cost_ns": round(stats.cost_ns[rule_id] / stats.profiled_packets) if stats.profiled_packets else None,
+        })
+    rules.sort(key=lambda r: (-r["matches"], -(r["avg_cost_ns"] or 0)))
+
+    match_seconds = match_ns / 1e9
+    elapsed = time.perf_counter() - start
+    alerts = sum(stats.matches)
+    return {
+        "rules": len(ruleset),
+        "rule_groups": len(ruleset.groups),
+        "compile_ms": round(compile_ms, 1),
+        "packets": job.packets,
+        "skipped_records": pcap_stats['skipped'],
+        "payload_packets": payload_packets,
+        "payload_bytes": payload_bytes,
+        "bytes_scanned": sum(stats.group_bytes),
+        "alerts": alerts,
+        "alert_rate": round(alerts / payload_packets, 6) if payload_packets else 0.0,
+        "rules_matched": sum(1 for r in rules if r["matches"]),
+        "match_seconds": round(match_seconds, 3),
+        "mb_per_s": round(payload_bytes / match_seconds / 1e6, 2) if match_seconds else None,
+        "packets_per_s": round(payload_packets / match_seconds) if match_seconds else None,
+        "profiled_packets": stats.profiled_packets,
+        "elapsed_seconds": round(elapsed, 3),
+        "http": scanner.http_parser.get_stats(),
+        "top_rules": rules[:TOP_RULES],
+    }
+
+
+signature_test_bench = SignatureTestBench()
@@ -0,0 +1,340 @@
+"""
+Snort/Suricata rule importer.
+
+Maps the common subset of Snort/Suricata rules onto Loki signatures
+(plus the HTTP buffers Loki can target: uri, header, host, body):
+
+    alert tcp $EXTERNAL_NET any -> $HOME_NET $HTTP_PORTS (msg:"..."; content:"|3C|script"; nocase; offset:0; depth:64; sid:1000001;)
+          ^^^                            ^^^              ^^^^^^^^^^^          ^^^^^^          ^^^^^^^^^  ^^^^^^^^  ^^^^^^^^^^^^
+          proto                     src_ports  dst_ports    pattern            nocase          offset     depth     sid
+
+Anything outside that subset is counted per option in the import report
+instead of failing the whole file. Rules are parsed one line at a time,
+so big rule files never have to be held in memory as a whole.
+"""
+import re
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+
+# Snort/Suricata protocols -> Loki proto
+PROTO_MAP = {
+    "tcp": "tcp", "udp": "udp", "icmp": "icmp", "ip": "any",
+    # application layer keywords ride on a transport
+    "http": "tcp", "http1": "tcp", "http2": "tcp", "tls": "tcp", "ssh": "tcp", "ftp": "tcp",
+    "ftp-data": "tcp", "smtp": "tcp", "imap": "tcp", "pop3": "tcp", "smb": "tcp",
+    "dcerpc": "tcp", "krb5": "any", "dns": "any", "ntp": "udp", "tftp": "udp",
+    "dhcp": "udp", "snmp": "udp", "sip": "any", "rdp": "tcp", "mqtt": "tcp", "modbus": "tcp",
+}
+
+# Port variables, with the defaults shipped in suricata.yaml
+PORT_VARS = {
+    "HTTP_PORTS": "80",
+    "SHELLCODE_PORTS": "!80",
+    "ORACLE_PORTS": "1521",
+    "SSH_PORTS": "22",
+    "DNP3_PORTS": "20000",
+    "MODBUS_PORTS": "502",
+    "FILE_DATA_PORTS": "[$HTTP_PORTS,110,143]",
+    "FTP_PORTS": "21",
+    "GENEVE_PORTS": "6081",
+    "VXLAN_PORTS": "4789",
+    "TEREDO_PORTS": "3544",
+}
+
+# Snort content modifiers -> Loki HTTP field
+CONTENT_FIELD_MODIFIERS = {
+    "http_uri": "uri", "http_raw_uri": "uri",
+    "http_header": "header", "http_raw_header": "header",
+    "http_cookie": "header", "http_user_agent": "header",
+    "http_host": "host", "http_raw_host": "host",
+    "http_client_body": "body",
+}
+
+# Suricata sticky buffers (apply to the contents that follow) -> Loki HTTP field
+STICKY_BUFFERS = {
+    "pkt_data": "any",
+    "http.uri": "uri", "http.uri.raw": "uri",
+    "http.header": "header", "http.header.raw": "header",
+    "http.cookie": "header", "http.user_agent": "header",
+    "http.host": "host", "http.host.raw": "host",
+    "http.request_body": "body", "http_client_body": "body",
+    "file_data": "body", "file.data": "body",
+}
+
+# Options that carry no matching semantics, taken without a warning
+METADATA_OPTIONS = {
+    "msg", "sid", "rev", "gid", "classtype", "reference", "metadata", "priority", "target",
+    "fast_pattern", "rawbytes",
+}
+
+ACTIONS = {"alert", "drop", "reject", "sdrop", "rejectsrc", "rejectdst", "rejectboth", "pass", "log"}
+
+RULE_RE = re.compile(r'^(\w+)\s+(\S+)\s+(\S+)\s+(\S+)\s+(->|<>)\s+(\S+)\s+(\S+)\s*\((.*)\)\s*$')
+OPTION_RE = re.compile(r'\s*([A-Za-z_][\w.\-]*)\s*(?::\s*((?:[^;"\\]|\\.|"(?:[^"\\]|\\.)*")*))?;')
+CONTENT_RE = re.compile(r'^(!?)\s*"((?:[^"\\]|\\.)*)"\s*(?:,(.*))?$')
+VAR_RE = re.compile(r'\$(\w+)')
+PORT_ITEM_RE = re.compile(r'^\d*:?\d*$')
+MAX_ERRORS = 20
+
+
+class ImportReport:
+    """What happened during one import (returned to the dashboard)."""
+
+    def __init__(self):
+        self.rules_seen = 0
+        self.imported = 0
+        self.skipped: Dict[str, int] = {}
+        self.unsupported: Dict[str, int] = {}
+        self.errors: List[Dict[str, Any]] = []
+
+    def skip(self, reason: str):
+        self.skipped[reason] = self.skipped.get(reason, 0) + 1
+
+    def unsupported_option(self, option: str):
+        self.unsupported[option] = self.unsupported.get(option, 0) + 1
+
+    def error(self, line_no: int, message: str):
+        self.skip("parse error")
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append({"line": line_no, "error": message})
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "rules_seen": self.rules_seen,
+            "imported": self.imported,
+            "skipped": self.skipped,
+            "unsupported": dict(sorted(self.unsupported.items(), key=lambda item: -item[1])),
+            "errors": self.errors,
+        }
+
+
+class RuleError(ValueError):
+    """A rule line that can't be turned into a signature."""
+
+
+def decode_content(text: str) -> bytes:
+    """
+    Decode a content string: backslash escapes plus |hex| blocks.
+    e.g. 'GET |2F|admin\\;' -> b'GET /admin;'
+    """
+    parts = text.split('|')
+    if len(parts) % 2 == 0:
+        raise RuleError("unbalanced '|' in content")
+
+    out = bytearray()
+    for i, part in enumerate(parts):
+        if i % 2:
+            try:
+                out += bytes.fromhex(part)
+            except ValueError:
+                raise RuleError(f"bad hex block |{part}|")
+        else:
+            out += re.sub(r'\\(.)', r'\1', part).encode('utf-8')
+    return bytes(out)
+
+
+def convert_ports(spec: str, report: ImportReport) -> str:
+    """Snort port spec -> Loki port spec ("any", "80,443", "1024:", "!22")."""
+    for _ in range(5):  # nested variables
+        if '$' not in spec:
+            break
+        spec = VAR_RE.sub(lambda m: PORT_VARS.get(m.group(1), "any"), spec)
+
+    if spec == "any" or "any" in spec:
+        return "any"
+
+    negated = spec.startswith('!')
+    spec = spec.lstrip('!').strip('[]').replace('[', '').replace(']', '')
+    items = [item for item in spec.split(',') if item]
+    if not items or any(not PORT_ITEM_RE.match(item) for item in items):
+        # negations inside lists etc.
+        report.unsupported_option("port list negation")
+        return "any"
+
+    return ('!' if negated else '') + ','.join(items)
+
+
+def parse_options(body: str) -> Iterator[tuple]:
+    """Yield (keyword, value) pairs from the part of a rule between the parentheses."""
+    if not body.rstrip().endswith(';'):
+        body = body.rstrip() + ';'
+    for match in OPTION_RE.finditer(body):
+        yield match.group(1).lower(), (match.group(2) or '').strip()
+
+
+def parse_rule(line: str, report: ImportReport, enabled: int = 1) -> Optional[Dict[str, Any]]:
+    """
+    Convert one rule line into a signature dict.
+
+    Returns:
+        dict for crud.bulk_upsert_signatures(), or None if the rule is skipped
+    Raises:
+        RuleError: the line is not a valid rule
+    """
+    match = RULE_RE.match(line)
+    if not match:
+        raise RuleError("not a rule (expected: action proto src sport -> dst dport (options))")
+
+    action, proto, src, src_ports, direction, dst, dst_ports, body = match.groups()
+    action = action.lower()
+    if action not in ACTIONS:
+        raise RuleError(f"unknown action '{action}'")
+    if action in ("pass", "log"):
+        report.skip(f"action {action}")
+        return None
+    if action != "alert":
+        report.unsupported_option(f"action {action} (imported as alert)")
+
+    loki_proto = PROTO_MAP.get(proto.lower())
+    if loki_proto is None:
+        report.unsupported_option(f"proto {proto}")
+        loki_proto = "any"
+
+    for address in (src, dst):
+        if address != "any" and not address.lstrip('!').startswith('$'):
+            report.unsupported_option("ip address")
+
+    src_ports = convert_ports(src_ports, report)
+    dst_ports = convert_ports(dst_ports, report)
+    if direction == "<>" and (src_ports != "any" or dst_ports != "any"):
+        report.unsupported_option("bidirectional ports")
+        src_ports = dst_ports = "any"
+
+    msg = sid = classtype = None
+    contents = []  # [pattern bytes, nocase, offset, depth, fast_pattern, field]
+    buffer = "any"  # current sticky buffer
+    for keyword, value in parse_options(body):
+        if keyword == "content":
+            content = CONTENT_RE.match(value)
+            if not content:
+                raise RuleError(f"bad content value {value!r}")
+            if content.group(1):
+                report.unsupported_option("negated content")
+                continue
+            entry = [decode_content(content.group(2)), False, None, None, False, buffer]
+            contents.append(entry)
+            # Snort 3 style inline modifiers: content:"abc", nocase, depth 10;
+            for modifier in (content.group(3) or '').split(','):
+                name, _, arg = modifier.strip().partition(' ')
+                if name:
+                    _apply_modifier(entry, name, arg.strip(), report)
+        elif keyword in ("nocase", "offset", "depth", "fast_pattern") or keyword in CONTENT_FIELD_MODIFIERS:
+            if contents:
+                _apply_modifier(contents[-1], keyword, value, report)
+        elif keyword in STICKY_BUFFERS:
+            buffer = STICKY_BUFFERS[keyword]
+        elif '.' in keyword and not value:
+            # another sticky buffer (dns.query, tls.sni...), scan the whole payload instead
+            report.unsupported_option(f"buffer {keyword}")
+            buffer = "any"
+        elif keyword == "msg":
+            msg = re.sub(r'\\(.)', r'\1', value.strip('"'))
+        elif keyword == "sid":
+            sid = int(value) if value.isdigit() else None
+        elif keyword == "classtype":
+            classtype = value
+        elif keyword not in METADATA_OPTIONS:
+            report.unsupported_option(keyword)
+
+    if not contents:
+        report.skip("no usable content")
+        return None
+
+    # the fast_pattern content (or the longest one) is the one Loki matches on
+    fast = [entry for entry in contents if entry[4]]
+    primary = fast[0] if fast else max(contents, key=lambda entry: len(entry[0]))
+    if len(contents) > 1:
+        report.unsupported_option("additional content (only one pattern per rule)")
+
+    pattern_bytes, nocase, offset, depth, _, field = primary
+    try:
+        pattern = pattern_bytes.decode('utf-8')
+    except UnicodeDecodeError:
+        report.skip("binary content")
+        return None
+
+    name = msg or "Imported rule"
+    if sid is not None:
+        name = f"{name} (sid:{sid})"
+
+    return {
+        "name": name,
+        "pattern": pattern,
+        "action": "alert",
+        "description": f"{msg or ''} [{classtype}]".strip() if classtype else (msg or ''),
+        "enabled": enabled,
+        "proto": loki_proto,
+        "src_ports": src_ports,
+        "dst_ports": dst_ports,
+        "nocase": 1 if nocase else 0,
+        "offset": offset,
+        "depth": depth,
+        "sid": sid,
+        "field": field,
+    }
+
+
+def _apply_modifier(entry: list, name: str, value: str, report: ImportReport):
+    """Apply a content modifier (nocase, offset, depth, fast_pattern, http_*) to a parsed content."""
+    if name in CONTENT_FIELD_MODIFIERS:
+        entry[5] = CONTENT_FIELD_MODIFIERS[name]
+    elif name == "nocase":
+        entry[1] = True
+    elif name == "fast_pattern":
+        entry[4] = True
+    elif name in ("offset", "depth"):
+        if not value.isdigit():
+            report.unsupported_option(f"{name} variable")
+        elif name == "offset":
+            entry[2] = int(value)
+        else:
+            entry[3] = int(value)
+    else:
+        report.unsupported_option(name)
+
+
+def parse_rules(lines: Iterable[str], report: ImportReport, include_disabled: bool = False) -> Iterator[Dict[str, Any]]:
+    """
+    Stream signature dicts out of rule file lines.
+
+    Args:
+        lines: iterable of text lines (e.g. an open file)
+        report: ImportReport to fill
+        include_disabled: also import commented-out rules ("# alert ..."), as disabled signatures
+    """
+    pending = ""
+    start_line = 0
+    for line_no, line in enumerate(lines, 1):
+        line = line.strip()
+        if not pending:
+            start_line = line_no
+
+        # multi-line rules end their lines with a backslash
+        if line.endswith('\\'):
+            pending += line[:-1] + " "
+            continue
+        line = pending + line
+        pending = ""
+
+        enabled = 1
+        if line.startswith('#'):
+            text = line.lstrip('#').strip()
+            if text.split(' ', 1)[0].lower() not in ACTIONS or '(' not in text:
+                continue  # a real comment
+            if not include_disabled:
+                report.skip("disabled (commented out)")
+                continue
+            line, enabled = text, 0
+
+        if not line:
+            continue
+
+        report.rules_seen += 1
+        try:
+            signature = parse_rule(line, report, enabled)
+        except RuleError as e:
+            report.error(start_line, str(e))
+            continue
+
+        if signature:
+            yield signature
@@ -0,0 +1,1038 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks for the Loki IDS detection core.
+Runs without NetfilterQueue or the Web Interface, so it works on any dev machine.
+
+Usage:
+    python3 benchmark.py                # run every suite
+    python3 benchmark.py normalizer     # run a single suite
+"""
+import os
+import sys
+import time
+
+# Add current directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import yaml
+
+from payload_normalizer import PayloadNormalizer
+from signature_engine import SignatureScanning, CompiledRuleset
+from ruleset_cache import RulesetCache
+from api.snort_import import ImportReport, parse_rules
+from scan_pool import ScanPool
+from payload_anomaly import PayloadAnomalyDetector
+from tls_fingerprint import TlsFingerprinter, parse_client_hello
+from dns_detector import DnsDetector, parse_dns
+from flow_table import FlowTable
+from packet_parser import parse_packet
+from detectore_engine import PortScanningDetector
+from db_integration import DatabaseIntegration
+
+
+SIGNATURES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "example_signatures.yaml")
+
+# Representative payloads (roughly what we see on the Pi)
+SAMPLE_PAYLOADS = {
+    "http_get_clean": (
+        b"GET /index.html HTTP/1.1\r\nHost: 10.0.0.1\r\n"
+        b"User-Agent: Mozilla/5.0\r\nAccept: */*\r\n\r\n"
+    ),
+    "http_get_encoded": (
+        b"GET /search?q=%3CSCRIPT%3Ealert(1)%3C%2Fscript%3E&f=..%2F..%2Fetc%2Fpasswd HTTP/1.1\r\n"
+        b"Host: 10.0.0.1\r\n\r\n"
+    ),
+    "form_post": (
+        b"POST /login.php HTTP/1.1\r\nHost: 10.0.0.1\r\n"
+        b"Content-Type: application/x-www-form-urlencoded\r\n\r\n"
+        b"user=admin%27+OR+%271%27%3D%271&pass=x"
+    ),
+    "binary_1400": bytes(range(256)) * 5 + bytes(120),
+}
+
+
+# ============================================================
+# Helpers
+# ============================================================
+
+def measure(func, payloads, rounds=5, min_time=0.2):
+    """
+    Time func(payload) over all payloads.
+
+    Returns:
+        (ns per call, MB/s) - best of `rounds` runs
+    """
+    total_bytes = sum(len(p) for p in payloads)
+
+    # find a loop count that runs for at least min_time
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(loops):
+            for p in payloads:
+                func(p)
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            break
+        loops *= 2
+
+    best = elapsed
+    for _ in range(rounds - 1):
+        start = time.perf_counter()
+        for _ in range(loops):
+            for p in payloads:
+                func(p)
+        best = min(best, time.perf_counter() - start)
+
+    calls = loops * len(payloads)
+    ns_per_call = best / calls * 1e9
+    mb_per_s = (total_bytes * loops) / best / 1e6
+    return ns_per_call, mb_per_s
+
+
+def report(name, ns_per_call, mb_per_s):
+    print(f"  {name:<40} {ns_per_call:>10.0f} ns/op {mb_per_s:>10.1f} MB/s")
+
+
+def load_example_signatures():
+    """Load example_signatures.yaml in the same format the API returns."""
+    with open(SIGNATURES_FILE) as f:
+        return yaml.safe_load(f).get('signatures', [])
+
+
+def make_scanner(signatures, normalizer=None):
+    """Build a SignatureScanning without talking to the API."""
+    scanner = SignatureScanning(normalizer=normalizer, autoload=False)
+    scanner.build_rules(signatures)
+    return scanner
+
+
+# ============================================================
+# Suites
+# ============================================================
+
+def bench_normalizer():
+    """Cost of each payload normalizer step, and of the full pipeline."""
+    normalizer = PayloadNormalizer()
+
+    steps = [
+        ("replace_plus", normalizer.replace_plus),
+        ("decode_percent", normalizer.decode_percent),
+        ("squash_whitespace", normalizer.squash_whitespace),
+        ("case_fold (bytes.lower)", bytes.lower),
+        ("normalize (full pipeline)", normalizer.normalize),
+    ]
+
+    for payload_name, payload in SAMPLE_PAYLOADS.items():
+        print(f"\n[{payload_name}] ({len(payload)} bytes)")
+        for step_name, func in steps:
+            report(step_name, *measure(func, [payload]))
+
+    print()
+    print(f"  normalizer stats: {normalizer.get_stats()}")
+
+    # End-to-end: signature scan with and without normalization
+    signatures = load_example_signatures()
+    payloads = list(SAMPLE_PAYLOADS.values())
+    print(f"\n[signature scan, {len(signatures)} rules, mixed payloads]")
+    plain = make_scanner(signatures)
+    normalized = make_scanner(signatures, normalizer=PayloadNormalizer())
+    report("CheckPacketPayload (raw)", *measure(plain.CheckPacketPayload, payloads))
+    report("CheckPacketPayload (normalized)", *measure(normalized.CheckPacketPayload, payloads))
+
+
+def bench_ruleset_cache():
+    """Boot time: compiling rules from the API response vs. loading the on-disk cache."""
+    import tempfile
+
+    normalizer = PayloadNormalizer()
+    signatures = [
+        {'name': f"Rule {i}", 'pattern': f"evil-pattern-{i:05d}", 'action': "alert",
+         'description': f"synthetic rule number {i}"}
+        for i in range(10000)
+    ]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = RulesetCache(cache_dir=tmp)
+
+        start = time.perf_counter()
+        ruleset = CompiledRuleset.compile(signatures, normalizer, version="bench")
+        compile_ms = (time.perf_counter() - start) * 1000
+
+        cache.save(ruleset.rules, ruleset.content_hash, ruleset.version, normalizer.config_key())
+        size = os.path.getsize(cache.filepath)
+
+        best = None
+        for _ in range(5):
+            cached = cache.load()
+            best = cached['load_ms'] if best is None else min(best, cached['load_ms'])
+
+    print(f"\n[{len(signatures)} rules, cache file {size / 1024:.0f} KiB]")
+    print(f"  {'compile from signatures':<40} {compile_ms:>10.1f} ms")
+    print(f"  {'load from cache (mmap)':<40} {best:>10.1f} ms")
+
+
+def make_snort_rules(count):
+    """Synthetic Snort/Suricata rule lines using the supported subset."""
+    headers = [
+        "alert http $EXTERNAL_NET any -> $HOME_NET $HTTP_PORTS",
+        "alert tcp $EXTERNAL_NET any -> $HOME_NET 445",
+        "alert udp any any -> any 53",
+        "alert tcp any any -> any any",
+    ]
+    return [
+        f'{headers[i % len(headers)]} (msg:"Synthetic rule {i}"; flow:established,to_server; '
+        f'content:"evil-{i:05d}|0d 0a|"; nocase; depth:512; classtype:trojan-activity; sid:{3000000 + i}; rev:1;)'
+        for i in range(count)
+    ]
+
+
+def bench_snort_import():
+    """Parsing a 10k-rule Snort file, and scanning with proto/port rule groups."""
+    lines = make_snort_rules(10000)
+
+    start = time.perf_counter()
+    import_report = ImportReport()
+    signatures = list(parse_rules(lines, import_report))
+    parse_ms = (time.perf_counter() - start) * 1000
+
+    print(f"\n[{len(lines)} Snort rules]")
+    print(f"  {'parse':<40} {parse_ms:>10.1f} ms ({len(lines) / parse_ms * 1000:,.0f} rules/s)")
+    print(f"  unsupported options: {import_report.to_dict()['unsupported']}")
+
+    normalizer = PayloadNormalizer()
+    start = time.perf_counter()
+    scanner = make_scanner(signatures, normalizer)
+    print(f"  {'compile':<40} {(time.perf_counter() - start) * 1000:>10.1f} ms "
+          f"({len(scanner.ruleset.groups)} rule groups)")
+
+    payloads = list(SAMPLE_PAYLOADS.values())
+    print(f"\n[scan, {len(signatures)} rules]")
+    report("no headers (every group)", *measure(scanner.CheckPacketPayload, payloads, rounds=3))
+    report("tcp -> 80 (http group + any)",
+           *measure(lambda p: scanner.CheckPacketPayload(p, "tcp", 40000, 80), payloads, rounds=3))
+    report("udp -> 123 (no group applies)",
+           *measure(lambda p: scanner.CheckPacketPayload(p, "udp", 40000, 123), payloads, rounds=3))
+
+
+def bench_scan_pool(worker_counts=(1, 2, 4), packets=5000, rules=2000):
+    """Throughput of inline matching vs. the process pool with N workers."""
+    signatures = [
+        {'name': f"Rule {i}", 'pattern': f"evil-pattern-{i:05d}", 'action': "alert"}
+        for i in range(rules)
+    ]
+    scanner = make_scanner(signatures, PayloadNormalizer())
+    payloads = list(SAMPLE_PAYLOADS.values())
+    total_bytes = sum(len(payloads[i % len(payloads)]) for i in range(packets))
+
+    print(f"\n[{rules} rules, {packets} packets, {os.cpu_count()} CPU(s)]")
+
+    start = time.perf_counter()
+    for i in range(packets):
+        scanner.CheckPacketPayload(payloads[i % len(payloads)], "tcp", 40000, 80)
+    elapsed = time.perf_counter() - start
+    print(f"  {'inline (no pool)':<40} {packets / elapsed:>10.0f} pkt/s {total_bytes / elapsed / 1e6:>8.1f} MB/s")
+
+    for workers in worker_counts:
+        pool = ScanPool(scanner, workers=workers, slots=4096)
+        pool.start()
+        # let the workers boot and receive the ruleset
+        pool.submit(b"warm-up")
+        pool.wait_idle(timeout=30)
+
+        start = time.perf_counter()
+        for i in range(packets):
+            pool.submit(payloads[i % len(payloads)], "tcp", 40000, 80)
+        pool.wait_idle(timeout=120)
+        elapsed = time.perf_counter() - start
+
+        stats = pool.get_stats()
+        pool.stop()
+        print(f"  {f'pool, {workers} worker(s)':<40} {packets / elapsed:>10.0f} pkt/s "
+              f"{total_bytes / elapsed / 1e6:>8.1f} MB/s  (offloaded {stats['offload_rate']}, "
+              f"inline {stats['inline']})")
+
+
+def bench_http_fields(rules=2000):
+    """Same rules scanning the whole payload vs. only the HTTP URI."""
+    payloads = list(SAMPLE_PAYLOADS.values())
+    print(f"\n[{rules} rules, mixed payloads]")
+    for field in ("any", "uri"):
+        signatures = [
+            {'name': f"Rule {i}", 'pattern': f"/evil-path-{i:05d}", 'action': "alert", 'field': field}
+            for i in range(rules)
+        ]
+        scanner = make_scanner(signatures, PayloadNormalizer())
+        report(f"field={field}", *measure(lambda p: scanner.CheckPacketPayload(p, "tcp", 40000, 80),
+                                          payloads, rounds=3))
+        scanned = sum(scanner.ruleset.stats.group_bytes)
+        print(f"  {'':<40} {scanned:>10,} bytes scanned")
+    print(f"  parser stats: {scanner.http_parser.get_stats()}")
+
+
+def bench_payload_anomaly(packets=200000):
+    """Per-packet cost of the entropy detector, sampled (budget) vs. every payload."""
+    payloads = list(SAMPLE_PAYLOADS.values())
+    print(f"\n[{packets} packets, mixed payloads]")
+    for name, budget in (("budget 200/s (default)", 200), ("every payload", 10 ** 9)):
+        detector = PayloadAnomalyDetector(sample_budget=budget)
+        start = time.perf_counter()
+        for i in range(packets):
+            detector.observe(payloads[i % len(payloads)], 80, "10.0.0.2", "10.0.0.1")
+        elapsed = time.perf_counter() - start
+        print(f"  {name:<40} {elapsed / packets * 1e9:>10.0f} ns/op  (sampled {detector.get_stats()['sample_rate']})")
+
+
+def make_client_hello(server_name):
+    """A real ClientHello, as sent by this Python's OpenSSL."""
+    import ssl
+    incoming, outgoing = ssl.MemoryBIO(), ssl.MemoryBIO()
+    tls = ssl.create_default_context().wrap_bio(incoming, outgoing, server_hostname=server_name)
+    try:
+        tls.do_handshake()
+    except ssl.SSLWantReadError:
+        pass
+    return outgoing.read()
+
+
+def bench_tls_fingerprint():
+    """ClientHello parsing + JA3, and the per-flow cache on later segments."""
+    hello = make_client_hello("www.example.com")
+    encrypted = b"\x17\x03\x03" + bytes(1400)
+    fingerprinter = TlsFingerprinter(blocked_sni={f"blocked-{i}.example" for i in range(10000)})
+
+    print(f"\n[ClientHello {len(hello)} bytes, {len(fingerprinter.blocked_sni)} blocked names]")
+    report("parse_client_hello", *measure(parse_client_hello, [hello]))
+    report("parse + SNI blocklist lookup", *measure(lambda p: fingerprinter.match(parse_client_hello(p)), [hello]))
+    packet = make_ipv4_packet("10.0.0.2", "10.0.0.1", 40000, 443, hello)
+    flow = FlowTable().lookup(packet, 6, 40000, 443, len(packet))
+    fingerprinter.inspect(hello, 443, flow)
+    report("later segment (cached verdict)", *measure(lambda p: fingerprinter.inspect(p, 443, flow), [encrypted]))
+
+
+def make_ipv4_packet(src_ip, dst_ip, src_port, dst_port, payload=b"", proto=6):
+    """IPv4 + TCP (proto 6) or UDP (proto 17) packet bytes, as NFQUEUE hands them over."""
+    import socket
+    import struct
+    if proto == 6:
+        transport = struct.pack("!HHIIBBHHH", src_port, dst_port, 1, 0, 5 << 4, 0x18, 65535, 0, 0)
+    else:
+        transport = struct.pack("!HHHH", src_port, dst_port, 8 + len(payload), 0)
+    total = 20 + len(transport) + len(payload)
+    header = struct.pack("!BBHHHBBH4s4s", 0x45, 0, total, 0, 0x4000, 64, proto, 0,
+                         socket.inet_aton(src_ip), socket.inet_aton(dst_ip))
+    return header + transport + payload
+
+
+def make_ipv6_packet(src_ip, dst_ip, src_port, dst_port, payload=b"", proto=6, extensions=()):
+    """IPv6 packet bytes, with an 8-byte extension header per entry of `extensions` (header numbers)."""
+    import socket
+    import struct
+    if proto == 6:
+        transport = struct.pack("!HHIIBBHHH", src_port, dst_port, 1, 0, 5 << 4, 0x18, 65535, 0, 0)
+    else:
+        transport = struct.pack("!HHHH", src_port, dst_port, 8 + len(payload), 0)
+    chain = list(extensions) + [proto]
+    headers = b"".join(bytes((chain[i + 1], 0)) + bytes(6) for i in range(len(extensions)))
+    body = headers + transport + payload
+    header = struct.pack("!IHBB16s16s", 6 << 28, len(body), chain[0], 64,
+                         socket.inet_pton(socket.AF_INET6, src_ip), socket.inet_pton(socket.AF_INET6, dst_ip))
+    return header + body
+
+
+def bench_flow_table(flows=1000, packets=20000):
+    """Per-packet header parsing + flow lookup, vs. the scapy dissection it replaces."""
+    from scapy.all import IP
+    payloads = list(SAMPLE_PAYLOADS.values())
+    batch = [
+        make_ipv4_packet(f"10.0.{i // 250}.{i % 250 + 1}", "192.168.1.10", 40000 + i % 20000, 80,
+                         payloads[i % len(payloads)])
+        for i in range(flows)
+    ]
+    stream = [batch[i % flows] for i in range(packets)]
+    table = FlowTable()
+
+    def lookup(raw):
+        proto, src_port, dst_port, _, _ = parse_packet(raw)
+        return table.lookup(raw, proto, src_port, dst_port, len(raw), 1.0)
+
+    print(f"\n[{packets} packets over {flows} flows]")
+    report("scapy IP() dissection (before)", *measure(IP, stream[:2000], rounds=3))
+    report("parse_packet", *measure(parse_packet, stream))
+    report("parse_packet + flow lookup", *measure(lookup, stream))
+    print(f"  {'flow table':<40} {table.get_stats()}")
+
+
+def bench_ip_keys(packets=20000, hosts=500):
+    """Dotted-string vs. integer addresses: extraction, dict keys, detectors, memory."""
+    import socket
+    import tracemalloc
+    stream = [
+        make_ipv4_packet(f"10.1.{i % hosts // 250}.{i % 250 + 1}", "192.168.1.10", 40000 + i % 1000, 1 + i % 1024)
+        for i in range(packets)
+    ]
+    as_str = lambda raw: socket.inet_ntoa(raw[12:16])
+    as_int = lambda raw: int.from_bytes(raw[12:16], "big")
+
+    print(f"\n[{packets} packets, {hosts} source hosts]")
+    report("address: inet_ntoa (string)", *measure(as_str, stream))
+    report("address: int.from_bytes", *measure(as_int, stream))
+
+    table = {}
+    for raw in stream:
+        table[(as_str(raw), as_str(raw[4:]))] = table[(as_int(raw), as_int(raw[4:]))] = 0
+    report("dict lookup, fresh string key", *measure(lambda raw: table.get((as_str(raw), as_str(raw[4:]))), stream))
+    report("dict lookup, int key", *measure(lambda raw: table.get((as_int(raw), as_int(raw[4:]))), stream))
+
+    # the detectors only take address ints since the IPv6 prefix aggregation
+    detector = PortScanningDetector(15, 10)
+    now = [0.0]
+
+    def analyze(raw):
+        now[0] += 0.0001
+        return detector.analyze_tcp(as_int(raw), as_int(raw[4:]), now[0], raw[23])
+    report("port scan detector, int addresses", *measure(analyze, stream, rounds=3))
+
+    for name, convert in (("memory of 10k (src, dst) keys, strings", as_str), ("memory of 10k (src, dst) keys, ints", as_int)):
+        tracemalloc.start()
+        keys = {(convert(raw), convert(raw[4:])) for raw in stream[:10000]}
+        held, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"  {name:<40} {held / len(keys):>10.0f} B/key")
+
+
+def bench_ipv6(packets=20000):
+    """IPv6 parsing (extension header walk) and scan state under address randomization."""
+    import random
+    import tracemalloc
+    payload = SAMPLE_PAYLOADS["http_get_clean"]
+    v4 = make_ipv4_packet("10.0.0.1", "192.168.1.10", 40000, 80, payload)
+    v6 = make_ipv6_packet("2001:db8::1", "2001:db8:1::10", 40000, 80, payload)
+    v6_ext = make_ipv6_packet("2001:db8::1", "2001:db8:1::10", 40000, 80, payload, extensions=(0, 60, 44))
+    table = FlowTable()
+
+    def lookup(raw):
+        proto, src_port, dst_port, _, _ = parse_packet(raw)
+        return table.lookup(raw, proto, src_port, dst_port, len(raw), 1.0)
+
+    print(f"\n[{packets} packets]")
+    report("parse_packet, IPv4", *measure(parse_packet, [v4] * packets))
+    report("parse_packet, IPv6", *measure(parse_packet, [v6] * packets))
+    report("parse_packet, IPv6 + 3 ext headers", *measure(parse_packet, [v6_ext] * packets))
+    report("parse_packet + flow lookup, IPv6", *measure(lookup, [v6] * packets))
+
+    # one scanner rotating its address inside 2001:db8::/64 for every SYN
+    rng = random.Random(1)
+    scan = [
+        make_ipv6_packet(f"2001:db8::{rng.getrandbits(16):x}:{rng.getrandbits(16):x}:{rng.getrandbits(16):x}:"
+                         f"{rng.getrandbits(16):x}", "2001:db8:1::10", 40000, 1 + i % 1024)
+        for i in range(packets)
+    ]
+    syns = [lookup(raw) for raw in scan]
+    for prefix in (128, 64):
+        detector = PortScanningDetector(15, 10, ipv6_prefix=prefix)
+        tracemalloc.start()
+        alerts = 0
+        for i, flow in enumerate(syns):
+            alerts += detector.analyze_tcp(flow.src_addr, flow.dst_addr, i * 0.0001, flow.dst_port) == 1
+        held, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"  {f'scan state, /{prefix} aggregation':<40} {len(detector.port_scanning_log):>6} entries "
+              f"{held / 1024:>8.0f} KiB  scan detections: {alerts}")
+
+
+def make_dns_message(qname, response=False, rcode=0):
+    """A one-question DNS query (or its answer-less response) for qname, type A."""
+    flags = (0x8180 | rcode) if response else 0x0100
+    labels = b"".join(bytes([len(label)]) + label.encode() for label in qname.split("."))
+    return (0x1234).to_bytes(2, "big") + flags.to_bytes(2, "big") + b"\x00\x01" + bytes(6) + labels + b"\x00\x00\x01\x00\x01"
+
+
+def bench_dns(names=4096):
+    """Added per-UDP-packet cost of the DNS detector, by traffic shape."""
+    import random
+    rng = random.Random(1)
+    normal = [make_dns_message(name) for name in ("www.example.com", "api.github.com", "example.co.uk", "mail.google.com")]
+    tunnel = [make_dns_message(f"{rng.getrandbits(240):060x}.t.exfil.example") for _ in range(names)]
+    flood = [make_dns_message(f"{rng.getrandbits(40):010x}.victim.example") for _ in range(names)]
+    nxdomain = [make_dns_message(f"{rng.getrandbits(40):010x}.victim.example", response=True, rcode=3) for _ in range(names)]
+
+    print(f"\n[{len(normal[0])}-{len(tunnel[0])} byte messages, {names} distinct names per shape]")
+    report("parse_dns (query)", *measure(parse_dns, normal))
+    for name, payloads in (("analyze: popular names", normal), ("analyze: tunnel (60-char hex labels)", tunnel),
+                           ("analyze: random subdomain flood", flood), ("analyze: NXDOMAIN responses", nxdomain)):
+        detector = DnsDetector()
+        report(name, *measure(lambda p: detector.analyze(p, 0.0), payloads))
+
+    detector = DnsDetector(max_domains=1024)
+    random_domains = [make_dns_message(f"www.d{i}.example") for i in range(names)]
+    report("analyze: random domains (LRU full)", *measure(lambda p: detector.analyze(p, 0.0), random_domains))
+
+
+def start_stub_api():
+    """
+    Local HTTP/1.1 server standing in for the Web Interface (keep-alive,
+    gzip request bodies). Set StubApi.latency to slow its answers down,
+    StubApi.on_body to do something with the parsed request bodies.
+
+    Returns:
+        (server, API root URL, handler class)
+    """
+    import gzip
+    import json
+    import threading
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class StubApi(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        latency = 0.0
+        on_body = None
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers["Content-Length"]))
+            if self.headers.get("Content-Encoding") == "gzip":
+                body = gzip.decompress(body)
+            body = json.loads(body)
+            if self.on_body:
+                self.on_body(body)
+            time.sleep(self.latency)
+            self.send_response(202)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        do_PUT = do_POST
+
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", "2")
+            self.end_headers()
+            self.wfile.write(b"{}")
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubApi)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}/api", StubApi
+
+
+def bench_api_transport(requests=500):
+    """API calls over a new connection each (urllib, before) vs. the keep-alive pool."""
+    import gzip
+    import json
+    import urllib.request
+    from db_integration import ApiConnectionPool
+    server, api, _ = start_stub_api()
+    stats = {"rules": {f"rule-{i}": [1, 1500, 20000, 1, 0] for i in range(50)}}
+
+    def urllib_put(body):
+        req = urllib.request.Request(f"{api}/system/ids-stats/bench", data=json.dumps(body).encode(),
+                                     headers={"Content-Type": "application/json"}, method="PUT")
+        with urllib.request.urlopen(req, timeout=2) as response:
+            return response.status
+
+    pool = ApiConnectionPool(api)
+    print(f"\n[{requests} PUT requests, {len(json.dumps(stats))} B bodies]")
+    for name, func in (("urllib, new connection per call (before)", urllib_put),
+                       ("ApiConnectionPool, keep-alive", lambda body: pool.request("PUT", "/system/ids-stats/bench", body))):
+        started = time.perf_counter()
+        for _ in range(requests):
+            func(stats)
+        print(f"  {name:<40} {(time.perf_counter() - started) / requests * 1e6:>10.0f} us/request")
+    print(f"  {'pool':<40} {pool.get_stats()}")
+
+    alerts = {"alerts": [{"src_ip": f"203.0.113.{i % 250}", "message": "Port Scan Detected on INPUT chain",
+                          "details": {"chain": "INPUT", "dst_port": i}} for i in range(200)]}
+    body = json.dumps(alerts, separators=(",", ":")).encode()
+    for name, client, size in (("200-alert batch, plain body", ApiConnectionPool(api, gzip_min_size=1 << 30), len(body)),
+                               ("200-alert batch, gzip body", pool, len(gzip.compress(body, compresslevel=5)))):
+        started = time.perf_counter()
+        for _ in range(50):
+            client.request("POST", "/alerts/bulk", alerts)
+        print(f"  {name:<40} {(time.perf_counter() - started) / 50 * 1e6:>10.0f} us/request {size:>8} B on the wire")
+    server.shutdown()
+
+
+def bench_alert_shipper(alerts=2000, latencies=(0.0, 0.02)):
+    """Cost of reporting an alert on the packet thread: synchronous POST (before) vs. queued bulk shipping."""
+    import json
+    import urllib.request
+    server, api, StubApi = start_stub_api()
+    record = {
+        "timestamp": "2026-01-01T00:00:00", "status": "STARTED", "type": "BEHAVIOR", "subtype": "PORT_SCAN",
+        "src_ip": "203.0.113.9", "dst_ip": "10.0.0.1", "src_port": 40000, "dst_port": 22,
+        "message": "Port Scan Detected on INPUT chain", "details": {"chain": "INPUT"},
+    }
+
+    def post_one(alert):
+        req = urllib.request.Request(f"{api}/alerts", data=json.dumps(alert).encode(),
+                                     headers={"Content-Type": "application/json"}, method="POST")
+        with urllib.request.urlopen(req, timeout=0.5) as response:
+            return response.status
+
+    def per_alert(func, count):
+        started = time.perf_counter()
+        for _ in range(count):
+            func(record)
+        return (time.perf_counter() - started) / count * 1e6
+
+    for latency in latencies:
+        StubApi.latency = latency
+        print(f"\n[{alerts} alerts, API answering in {latency * 1000:.0f} ms]")
+        print(f"  {'synchronous POST per alert (before)':<40} {per_alert(post_one, 50):>10.1f} us/alert on the packet thread")
+
+        shipper = DatabaseIntegration(api)
+        shipper.enabled = True
+        shipper._start_shipper()
+        print(f"  {'insert_alert (queued)':<40} {per_alert(shipper.insert_alert, alerts):>10.1f} us/alert on the packet thread")
+        started = time.perf_counter()
+        shipper.stop_shipper(timeout=30)
+        print(f"  {'queue drained by the shipper':<40} {(time.perf_counter() - started) * 1000:>8.1f} ms "
+              f"{shipper.get_shipper_stats()}")
+    server.shutdown()
+
+
+def bench_alert_transport(alerts=20000, batch=200):
+    """Alert batches to the API: JSON over HTTP vs. binary frames over the Unix socket (alerts/s, CPU/alert)."""
+    import asyncio
+    import json
+    import tempfile
+    import threading
+    from alert_codec import encode_alert, decode_alert
+    from api.alert_socket import AlertSocketServer
+    from api.routes.alerts import prepare_alert_data
+
+    record = {
+        "timestamp": "2026-01-01T00:00:00", "status": "ONGOING", "type": "BEHAVIOR", "subtype": "TCP_FLOOD",
+        "src_ip": "203.0.113.9", "dst_ip": "10.0.0.1", "src_port": 40000, "dst_port": 80,
+        "message": "TCP Flood (DoS/DDoS) Detected on INPUT chain", "details": {"chain": "INPUT", "dst_port": 80},
+        "duration_seconds": 12.5, "packet_count": 48000, "attack_rate_pps": 3840.0,
+    }
+    frame = encode_alert(record)
+    print(f"\n[{alerts} alerts in batches of {batch}, API side in this process]")
+    report("encode_alert", *measure(encode_alert, [record] * 1000))
+    report("decode_alert", *measure(decode_alert, [frame[4:]] * 1000))
+    report("json.dumps + json.loads (for reference)", *measure(lambda r: json.loads(json.dumps(r)), [record] * 1000))
+    print(f"  {'frame size':<40} {len(frame):>10} B (JSON: {len(json.dumps(record))} B)")
+
+    # Both API sides stop right before the database: rows prepared, not inserted.
+    # HTTP: the stub API parses the JSON body like FastAPI would (without FastAPI's own overhead)
+    server, api, stub = start_stub_api()
+    stub.on_body = staticmethod(lambda body: [prepare_alert_data(alert) for alert in body["alerts"]])
+    http_client = DatabaseIntegration(api, alert_transport="http")
+
+    # Unix socket: the API's real consumer
+    received = [0]
+
+    async def count(batch_alerts):
+        for alert in batch_alerts:
+            prepare_alert_data(alert)
+        received[0] += len(batch_alerts)
+
+    path = os.path.join(tempfile.mkdtemp(), "alerts.sock")
+    consumer = AlertSocketServer(on_batch=count, path=path)
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    asyncio.run_coroutine_threadsafe(consumer.start(), loop).result()
+    unix_client = DatabaseIntegration(api, alert_transport="unix", socket_path=path)
+
+    batches = [[record] * batch for _ in range(alerts // batch)]
+    for name, client, done in (("HTTP + JSON (POST /alerts/bulk)", http_client, lambda: True),
+                               ("Unix socket + binary frames", unix_client, lambda: received[0] >= alerts)):
+        wall, cpu = time.perf_counter(), time.process_time()
+        for alert_batch in batches:
+            client.send_alerts(alert_batch)
+        while not done():
+            time.sleep(0.001)
+        wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+        print(f"  {name:<40} {alerts / wall:>10.0f} alerts/s {cpu / alerts * 1e6:>8.1f} us CPU/alert")
+
+    asyncio.run_coroutine_threadsafe(consumer.stop(), loop).result()
+    loop.call_soon_threadsafe(loop.stop)
+    unix_client.stop_shipper()
+    stub.on_body = None
+    server.shutdown()
+
+
+def bench_alert_spool(alerts=20000, batch=200):
+    """Alert spool: append / replay speed per fsync policy, insert_alert on the packet thread while the API is down."""
+    import shutil
+    import tempfile
+    import uuid
+    from alert_spool import AlertSpool
+
+    record = {
+        "timestamp": "2026-01-01T00:00:00", "status": "ONGOING", "type": "BEHAVIOR", "subtype": "TCP_FLOOD",
+        "src_ip": "203.0.113.9", "dst_ip": "10.0.0.1", "src_port": 40000, "dst_port": 80,
+        "message": "TCP Flood (DoS/DDoS) Detected on INPUT chain", "details": {"chain": "INPUT", "dst_port": 80},
+        "duration_seconds": 12.5, "packet_count": 48000, "attack_rate_pps": 3840.0,
+    }
+    batches = [[dict(record, uuid=str(uuid.uuid4())) for _ in range(batch)] for _ in range(alerts // batch)]
+
+    print(f"\n[{alerts} alerts in batches of {batch}]")
+    for name, fsync_interval in (("fsync every batch", 0), ("fsync at most every 1 s", 1.0)):
+        directory = tempfile.mkdtemp()
+        spool = AlertSpool(directory, fsync_interval=fsync_interval)
+        started = time.perf_counter()
+        for alert_batch in batches:
+            spool.append(alert_batch)
+        spool.sync()
+        elapsed = time.perf_counter() - started
+        print(f"  {'append, ' + name:<40} {alerts / elapsed:>10.0f} alerts/s {spool.fsyncs:>6} fsyncs")
+
+        started = time.perf_counter()
+        while spool.peek(batch):
+            spool.ack()
+        elapsed = time.perf_counter() - started
+        print(f"  {'replay (peek + ack)':<40} {alerts / elapsed:>10.0f} alerts/s")
+        spool.close()
+        shutil.rmtree(directory)
+
+    # nothing listens on port 1: every delivery fails and the shipper spools
+    directory = tempfile.mkdtemp()
+    shipper = DatabaseIntegration("http://127.0.0.1:1/api", spool=AlertSpool(directory))
+    latencies = []
+    for alert_batch in batches:
+        for alert in alert_batch:
+            started = time.perf_counter()
+            shipper.insert_alert(alert)
+            latencies.append(time.perf_counter() - started)
+    while shipper.get_shipper_stats()['queued']:
+        time.sleep(0.01)
+    shipper.stop_shipper()
+    latencies.sort()
+    print(f"\n[API down, {alerts} alerts queued by the packet thread in one burst]")
+    print(f"  {'insert_alert p50 / p99 / max':<40} {latencies[len(latencies) // 2] * 1e6:>8.1f} / "
+          f"{latencies[len(latencies) * 99 // 100] * 1e6:.1f} / {latencies[-1] * 1e6:.1f} us")
+    print(f"  {'spooled / dropped in memory':<40} {shipper.spool.alerts_spooled:>10} / "
+          f"{shipper.alerts_dropped} (burst over max_queued, expected 0)")
+    print(f"  {'failed sends / connection retries':<40} {shipper.batches_failed:>10} / "
+          f"{shipper.http.retried} (spool mode doesn't retry, expected 0)")
+    shutil.rmtree(directory)
+
+
+def bench_alert_log(records=20000):
+    """Alert log: open/append/close per record (before) vs. the writer thread (caller cost, write syscalls)."""
+    import json
+    import shutil
+    import tempfile
+    from jsonl_writer import JsonlWriter
+
+    def write_syscalls():
+        with open("/proc/self/io") as f:
+            return next(int(line.split()[1]) for line in f if line.startswith("syscw"))
+
+    record = {
+        "timestamp": "2026-01-01T00:00:00", "status": "ONGOING", "type": "BEHAVIOR", "subtype": "TCP_FLOOD",
+        "src_ip": "203.0.113.9", "dst_ip": "10.0.0.1", "src_port": 40000, "dst_port": 80,
+        "message": "TCP Flood (DoS/DDoS) Detected on INPUT chain", "details": {"chain": "INPUT", "dst_port": 80},
+    }
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, "loki_alerts.jsonl")
+
+    def append_one(alert):
+        with open(path, "a") as f:
+            f.write(json.dumps(alert) + "\n")
+
+    writer = JsonlWriter(path, max_bytes=1 << 20, keep=3)
+    print(f"\n[{records} records]")
+    for name, func, done in (("open + write + close per record (before)", append_one, lambda: None),
+                             ("JsonlWriter.write (writer thread)", writer.write, writer.close)):
+        syscalls = write_syscalls()
+        started = time.perf_counter()
+        for _ in range(records):
+            func(record)
+        elapsed = time.perf_counter() - started
+        done()
+        print(f"  {name:<40} {elapsed / records * 1e6:>8.1f} us/record on the caller "
+              f"{(write_syscalls() - syscalls) / records:>8.3f} write syscalls/record")
+    print(f"  {'writer':<40} {writer.get_stats()}")
+    print(f"  {'files':<40} {sorted(os.listdir(directory))}")
+    shutil.rmtree(directory)
+
+
+def bench_alert_expiry(alerts=100000, ticks=100):
+    """check_ended_alerts with many concurrent attacks: scan of every active alert (before) vs. the expiry heap."""
+    import logging
+    import types
+    import logger as logger_module
+
+    active = {}
+
+    def scan(log, now):
+        """check_ended_alerts before the expiry heap (one dict of every active alert)"""
+        ended = [key for key, state in active.items() if now - state['last_seen'] >= log.aggregator.cooldown]
+        for key in ended:
+            log._log_ended_alert(key, active[key], now)
+            del active[key]
+        return len(ended)
+
+    # alerts start evenly over one cooldown (10 s), so once the first ones
+    # expire every tick ends alerts / ticks of them
+    clock = [0.0]
+    real_time, logger_module.time = logger_module.time, types.SimpleNamespace(time=lambda: clock[0])
+    logs = []
+    for _ in range(2):
+        log = logger_module.LokiLogger()
+        log.console_logger.setLevel(logging.ERROR)
+        log._emit = lambda record, attack_id=None: None
+        for i in range(alerts):
+            clock[0] = i * log.aggregator.cooldown / alerts
+            log.log_alert("BEHAVIOR", 0x0A000000 + i, 0xC0A80001, 40000, 80, "TCP Flood Detected")
+        logs.append(log)
+    for shard in logs[0].aggregator._shards:
+        active.update(shard.alerts)
+
+    print(f"\n[{alerts} active alerts, {ticks} ticks over one cooldown]")
+    for name, check, log in (("scan every active alert (before)", lambda log: scan(log, clock[0]), logs[0]),
+                             ("expiry heap", lambda log: log.check_ended_alerts(), logs[1])):
+        clock[0] = log.aggregator.cooldown / 2
+        started = time.perf_counter()
+        for _ in range(ticks):
+            check(log)
+        idle = (time.perf_counter() - started) / ticks
+
+        ended, busy = 0, 0.0
+        for tick in range(1, ticks + 1):
+            clock[0] = log.aggregator.cooldown * (1 + tick / ticks)
+            started = time.perf_counter()
+            ended += check(log)
+            busy += time.perf_counter() - started
+        print(f"  {name:<40} {idle * 1e3:>8.3f} ms/tick nothing due "
+              f"{busy / ticks * 1e3:>8.3f} ms/tick ending {ended // ticks} ({ended} ended)")
+    logger_module.time = real_time
+
+
+def bench_alert_aggregator(attacks=2000, hits=200000):
+    """log_alert from several agent threads: one lock for every alert vs. the sharded aggregator."""
+    import logging
+    import threading
+    from alert_aggregator import AlertAggregator
+    from logger import LokiLogger
+
+    print(f"\n[{hits} log_alert calls over {attacks} attacks]")
+    for shards in (1, 16):
+        for threads in (1, 2, 4):
+            log = LokiLogger()
+            log.console_logger.setLevel(logging.ERROR)
+            log.aggregator = AlertAggregator(shards=shards)
+            started = []
+            log._emit = lambda record, attack_id=None: started.append(record) if record["status"] == "STARTED" else None
+
+            def agent(n):
+                for i in range(n, hits, threads):
+                    log.log_alert("BEHAVIOR", 0x0A000000 + i % attacks, 0xC0A80001, 40000, 80,
+                                  "TCP Flood Detected", subtype="TCP_FLOOD")
+
+            workers = [threading.Thread(target=agent, args=(n,)) for n in range(threads)]
+            elapsed = time.perf_counter()
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+            elapsed = time.perf_counter() - elapsed
+            name = f"{'one lock' if shards == 1 else f'{shards} shards'}, {threads} thread(s)"
+            print(f"  {name:<40} {hits / elapsed:>10.0f} alerts/s  STARTED {len(started)} "
+                  f"(expected {attacks}), active {len(log.aggregator)}")
+
+
+def bench_incidents(alerts=100000):
+    """Incident correlation: cost per alert record and how many incidents the alerts fold into."""
+    import random
+    from incident_correlator import IncidentCorrelator
+
+    # a DDoS from 5000 sources at one host, a few scanners sweeping 200 hosts, background noise
+    rng = random.Random(1)
+    records = []
+    for i in range(alerts):
+        roll = rng.random()
+        if roll < 0.6:
+            src, dst, subtype = f"198.51.{rng.randrange(20)}.{rng.randrange(250)}", "10.0.0.1", "TCP_FLOOD"
+        elif roll < 0.9:
+            src, dst, subtype = f"203.0.113.{rng.randrange(5)}", f"10.0.1.{rng.randrange(200)}", "PORT_SCAN"
+        else:
+            src, dst, subtype = f"192.0.2.{rng.randrange(250)}", f"10.0.2.{rng.randrange(250)}", "UDP_FLOOD"
+        records.append({"src_ip": src, "dst_ip": dst, "status": "STARTED", "subtype": subtype, "type": "BEHAVIOR"})
+
+    correlator = IncidentCorrelator()
+    started = time.perf_counter()
+    for n, record in enumerate(records):
+        correlator.observe(record, n * 0.001)
+    elapsed = time.perf_counter() - started
+    incidents = correlator.collect()
+    live = [incident for incident in incidents if incident["status"] != "MERGED"]
+
+    print(f"\n[{alerts} alert records]")
+    print(f"  {'observe':<40} {elapsed / alerts * 1e9:>8.0f} ns/alert")
+    print(f"  {'incidents':<40} {len(live):>8} ({len(incidents) - len(live)} merged away)")
+    for incident in sorted(live, key=lambda i: i["alert_count"], reverse=True)[:3]:
+        print(f"    {incident['alert_count']:>6} alerts  {incident['summary']}")
+    print(f"  {'correlator':<40} {correlator.get_stats()}")
+
+
+def bench_alert_storage(attacks=2000):
+    """API alert storage: a row per lifecycle record vs one upserted row per attack."""
+    import asyncio
+    import json
+    import tempfile
+    import uuid
+    from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+    from api.models.database import Base
+    from api.models import crud
+
+    # every attack: STARTED, three ONGOING updates, ENDED (what LokiLogger emits for a long attack)
+    def records(attack_rows):
+        batch = []
+        for a in range(attacks):
+            attack_id = str(uuid.uuid4())
+            for n, status in enumerate(("STARTED", "ONGOING", "ONGOING", "ONGOING", "ENDED")):
+                record = {
+                    "timestamp": f"2026-01-01T00:{a % 60:02d}:{n:02d}.{a:06d}", "status": status,
+                    "type": "BEHAVIOR", "subtype": "TCP_FLOOD", "src_ip": f"198.51.100.{a % 250}",
+                    "dst_ip": "10.0.0.1", "src_port": 40000 + a, "dst_port": 80,
+                    "message": "TCP SYN flood", "details": json.dumps({"syn": n * 100}),
+                    "uuid": str(uuid.uuid4()),
+                }
+                if status == "ONGOING":
+                    record.update(duration_seconds=str(n * 5.0), packet_count=n * 500, attack_rate_pps="100.0")
+                elif status == "ENDED":
+                    record.update(total_duration_seconds="25.0", total_packets=2500, average_rate_pps="100.0")
+                if attack_rows:
+                    record["attack_id"] = attack_id
+                batch.append(record)
+        return batch
+
+    async def run(attack_rows, path):
+        engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        session = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+        batch = records(attack_rows)
+        started = time.perf_counter()
+        async with session() as db:
+            for i in range(0, len(batch), 500):
+                await crud.create_alerts(db, batch[i:i + 500])
+        elapsed = time.perf_counter() - started
+        async with engine.connect() as conn:
+            alerts = (await conn.exec_driver_sql("SELECT COUNT(*) FROM alerts")).scalar()
+            history = (await conn.exec_driver_sql("SELECT COUNT(*) FROM alert_history")).scalar()
+            await conn.exec_driver_sql("VACUUM")
+        await engine.dispose()
+        return elapsed, len(batch), alerts, history, os.path.getsize(path)
+
+    print(f"\n[{attacks} attacks x 5 records]")
+    default = crud.ALERT_HISTORY
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, attack_rows, history_rows in (("record (row per record)", False, False),
+                                                ("attack (upserted row)", True, False),
+                                                ("attack, ALERT_HISTORY on", True, True)):
+            crud.ALERT_HISTORY = history_rows
+            elapsed, n, alerts, history, size = asyncio.run(run(attack_rows, os.path.join(tmp, f"{name}.db")))
+            print(f"  {name:<40} {elapsed / n * 1e6:>8.1f} us/record  "
+                  f"{alerts:>6} alert rows  {history:>6} history rows  {size / 1024:>7.0f} KiB")
+    crud.ALERT_HISTORY = default
+
+
+def bench_alert_admission(seconds=3.0, rate=20000, api_capacity=5000):
+    """Alert storm: delivery latency of signature hits with one FIFO queue (before), priority queues, admission control."""
+    import db_integration as db_integration_module
+    from alert_admission import AlertAdmission, PRIORITIES
+
+    # a flood: 98% BEHAVIOR alerts (new source each), 1% signature hits, 1% system events
+    def record(i):
+        kind = "SIGNATURE" if i % 100 == 0 else "SYSTEM" if i % 100 == 50 else "BEHAVIOR"
+        return {"timestamp": f"{i:09d}", "status": "STARTED", "type": kind,
+                "subtype": "TCP_FLOOD" if kind == "BEHAVIOR" else None,
+                "src_ip": f"198.51.{i // 250 % 250}.{i % 250}", "dst_ip": "10.0.0.1", "message": "storm"}
+
+    def run(admission, fifo):
+        latencies = []
+        delivered = dict.fromkeys(PRIORITIES, 0)
+
+        def send_alerts(batch):
+            time.sleep(len(batch) / api_capacity)  # the API stores `api_capacity` alerts/s
+            now = time.perf_counter()
+            for alert in batch:
+                delivered[alert["type"]] += 1
+                if alert["type"] == "SIGNATURE":
+                    latencies.append(now - alert["queued"])
+            return True
+
+        shipper = DatabaseIntegration("http://127.0.0.1:9/api", admission=admission)
+        shipper.send_alerts = send_alerts
+        shipper.enabled = True
+        if fifo:
+            db_integration_module.priority = lambda alert: 0
+        try:
+            shipper._start_shipper()
+            started = time.perf_counter()
+            total = int(seconds * rate)
+            for i in range(total):
+                alert = record(i)
+                alert["queued"] = time.perf_counter()
+                shipper.insert_alert(alert)
+                if i % 100 == 99:
+                    time.sleep(max(0.0, started + (i + 1) / rate - time.perf_counter()))
+            shipper.stop_shipper(timeout=60)
+        finally:
+            db_integration_module.priority = priority
+        latencies.sort()
+        return total, latencies, delivered, shipper.get_shipper_stats()
+
+    from alert_admission import priority
+    print(f"\n[{seconds:.0f} s storm at {rate} alerts/s, API stores {api_capacity} alerts/s]")
+    for name, admission, fifo in (("one FIFO queue (before)", None, True),
+                                  ("priority queues", None, False),
+                                  ("priority queues + admission", AlertAdmission(), False)):
+        total, latencies, delivered, stats = run(admission, fifo)
+        if latencies:
+            pct = lambda p: latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000
+            print(f"  {name:<40} signature hits p50 {pct(0.5):7.1f} ms  p99 {pct(0.99):7.1f} ms  "
+                  f"delivered {delivered['SIGNATURE']}/{total // 100}")
+        print(f"  {'':<40} delivered {delivered}, dropped {stats['alerts_dropped']}, "
+              f"suppressed {stats['alerts_suppressed']}")
+
+
+BENCHMARKS = {
+    "normalizer": bench_normalizer,
+    "ruleset_cache": bench_ruleset_cache,
+    "snort_import": bench_snort_import,
+    "scan_pool": bench_scan_pool,
+    "http_fields": bench_http_fields,
+    "payload_anomaly": bench_payload_anomaly,
+    "tls_fingerprint": bench_tls_fingerprint,
+    "dns": bench_dns,
+    "flow_table": bench_flow_table,
+    "ip_keys": bench_ip_keys,
+    "ipv6": bench_ipv6,
+    "alert_shipper": bench_alert_shipper,
+    "api_transport": bench_api_transport,
+    "alert_transport": bench_alert_transport,
+    "alert_spool": bench_alert_spool,
+    "alert_log": bench_alert_log,
+    "alert_expiry": bench_alert_expiry,
+    "alert_aggregator": bench_alert_aggregator,
+    "incidents": bench_incidents,
+    "alert_storage": bench_alert_storage,
+    "alert_admission": bench_alert_admission,
+}
+
+
+if __name__ == "__main__":
+    selected = sys.argv[1:] or list(BENCHMARKS)
+
+    print("=" * 60)
+    print("  Loki IDS - Benchmarks")
+    print("=" * 60)
+
+    for name in selected:
+        if name not in BENCHMARKS:
+            print(f"[!] Unknown benchmark: {name} (choose from {', '.join(BENCHMARKS)})")
+            sys.exit(1)
+
+        print()
+        print(f"===== {name} =====")
+        BENCHMARKS[name]()
+
+    print()
@@ -3,39 +3,332 @@ API integration for Loki Logger.
 Sends alerts to the Web Interface API instead of directly accessing the database.
 This prevents database locking issues.
 """
+import gzip
+import http.client
 import json
-import urllib.request
-import urllib.error
-from typing import Optional, Dict, Any
+import socket
+import threading
+import time
+import urllib.parse
+from collections import OrderedDict, deque
+from typing import Optional, Dict, Any, Tuple
 
+from alert_admission import PRIORITIES, AlertAdmission, is_continuation, priority
+from alert_codec import ALERT_SOCKET_PATH, SYNC_FRAME, SYNC_OK, SYNC_FAILED, encode_alert
+from alert_spool import AlertSpool
+
+
+# ============================================================
+# Transport
+# ============================================================
+# Every call used to open a new TCP connection (urllib). The pool keeps
+# HTTP/1.1 keep-alive connections (http.client) and lends one to each
+# request, so the alert shipper, the ruleset watcher and the stats
+# reporter each reuse theirs instead of paying a handshake per call.
+#
+#   idle connections    at most `max_idle` are kept, and one idle for
+#                       `idle_timeout` seconds is closed instead of reused
+#                       (uvicorn drops keep-alive connections after 5 s)
+#   retries             a request failing with a connection error (stale
+#                       socket, API restarting) is retried on a fresh
+#                       connection, `retries` times with exponential
+#                       backoff; timeouts are NOT retried (the API may
+#                       have processed the request)
+#   gzip                bodies of `gzip_min_size` bytes or more are sent
+#                       compressed, responses are accepted compressed
+# ============================================================
+
+class ApiConnectionPool:
+    """
+    Keep-alive HTTP connections to the Web Interface API.
+    """
+    def __init__(self, base_url: str, max_idle: int = 4, idle_timeout: float = 4.0,
+                 retries: int = 2, backoff: float = 0.05, gzip_min_size: int = 16384):
+        """
+        Args:
+            base_url: API root, e.g. http://localhost:8080/api
+            max_idle: idle connections kept for reuse
+            idle_timeout: seconds after which an idle connection isn't reused
+            retries: extra attempts after a connection error
+            backoff: seconds before the first retry (doubled for each one)
+            gzip_min_size: request bodies at least this big are gzip-compressed
+        """
+        url = urllib.parse.urlsplit(base_url)
+        self.host = url.hostname
+        self.port = url.port or 80
+        self.base_path = url.path.rstrip('/')
+        self.max_idle = max_idle
+        self.idle_timeout = idle_timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.gzip_min_size = gzip_min_size
+
+        self._idle = []                 # (connection, last used), most recent last
+        self._lock = threading.Lock()
+
+        # Statistics
+        self.requests = 0
+        self.connections_opened = 0
+        self.connections_reused = 0
+        self.retried = 0
+        self.failed = 0
+        self.gzip_requests = 0
+        self.bytes_sent = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+
+    def _connect(self, timeout: float) -> http.client.HTTPConnection:
+        return http.client.HTTPConnection(self.host, self.port, timeout=timeout)
+
+    def _acquire(self, timeout: float) -> Tuple[http.client.HTTPConnection, bool]:
+        """(connection, whether it is a reused one)"""
+        now = time.monotonic()
+        with self._lock:
+            while self._idle:
+                conn, last_used = self._idle.pop()
+                if now - last_used < self.idle_timeout:
+                    self.connections_reused += 1
+                    conn.timeout = timeout
+                    conn.sock.settimeout(timeout)
+                    return conn, True
+                conn.close()
+            self.connections_opened += 1
+        return self._connect(timeout), False
+
+    def _release(self, conn: http.client.HTTPConnection):
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append((conn, time.monotonic()))
+                return
+        conn.close()
+
+    def request(self, method: str, path: str, body: Any = None, timeout: float = 5.0,
+                retries: Optional[int] = None) -> Tuple[int, Any]:
+        """
+        Send one request over a pooled connection.
+
+        Args:
+            method: HTTP method
+            path: path below the API root, with its query string
+            body: JSON-serializable request body (None = no body)
+            timeout: socket timeout in seconds
+            retries: extra attempts after a connection error (None = the pool's `retries`)
+
+        Returns:
+            (HTTP status, decoded JSON response or None)
+
+        Raises:
+            OSError / http.client.HTTPException: the API couldn't be reached
+        """
+        headers = {'Accept': 'application/json', 'Accept-Encoding': 'gzip'}
+        data = None
+        if body is not None:
+            data = json.dumps(body, separators=(',', ':')).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+            if len(data) >= self.gzip_min_size:
+                data = gzip.compress(data, compresslevel=5)
+                headers['Content-Encoding'] = 'gzip'
+                self.gzip_requests += 1
+
+        if retries is None:
+            retries = self.retries
+        attempt = 0
+        while True:
+            conn, reused = self._acquire(timeout)
+            started = time.perf_counter()
+            try:
+                conn.request(method, self.base_path + path, body=data, headers=headers)
+                response = conn.getresponse()
+                raw = response.read()
+            except (ConnectionError, http.client.HTTPException):
+                conn.close()
+                if attempt >= retries:
+                    self.failed += 1
+                    raise
+                # a stale keep-alive socket is retried at once, a refused connection after a backoff
+                if not reused:
+                    time.sleep(self.backoff * (2 ** attempt))
+                attempt += 1
+                self.retried += 1
+                continue
+            except OSError:
+                conn.close()
+                self.failed += 1
+                raise
+
+            elapsed = time.perf_counter() - started
+            self.requests += 1
+            self.bytes_sent += len(data) if data else 0
+            self.latency_total += elapsed
+            self.latency_max = max(self.latency_max, elapsed)
+            if response.will_close:
+                conn.close()
+            else:
+                self._release(conn)
+
+            if response.getheader('Content-Encoding') == 'gzip':
+                raw = gzip.decompress(raw)
+            try:
+                return response.status, json.loads(raw) if raw else None
+            except ValueError:
+                return response.status, None
+
+    def close(self):
+        """Close the idle connections."""
+        with self._lock:
+            for conn, _ in self._idle:
+                conn.close()
+            self._idle.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get connection pool statistics"""
+        return {
+            'requests': self.requests,
+            'connections_opened': self.connections_opened,
+            'connections_reused': self.connections_reused,
+            'reuse_ratio': round(self.connections_reused / self.requests, 3) if self.requests else 0.0,
+            'idle_connections': len(self._idle),
+            'retried': self.retried,
+            'failed': self.failed,
+            'gzip_requests': self.gzip_requests,
+            'bytes_sent': self.bytes_sent,
+            'avg_latency_ms': round(self.latency_total / self.requests * 1000, 2) if self.requests else 0.0,
+            'max_latency_ms': round(self.latency_max * 1000, 2),
+        }
+
+
+# ============================================================
+# Alert shipping
+# ============================================================
+# insert_alert() runs inside the NFQUEUE callbacks, so it must never
+# wait on HTTP. It only appends the record to a bounded queue; the
+# "alert-shipper" thread sends the queue to POST /alerts/bulk (one
+# transaction per batch) as soon as `batch_size` records are waiting,
+# or `flush_interval` seconds after it last woke up.
+#
+# If the API is slow or down the queue fills up; past `max_queued`
+# records the OLDEST are dropped (and counted), so memory stays bounded
+# and the newest state of each attack is what survives.
+#
+# The queue is one deque per priority class (alert_admission.py):
+# batches take SIGNATURE alerts first, then BEHAVIOR, then SYSTEM, and
+# an overflow drops from the lowest class queued. Only STARTED records
+# and SYSTEM events are dropped for room: the ONGOING / ENDED records of
+# attacks wait in deques of their own and go first in their class, so
+# an attack the API knows about gets its updates and its end (they are
+# dropped only when nothing else is left to drop). A SIGNATURE
+# alert wakes the shipper at once instead of waiting for a full batch. With an admission
+# controller, alerts over their class's rate are suppressed before they
+# are queued and come back as periodic "N suppressed" records.
+#
+# With a spool (alert_spool.py) a batch that can't be delivered goes to
+# disk instead, together with everything queued behind it, and so does
+# every batch after it while the spool holds alerts (they reach the API
+# in order). Batches aren't retried with a backoff in that mode: the
+# shipper spools at once rather than sleeping while the queue overflows. Once the API answers again the
+# spool is replayed, REPLAY_BATCHES batches per round between live ones;
+# after a failure the API is left alone for `flush_interval * 4`. Every
+# alert carries a uuid (logger.py) and the API skips uuids it already
+# stored, so a batch sent twice (timeout after the commit, replay after
+# a crash) still lands once.
+#
+# Batches go over one of two transports (alert_transport):
+#   "http"   POST /alerts/bulk, JSON
+#   "unix"   binary frames (alert_codec.py) on the API's Unix socket
+#            (api/alert_socket.py), falling back to HTTP for a batch
+#            whenever the socket can't be used
+# ============================================================
+
+ALERT_TRANSPORTS = ("http", "unix")
+REPLAY_BATCHES = 8
 
 class DatabaseIntegration:
     """
     Handles API communication for the logger.
-    Sends alerts to the Web Interface API via HTTP POST.
+    Sends alerts to the Web Interface API in batches, from a background thread.
     """
-    def __init__(self, api_base_url: str = "http://localhost:8080/api"):
+    def __init__(self, api_base_url: str = "http://localhost:8080/api",
+                 batch_size: int = 200, flush_interval: float = 0.5, max_queued: int = 10000,
+                 alert_transport: str = "http", socket_path: str = ALERT_SOCKET_PATH,
+                 spool: Optional[AlertSpool] = None, admission: Optional[AlertAdmission] = None):
+        """
+        Args:
+            api_base_url: Web Interface API root
+            batch_size: alerts per bulk request (a full batch is sent right away)
+            flush_interval: seconds a partial batch waits at most
+            max_queued: alerts kept while the API is unreachable (oldest dropped)
+            alert_transport: "http" or "unix" (see set_alert_transport)
+            socket_path: the API's alert socket, for the "unix" transport
+            spool: where undeliverable alerts wait for the API (None = in memory only)
+            admission: per-class rate limits for the alerts (None = every alert is queued)
+        """
         self.enabled = False
         self.api_base_url = api_base_url.rstrip('/')
-        self.alerts_endpoint = f"{self.api_base_url}/alerts"
-        self.signatures_endpoint = f"{self.api_base_url}/signatures"
+        self.http = ApiConnectionPool(self.api_base_url)
+        self.set_alert_transport(alert_transport, socket_path)
+        self._socket = None
+
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queued = max_queued
+        self._alert_queues = [deque() for _ in PRIORITIES]  # one per priority class, highest first
+        self._continuations = [deque() for _ in PRIORITIES]  # ONGOING / ENDED records, per class
+        self._alert_cond = threading.Condition()
+        self._shipper = None
+        self._stopping = False
+        self.spool = spool
+        self.admission = admission
+        self._retry_at = 0.0
+        self._unsent_incidents = OrderedDict()  # incident id -> newest record the API didn't take
+
+        # Statistics
+        self.alerts_queued = 0
+        self.alerts_sent = 0
+        self.alerts_dropped = 0
+        self.alerts_suppressed = 0
+        self.batches_sent = 0
+        self.batches_failed = 0
+        self.socket_batches = 0
+        self.socket_fallbacks = 0
+        self.incidents_sent = 0
+        self.incidents_dropped = 0
 
-    def enable(self):
-        """Enable API integration."""
+    def set_alert_transport(self, transport: str, socket_path: Optional[str] = None):
+        """
+        Choose how alert batches reach the API.
+
+        Args:
+            transport: "http" (POST /alerts/bulk) or "unix" (binary frames on the API's Unix socket)
+            socket_path: socket path for "unix" (default: alert_codec.ALERT_SOCKET_PATH)
+
+        Raises:
+            ValueError: unknown transport
+        """
+        if transport not in ALERT_TRANSPORTS:
+            raise ValueError(f"alert transport must be one of {', '.join(ALERT_TRANSPORTS)}")
+        self.alert_transport = transport
+        self.socket_path = socket_path or ALERT_SOCKET_PATH
+
+    def enable(self, quiet=False):
+        """
+        Enable API integration.
+
+        Args:
+            quiet: don't print anything on failure (used for background retries)
+        """
         try:
             # Test if API is reachable
-            req = urllib.request.Request(
-                f"{self.api_base_url}/system/health",
-                method='GET'
-            )
-            with urllib.request.urlopen(req, timeout=2) as response:
-                if response.status == 200:
-                    self.enabled = True
-                    print(f"[*] API integration enabled (API: {self.api_base_url})")
-                    return True
+            status, _ = self.http.request('GET', '/system/health', timeout=2)
+            if status == 200:
+                self.enabled = True
+                self._start_shipper()
+                print(f"[*] API integration enabled (API: {self.api_base_url})")
+                return True
+            return False
         except Exception as e:
-            print(f"[!] Failed to enable API integration: {e}")
-            print(f"[!] Make sure Web Interface is running at {self.api_base_url}")
+            if not quiet:
+                print(f"[!] Failed to enable API integration: {e}")
+                print(f"[!] Make sure Web Interface is running at {self.api_base_url}")
             return False
 
     def disable(self):
@@ -45,93 +338,420 @@ class DatabaseIntegration:
 
     def insert_alert(self, alert_data: Dict[str, Any]) -> bool:
         """
-        Send alert to Web Interface API via HTTP POST.
-        Non-blocking - returns immediately without waiting for response.
+        Queue an alert for the shipper thread.
+        Never blocks on the network; returns False if integration is disabled
+        (unless there is a spool, which keeps the alerts until the API is up).
+        A STARTED alert over its class's rate is suppressed (counted in a summary).
         """
         if not self.enabled:
+            if self.spool is None:
+                return False
+            if self._shipper is None:
+                self._start_shipper()
+
+        if self.admission is not None and not self.admission.admit(alert_data, time.monotonic()):
+            self.alerts_suppressed += 1
+            return True
+
+        level = priority(alert_data)
+        with self._alert_cond:
+            self._enqueue(alert_data, level)
+            self.alerts_queued += 1
+            if level == 0 or self._queued() >= self.batch_size:
+                self._alert_cond.notify()  # a signature hit doesn't wait for flush_interval
+        return True
+
+    def _queued(self) -> int:
+        return sum(map(len, self._alert_queues)) + sum(map(len, self._continuations))
+
+    def _enqueue(self, record: Dict[str, Any], level: int):
+        """
+        Queue a record in its class (caller holds _alert_cond). A full queue
+        drops the oldest STARTED record / SYSTEM event of the lowest class,
+        an ONGOING / ENDED record only if no other kind is queued.
+        """
+        continuation = is_continuation(record)
+        if self._queued() >= self.max_queued:
+            droppable = [n for n, queue in enumerate(self._alert_queues) if queue]
+            if droppable:
+                lowest = droppable[-1]
+                if lowest < level and not continuation:
+                    self._dropped(record)  # everything queued outranks it
+                    return
+                self._dropped(self._alert_queues[lowest].popleft())
+            else:
+                lowest = max(n for n, queue in enumerate(self._continuations) if queue)
+                if lowest < level or not continuation:
+                    self._dropped(record)
+                    return
+                self._dropped(self._continuations[lowest].popleft())
+        (self._continuations if continuation else self._alert_queues)[level].append(record)
+
+    def _dropped(self, record: Dict[str, Any]):
+        self.alerts_dropped += 1
+        if self.admission is not None:
+            self.admission.overflow(record)
+
+    def _take_batch(self) -> list:
+        """Up to batch_size queued records, highest class first (caller holds _alert_cond)."""
+        batch = []
+        for continuations, queue in zip(self._continuations, self._alert_queues):
+            for source in (continuations, queue):
+                while source and len(batch) < self.batch_size:
+                    batch.append(source.popleft())
+        return batch
+
+    def send_alerts(self, alerts: list) -> bool:
+        """
+        Send a batch of alerts to the Web Interface API over the selected transport.
+        Blocking, called from the shipper thread.
+        """
+        if self.alert_transport == "unix":
+            if self._send_alerts_socket(alerts):
+                self.socket_batches += 1
+                return True
+            self.socket_fallbacks += 1
+
+        try:
+            # with a spool a failed batch goes to disk at once, no retry sleeps while the queue fills
+            retries = 0 if self.spool is not None else None
+            status, _ = self.http.request('POST', '/alerts/bulk', {'alerts': alerts}, timeout=5, retries=retries)
+            # 202 = Accepted, 200 = OK
+            return status in (200, 202)
+        except Exception:
+            # Timeout or connection error - the shipper keeps the batch and retries
             return False
 
+    def _send_alerts_socket(self, alerts: list) -> bool:
+        """Write a batch as binary frames on the API's Unix socket (connected on first use, kept open)."""
         try:
-            # Convert details dict to JSON string if needed
-            if 'details' in alert_data and isinstance(alert_data['details'], dict):
-                # Keep as dict, API will handle conversion
-                pass
-
-            # Prepare JSON payload
-            payload = json.dumps(alert_data).encode('utf-8')
-
-            # Create HTTP POST request
-            req = urllib.request.Request(
-                self.alerts_endpoint,
-                data=payload,
-                headers={
-                    'Content-Type': 'application/json',
-                    'Accept': 'application/json'
-                },
-                method='POST'
-            )
-
-            # Send request (non-blocking with very short timeout)
+            frames = b"".join([*map(encode_alert, alerts), SYNC_FRAME])
+        except (TypeError, ValueError) as e:
+            print(f"[!] Alert batch can't be encoded for the socket: {e}")
+            return False
+
+        for _ in range(2):  # once more on a fresh connection if the API restarted
             try:
-                with urllib.request.urlopen(req, timeout=0.5) as response:
-                    # 202 = Accepted (background processing)
-                    # 201 = Created (immediate processing)
-                    # 200 = OK
-                    if response.status in (200, 201, 202):
-                        return True
-                    else:
-                        # Don't print errors for every failed alert - too noisy
-                        return False
-            except urllib.error.URLError:
-                # Timeout or connection error - don't block IDS, fail silently
+                if self._socket is None:
+                    self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                    self._socket.settimeout(5)
+                    self._socket.connect(self.socket_path)
+                self._socket.sendall(frames)
+                # the API answers the sync frame once the batch is stored
+                reply = self._socket.recv(1)
+                if reply == SYNC_OK:
+                    return True
+                if reply == SYNC_FAILED:
+                    return False
+                raise ConnectionResetError("alert socket closed")
+            except OSError:
+                self._close_socket()
+        return False
+
+    def _close_socket(self):
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+
+    def _start_shipper(self):
+        """Start the alert shipper thread (once)."""
+        if self._shipper and self._shipper.is_alive():
+            return
+        self._stopping = False
+        self._shipper = threading.Thread(target=self._ship_loop, daemon=True, name="alert-shipper")
+        self._shipper.start()
+
+    def _ship_loop(self):
+        """Send queued alerts in batches until stop_shipper() drains the queue."""
+        if self.spool is not None:
+            self.spool.open()
+        while True:
+            with self._alert_cond:
+                backlog = not self._stopping and self._backlog_due()
+                if self._queued() < self.batch_size and not self._stopping and not backlog:
+                    self._alert_cond.wait(self.flush_interval)
+                if self.admission is not None:
+                    for level, record in self.admission.summaries(time.monotonic(), force=self._stopping):
+                        self._enqueue(record, level)
+                if not self._queued() and not backlog:
+                    if self._stopping:
+                        return
+                    batch = None
+                else:
+                    batch = self._take_batch()
+
+            if self.spool is not None:
+                if batch is None:
+                    self.spool.sync(force=False)  # idle: fsync what the last appends left
+                else:
+                    self._ship_spooled(batch)
+                continue
+            if batch is None:
+                continue
+
+            if self.send_alerts(batch):
+                self.alerts_sent += len(batch)
+                self.batches_sent += 1
+                continue
+
+            self.batches_failed += 1
+            if self._stopping:
+                self.alerts_dropped += len(batch)
+                continue
+            with self._alert_cond:
+                # put the batch back in front of its classes (if that overflows the
+                # queue, its STARTED records are dropped first, lowest class first)
+                continuations = [record for record in batch if is_continuation(record)]
+                kept = continuations + [record for record in batch if not is_continuation(record)]
+                room = max(0, self.max_queued - self._queued())
+                for record in kept[room:]:
+                    self._dropped(record)
+                for record in reversed(kept[:room]):
+                    (self._continuations if is_continuation(record) else self._alert_queues)[priority(record)].appendleft(record)
+                # back off, the API is slow or down
+                self._alert_cond.wait(self.flush_interval * 4)
+
+    def _backlog_due(self) -> bool:
+        """Spooled alerts are waiting and the API may be tried again."""
+        return self.spool is not None and self.spool.pending > 0 and time.monotonic() >= self._retry_at
+
+    def _ship_spooled(self, batch: list):
+        """Send the spooled backlog, then `batch`; whatever can't go now is spooled."""
+        if time.monotonic() >= self._retry_at and self._replay_spool():
+            if not batch:
+                return
+            if self.send_alerts(batch):
+                self.alerts_sent += len(batch)
+                self.batches_sent += 1
+                return
+            self._api_failed()
+        if batch:
+            self._spool_queued(batch)
+
+    def _spool_queued(self, batch: list):
+        """Spool `batch` and the whole in-memory queue behind it (the API can't take them now)."""
+        # under the lock: a burst waits for the disk (flushed, not fsynced) instead of
+        # overflowing the queue while the spool is written
+        with self._alert_cond:
+            self.spool.append(batch)
+            while self._queued():
+                self.spool.append(self._take_batch())
+
+    def _replay_spool(self) -> bool:
+        """
+        Send up to REPLAY_BATCHES batches of the spool, oldest first.
+
+        Returns:
+            bool: the spool is empty now
+        """
+        for _ in range(REPLAY_BATCHES):
+            batch = self.spool.peek(self.batch_size)
+            if not batch:
+                return True
+            if not self.send_alerts(batch):
+                self._api_failed()
                 return False
+            self.spool.ack()
+            self.alerts_sent += len(batch)
+            self.batches_sent += 1
+        return self.spool.pending == 0
 
-        except Exception as e:
-            print(f"[!] Error sending alert to API: {e}")
-            return False
+    def _api_failed(self):
+        self.batches_failed += 1
+        # back off, the API is slow or down
+        self._retry_at = time.monotonic() + self.flush_interval * 4
 
-    def get_signatures(self, enabled_only: bool = True) -> list:
+    def stop_shipper(self, timeout: float = 5.0):
+        """Send what is still queued (best effort, up to `timeout` seconds) and stop the shipper."""
+        if not self._shipper:
+            return
+        with self._alert_cond:
+            self._stopping = True
+            self._alert_cond.notify()
+        self._shipper.join(timeout)
+        self.http.close()
+        self._close_socket()
+        if self.spool is not None and not self._shipper.is_alive():
+            self.spool.close()
+
+    def get_shipper_stats(self) -> Dict[str, Any]:
+        """Get alert shipper statistics"""
+        return {
+            'queued': self._queued(),
+            'queued_by_class': {name: len(queue) + len(continuations) for name, queue, continuations
+                                in zip(PRIORITIES, self._alert_queues, self._continuations)},
+            'alerts_queued': self.alerts_queued,
+            'alerts_sent': self.alerts_sent,
+            'alerts_dropped': self.alerts_dropped,
+            'alerts_suppressed': self.alerts_suppressed,
+            'admission': self.admission.get_stats() if self.admission is not None else None,
+            'batches_sent': self.batches_sent,
+            'batches_failed': self.batches_failed,
+            'transport': self.alert_transport,
+            'socket_batches': self.socket_batches,
+            'socket_fallbacks': self.socket_fallbacks,
+            'spool': self.spool.get_stats() if self.spool is not None else None,
+            'incidents_sent': self.incidents_sent,
+            'incidents_unsent': len(self._unsent_incidents),
+            'incidents_dropped': self.incidents_dropped,
+        }
+
+    def get_signatures(self, enabled_only: bool = True) -> Optional[list]:
         """
         Get signatures from Web Interface API via HTTP GET.
-        Returns list of signature dicts with keys: name, pattern, action, description, enabled
+        Returns list of signature dicts with keys: name, pattern, action, description, enabled,
+        proto, src_ports, dst_ports, nocase, offset, depth, field
+        Returns None if the API could not be asked (so callers can keep their current rules)
         """
         if not self.enabled:
-            return []
+            return None
 
+        page_size = 10000
+        result = []
         try:
-            # Build URL with query parameters
-            url = f"{self.signatures_endpoint}?page=1&page_size=10000"
-            if enabled_only:
-                url += "&enabled=true"
-
-            # Create HTTP GET request
-            req = urllib.request.Request(url, method='GET')
-
-            # Send request
-            with urllib.request.urlopen(req, timeout=5) as response:
-                if response.status == 200:
-                    data = json.loads(response.read().decode('utf-8'))
-                    signatures = data.get('signatures', [])
-
-                    # Convert to expected format
-                    return [
-                        {
-                            'name': sig.get('name', ''),
-                            'pattern': sig.get('pattern', ''),
-                            'action': sig.get('action', 'alert'),
-                            'description': sig.get('description', ''),
-                            'enabled': sig.get('enabled', False)
-                        }
-                        for sig in signatures
-                    ]
-                else:
-                    print(f"[!] Failed to get signatures from API: HTTP {response.status}")
-                    return []
+            page = 1
+            while True:
+                # Build URL with query parameters
+                path = f"/signatures?page={page}&page_size={page_size}"
+                if enabled_only:
+                    path += "&enabled=true"
+
+                status, data = self.http.request('GET', path, timeout=10)
+                if status != 200:
+                    print(f"[!] Failed to get signatures from API: HTTP {status}")
+                    return None
+
+                signatures = data.get('signatures', [])
+
+                # Convert to expected format
+                result.extend(
+                    {
+                        'name': sig.get('name', ''),
+                        'pattern': sig.get('pattern', ''),
+                        'action': sig.get('action', 'alert'),
+                        'description': sig.get('description', ''),
+                        'enabled': sig.get('enabled', False),
+                        'proto': sig.get('proto', 'any'),
+                        'src_ports': sig.get('src_ports', 'any'),
+                        'dst_ports': sig.get('dst_ports', 'any'),
+                        'nocase': sig.get('nocase', 0),
+                        'offset': sig.get('offset'),
+                        'depth': sig.get('depth'),
+                        'field': sig.get('field', 'any'),
+                    }
+                    for sig in signatures
+                )
+
+                # big imported rulesets span several pages
+                if not signatures or len(result) >= data.get('total', 0):
+                    return result
+                page += 1
 
         except Exception as e:
             print(f"[!] Error getting signatures from API: {e}")
-            return []
+            return None
+
+    def get_ruleset_version(self) -> Optional[Dict[str, Any]]:
+        """
+        Get the current ruleset version from the Web Interface API.
+        Returns dict with keys: version, etag, count (or None on error)
+        """
+        if not self.enabled:
+            return None
+
+        try:
+            status, data = self.http.request('GET', '/signatures/version', timeout=5)
+            return data if status == 200 else None
+        except Exception as e:
+            print(f"[!] Error getting ruleset version from API: {e}")
+            return None
+
+    def wait_for_ruleset_change(self, etag: Optional[str], timeout: int = 25) -> Optional[Dict[str, Any]]:
+        """
+        Long-poll the API until the ruleset ETag differs from `etag`
+        (or `timeout` seconds pass). Meant to run on a background thread.
+        Returns the same dict as get_ruleset_version (or None on error)
+        """
+        if not self.enabled:
+            return None
+
+        try:
+            path = f"/signatures/changes?timeout={timeout}"
+            if etag:
+                path += f"&etag={urllib.parse.quote(etag)}"
+
+            # the server holds the request for up to `timeout` seconds
+            status, data = self.http.request('GET', path, timeout=timeout + 5)
+            return data if status == 200 else None
+        except Exception as e:
+            print(f"[!] Error waiting for ruleset changes: {e}")
+            return None
+
+    def report_ids_stats(self, key: str, stats: Dict[str, Any]) -> bool:
+        """
+        Publish a block of IDS runtime stats (e.g. active ruleset) to the API.
+        The dashboard reads them back from /api/system/ids-stats.
+        """
+        if not self.enabled:
+            return False
+
+        try:
+            status, _ = self.http.request('PUT', f"/system/ids-stats/{key}", stats, timeout=2)
+            return status == 200
+        except Exception as e:
+            print(f"[!] Error reporting IDS stats to API: {e}")
+            return False
+
+    def send_incidents(self, incidents: list) -> bool:
+        """
+        Send incident records (see IncidentCorrelator) to the API, which
+        upserts them by incident_id. Records the API doesn't take are kept
+        (the newest one per incident, at most max_queued) and sent again
+        with the next call.
+        """
+        if not self.enabled:
+            return False
+
+        unsent = self._unsent_incidents
+        for record in incidents:
+            unsent.pop(record['incident_id'], None)
+            unsent[record['incident_id']] = record
+        while len(unsent) > self.max_queued:
+            unsent.popitem(last=False)
+            self.incidents_dropped += 1
+        if not unsent:
+            return True
+
+        records = list(unsent.values())
+        try:
+            status, _ = self.http.request('POST', '/incidents/bulk', {'incidents': records}, timeout=5)
+        except Exception as e:
+            print(f"[!] Error sending incidents to API: {e}")
+            return False
+        if status != 200:
+            return False
+        unsent.clear()
+        self.incidents_sent += len(records)
+        return True
+
+    def send_signature_stats(self, deltas: Dict[str, list]) -> bool:
+        """
+        Send per-rule counter deltas (see RuleStats) to the API.
+        The API adds them to its running totals.
+
+        Args:
+            deltas: rule name -> [matches, bytes_scanned, cost_ns, profiled_packets, last_match]
+        """
+        if not self.enabled:
+            return False
+
+        try:
+            status, _ = self.http.request('POST', '/signatures/stats', {'rules': deltas}, timeout=5)
+            return status == 200
+        except Exception as e:
+            print(f"[!] Error sending signature stats to API: {e}")
+            return False
 
 
 # Global instance
-db_integration = DatabaseIntegration()
\ No newline at end of file
+db_integration = DatabaseIntegration(spool=AlertSpool(), admission=AlertAdmission())
\ No newline at end of file
@@ -1,7 +1,7 @@
-from netfilterqueue import NetfilterQueue
 import time
 import math
 from collections import deque, defaultdict, Counter
+from packet_parser import IPV6_FLAG, ip_to_str, prefix_mask
 
 # global var
 
@@ -82,8 +82,18 @@ class EWMARateEstimator:
         self.last_timestamp = None
 
 
+# ============================================================
+# Address aggregation
+# ============================================================
+# Scan / flood state is keyed by network, not by address: an IPv6 host
+# picks a new random address from its /64 whenever it likes, so keying
+# by address would let one scanner spread over (and grow) millions of
+# entries. Addresses are masked to ipv4_prefix / ipv6_prefix bits
+# before they touch the tables (/32 and /64 by default).
+# ============================================================
+
 class PortScanningDetector:
-    def __init__(self, threshold, max_seconds):
+    def __init__(self, threshold, max_seconds, ipv4_prefix=32, ipv6_prefix=64):
         self.threshold = threshold
         self.port_scanning_log = defaultdict(deque)
 
@@ -93,6 +103,11 @@ class PortScanningDetector:
         
         self.m_sec = max_seconds
 
+        # prefix lengths addresses are aggregated to (see above)
+        self.ipv4_prefix = ipv4_prefix
+        self.ipv6_prefix = ipv6_prefix
+        self._ipv4_mask, self._ipv6_mask = prefix_mask(ipv4_prefix, ipv6_prefix)
+
         # values for testing attacks..
         self.port_scanning_window = 5
         self.port_scanning_threshold = 20
@@ -127,6 +142,8 @@ class PortScanningDetector:
         # 0 => no attack detected
         # 1 => port scanning
         # 2 => tcp flood
+        src_ip_add = self.aggregate(src_ip_add)
+        dst_ip_add = self.aggregate(dst_ip_add)
         result = self.check_port_scanning(src_ip_add, dst_ip_add, timestamp, port_number)
         if result:
             return 1 # whatever you wanna say about port scanning..
@@ -212,7 +229,7 @@ class PortScanningDetector:
 
     def analyze_udp(self, dst_ip_add, timestamp, port_number):
 
-        flow_key = (dst_ip_add, port_number)
+        flow_key = (self.aggregate(dst_ip_add), port_number)
 
         # Update EWMA rate estimator for this flow
         ewma_rate = self.udp_flood_ewma[flow_key].update(timestamp)
@@ -253,7 +270,7 @@ class PortScanningDetector:
 
     def analyze_icmp(self, dst_ip_add, timestamp):
 
-        flow_key = dst_ip_add
+        flow_key = dst_ip_add = self.aggregate(dst_ip_add)
 
         # Update EWMA rate estimator for this flow
         ewma_rate = self.icmp_flood_ewma[flow_key].update(timestamp)
@@ -292,6 +309,10 @@ class PortScanningDetector:
 
             return False
 
+    def aggregate(self, addr):
+        """The network (address int masked to the configured prefix) an address is counted under."""
+        return addr & (self._ipv6_mask if addr & IPV6_FLAG else self._ipv4_mask)
+
     def get_ewma_stats(self):
         """
         Get current EWMA rate stats for all tracked flows.
@@ -302,14 +323,20 @@ class PortScanningDetector:
             'udp_flows': {},
             'icmp_flows': {}
         }
-        for key, estimator in self.tcp_flood_ewma.items():
-            stats['tcp_flows'][str(key)] = round(estimator.get_rate(), 2)
-        for key, estimator in self.udp_flood_ewma.items():
-            stats['udp_flows'][str(key)] = round(estimator.get_rate(), 2)
-        for key, estimator in self.icmp_flood_ewma.items():
-            stats['icmp_flows'][str(key)] = round(estimator.get_rate(), 2)
+        # keys hold aggregated address ints, formatted here
+        for (dst_ip, port), estimator in self.tcp_flood_ewma.items():
+            stats['tcp_flows'][str((self._network_str(dst_ip), port))] = round(estimator.get_rate(), 2)
+        for (dst_ip, port), estimator in self.udp_flood_ewma.items():
+            stats['udp_flows'][str((self._network_str(dst_ip), port))] = round(estimator.get_rate(), 2)
+        for dst_ip, estimator in self.icmp_flood_ewma.items():
+            stats['icmp_flows'][self._network_str(dst_ip)] = round(estimator.get_rate(), 2)
         return stats
 
+    def _network_str(self, addr):
+        prefix = self.ipv6_prefix if addr & IPV6_FLAG else self.ipv4_prefix
+        full = 128 if addr & IPV6_FLAG else 32
+        return ip_to_str(addr) if prefix == full else f"{ip_to_str(addr)}/{prefix}"
+
 
     # def analyze_packet(self, src_ip_add, dst_ip_add, timestamp, port_number):
     #     if (src_ip_add, dst_ip_add) not in self.log:
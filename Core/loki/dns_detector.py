@@ -0,0 +1,277 @@
+# DNS-aware detection
+# The UDP flood counter only sees packets per second. This module reads
+# the DNS header and query name of port 53 traffic and keeps a few stats
+# per registered domain, enough to spot:
+#   - DNS tunneling            many long, random looking subdomains
+#   - random subdomain floods  a burst of queries for names that never repeat
+#   - NXDOMAIN floods          mostly "no such name" answers for one domain
+
+import math
+import time
+from collections import OrderedDict
+
+
+# ============================================================
+# Per-domain table
+# ============================================================
+# Keyed by the registered domain ("example.com", "example.co.uk"), so
+# a tunnel spreading over x1.t.example.com, x2.t.example.com ... lands
+# in ONE entry. Each entry holds counters for the current window only:
+#
+#   queries / responses / nxdomain    plain counters
+#   subdomain length sum              mean length of the part left of the domain
+#   entropy sum                       mean entropy of the subdomains at least
+#                                     ENTROPY_MIN_LENGTH long (shorter ones
+#                                     can't look random, and skipping them
+#                                     keeps popular names cheap)
+#   distinct subdomains               HyperLogLog, 256 one-byte registers
+#                                     (~6.5% error, fixed 256 bytes no
+#                                     matter how many names we see)
+#
+# The table is an LRU bounded by max_domains, so a flood of random
+# registered domains can't grow it without limit.
+# ============================================================
+
+DNS_PORT = 53
+RCODE_NXDOMAIN = 3
+ENTROPY_MIN_LENGTH = 16
+
+# second-level labels under which names are registered one level deeper
+TWO_LEVEL_SUFFIXES = frozenset((
+    "co.uk", "org.uk", "ac.uk", "gov.uk", "com.au", "net.au", "org.au", "co.nz", "co.jp",
+    "co.kr", "co.in", "com.br", "com.cn", "com.tr", "com.mx", "com.ar", "co.za", "com.sg",
+))
+
+HLL_BITS = 8
+HLL_REGISTERS = 1 << HLL_BITS
+HLL_ALPHA = 0.7213 / (1 + 1.079 / HLL_REGISTERS)
+HLL_POWERS = tuple(2.0 ** -i for i in range(65))
+HASH_MASK = (1 << 64) - 1
+
+
+class HyperLogLog:
+    """Distinct count estimate in HLL_REGISTERS bytes."""
+    __slots__ = ("registers",)
+
+    def __init__(self):
+        self.registers = bytearray(HLL_REGISTERS)
+
+    def add(self, value):
+        h = hash(value) & HASH_MASK
+        index = h >> (64 - HLL_BITS)
+        rest = h & ((1 << (64 - HLL_BITS)) - 1)
+        rank = (64 - HLL_BITS) - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def count(self):
+        estimate = HLL_ALPHA * HLL_REGISTERS * HLL_REGISTERS / sum(HLL_POWERS[r] for r in self.registers)
+        if estimate <= 2.5 * HLL_REGISTERS:
+            zeros = self.registers.count(0)
+            if zeros:
+                # small range correction (linear counting)
+                estimate = HLL_REGISTERS * math.log(HLL_REGISTERS / zeros)
+        return int(estimate)
+
+
+def parse_dns(payload):
+    """
+    Parse the header and first question of a DNS message.
+
+    Returns:
+        (is_response, rcode, qname, qtype), or None if it isn't DNS
+    """
+    if len(payload) < 17:
+        return None
+    flags = (payload[2] << 8) | payload[3]
+    if (flags >> 11) & 0x0F != 0 or not ((payload[4] << 8) | payload[5]):
+        return None  # not a standard query, or no question
+
+    labels = []
+    pos = 12
+    end = len(payload)
+    while pos < end:
+        length = payload[pos]
+        if length == 0:
+            pos += 1
+            break
+        if length > 63 or pos + 1 + length > end:
+            return None  # compression pointer or garbage in a question
+        labels.append(payload[pos + 1:pos + 1 + length])
+        pos += 1 + length
+    else:
+        return None
+
+    if pos + 2 > end or not labels:
+        return None
+    qname = b".".join(labels).decode("ascii", "replace").lower()
+    qtype = (payload[pos] << 8) | payload[pos + 1]
+    return bool(flags & 0x8000), flags & 0x0F, qname, qtype
+
+
+def split_domain(qname):
+    """
+    "a.b.example.co.uk" -> ("example.co.uk", "a.b")
+
+    Returns:
+        (registered domain, subdomain part, "" if none)
+    """
+    rest, _, tld = qname.rpartition(".")
+    rest, _, second = rest.rpartition(".")
+    domain = f"{second}.{tld}" if second else tld
+    if rest and domain in TWO_LEVEL_SUFFIXES:
+        rest, _, third = rest.rpartition(".")
+        domain = f"{third}.{domain}"
+    return domain, rest
+
+
+def label_entropy(text):
+    """Shannon entropy in bits per character."""
+    size = len(text)
+    return math.log2(size) - sum(count * math.log2(count) for count in map(text.count, set(text))) / size
+
+
+class _DomainStats:
+    __slots__ = ("window_start", "queries", "responses", "nxdomain", "length_sum",
+                 "entropy_sum", "entropy_samples", "subdomains", "distinct", "alerted")
+
+    def __init__(self, now):
+        self.reset(now)
+
+    def reset(self, now):
+        self.window_start = now
+        self.queries = 0
+        self.responses = 0
+        self.nxdomain = 0
+        self.length_sum = 0
+        self.entropy_sum = 0.0
+        self.entropy_samples = 0
+        self.subdomains = 0        # queries that had a subdomain part
+        self.distinct = HyperLogLog()
+        self.alerted = set()       # subtypes already raised in this window
+
+
+class DnsDetector:
+    """
+    Tunneling / random subdomain / NXDOMAIN flood detection on port 53.
+    """
+    def __init__(self, window=10, max_domains=4096, check_every=16,
+                 tunnel_min_distinct=20, tunnel_min_length=30, tunnel_min_entropy=3.5,
+                 flood_min_queries=200, flood_distinct_ratio=0.8,
+                 nxdomain_min=100, nxdomain_ratio=0.5):
+        """
+        Args:
+            window: seconds the per-domain counters cover
+            max_domains: registered domains tracked at most (LRU)
+            check_every: messages of a domain between two threshold checks
+            tunnel_*: distinct subdomains, mean subdomain length and mean
+                      entropy (bits/char) that together mean tunneling
+            flood_min_queries / flood_distinct_ratio: queries per window,
+                      mostly for names never seen before = random subdomain flood
+            nxdomain_min / nxdomain_ratio: NXDOMAIN answers per window, and
+                      their share of all answers = NXDOMAIN flood
+        """
+        self.window = window
+        self.max_domains = max_domains
+        self.check_every = check_every
+        self.tunnel_min_distinct = tunnel_min_distinct
+        self.tunnel_min_length = tunnel_min_length
+        self.tunnel_min_entropy = tunnel_min_entropy
+        self.flood_min_queries = flood_min_queries
+        self.flood_distinct_ratio = flood_distinct_ratio
+        self.nxdomain_min = nxdomain_min
+        self.nxdomain_ratio = nxdomain_ratio
+
+        self._domains = OrderedDict()
+
+        # Statistics
+        self.messages = 0
+        self.not_dns = 0
+        self.evicted = 0
+
+    def analyze(self, payload, timestamp=None):
+        """
+        Account one DNS message (UDP payload from or to port 53).
+
+        Returns:
+            (subtype name, details dict) when a domain crosses a threshold
+            for the first time in its window, otherwise None
+        """
+        parsed = parse_dns(payload)
+        if parsed is None:
+            self.not_dns += 1
+            return None
+        self.messages += 1
+        is_response, rcode, qname, qtype = parsed
+        now = timestamp if timestamp is not None else time.time()
+
+        domain, subdomain = split_domain(qname)
+        stats = self._domains.get(domain)
+        if stats is None:
+            if len(self._domains) >= self.max_domains:
+                self._domains.popitem(last=False)
+                self.evicted += 1
+            stats = self._domains[domain] = _DomainStats(now)
+        else:
+            self._domains.move_to_end(domain)
+            if now - stats.window_start > self.window:
+                stats.reset(now)
+
+        if is_response:
+            stats.responses += 1
+            if rcode == RCODE_NXDOMAIN:
+                stats.nxdomain += 1
+        else:
+            stats.queries += 1
+            if subdomain:
+                stats.subdomains += 1
+                stats.length_sum += len(subdomain)
+                if len(subdomain) >= ENTROPY_MIN_LENGTH:
+                    stats.entropy_samples += 1
+                    stats.entropy_sum += label_entropy(subdomain.replace(".", ""))
+                stats.distinct.add(subdomain)
+
+        if (stats.queries + stats.responses) % self.check_every:
+            return None
+        return self._check(domain, stats, qtype)
+
+    def _check(self, domain, stats, qtype):
+        """Compare a domain's window with the thresholds."""
+        distinct = stats.distinct.count() if stats.subdomains else 0
+        mean_length = stats.length_sum / stats.subdomains if stats.subdomains else 0.0
+        mean_entropy = stats.entropy_sum / stats.entropy_samples if stats.entropy_samples else 0.0
+
+        subtype = None
+        if (distinct >= self.tunnel_min_distinct and mean_length >= self.tunnel_min_length
+                and mean_entropy >= self.tunnel_min_entropy):
+            subtype = "DNS_TUNNELING"
+        elif (stats.queries >= self.flood_min_queries
+                and distinct >= self.flood_distinct_ratio * stats.queries):
+            subtype = "DNS_SUBDOMAIN_FLOOD"
+        elif (stats.nxdomain >= self.nxdomain_min
+                and stats.nxdomain >= self.nxdomain_ratio * stats.responses):
+            subtype = "DNS_NXDOMAIN_FLOOD"
+
+        if subtype is None or subtype in stats.alerted:
+            return None
+        stats.alerted.add(subtype)
+        return subtype, {
+            "domain": domain,
+            "queries": stats.queries,
+            "distinct_subdomains": distinct,
+            "nxdomain": stats.nxdomain,
+            "responses": stats.responses,
+            "mean_subdomain_length": round(mean_length, 1),
+            "mean_label_entropy": round(mean_entropy, 2),
+            "last_qtype": qtype,
+            "window_seconds": self.window,
+        }
+
+    def get_stats(self):
+        """Get detector statistics"""
+        return {
+            'messages': self.messages,
+            'not_dns': self.not_dns,
+            'tracked_domains': len(self._domains),
+            'evicted_domains': self.evicted,
+        }
@@ -0,0 +1,188 @@
+# Unified flow table
+# One record per 5-tuple, shared by everything that keeps per-flow state
+# (inspection policy verdict, TLS fingerprint verdict, HTTP reassembly,
+# last alert). process_packet looks the flow up ONCE and hands the record
+# to the detectors, instead of each of them hashing its own tuple of
+# strings into its own dict.
+
+import time
+from collections import OrderedDict
+
+from packet_parser import IPV6_FLAG, ip_to_str
+
+
+# ============================================================
+# Keys and expiry
+# ============================================================
+# The key is the 5-tuple packed into one int, built straight from the
+# packet bytes (no string formatting per packet):
+#
+#   IPv4             src ip (32) | dst ip (32) | src port (16) | dst port (16) | proto (8)
+#   IPv6   1 (flag) | src ip (128) | dst ip (128) | src port (16) | dst port (16) | proto (8)
+#
+# The flag bit above the IPv6 addresses keeps both layouts apart.
+#
+# Addresses stay ints (see packet_parser.py); their text is made the
+# first time an alert or a log line asks for src_ip / dst_ip.
+#
+# The table is an OrderedDict in least-recently-seen order: a hit moves
+# the record to the end, so idle flows gather at the front. Creating a
+# flow first drops front records idle for more than `idle_timeout`, then
+# the oldest one if the table is still full.
+#
+# One table per NFQUEUE thread, so there is no lock.
+# ============================================================
+
+PROTO_NAMES = {1: "icmp", 6: "tcp", 17: "udp", 58: "icmp"}
+
+KEY_IPV6 = 1 << 296
+ADDR4_MASK = (1 << 32) - 1
+ADDR6_MASK = (1 << 128) - 1
+
+
+def pack_flow_key(raw, proto, src_port, dst_port):
+    """Packed 5-tuple of an IPv4 / IPv6 packet (raw starts at the IP header)."""
+    ports = (src_port << 24) | (dst_port << 8) | proto
+    if raw[0] >> 4 == 6:
+        return KEY_IPV6 | (int.from_bytes(raw[8:40], "big") << 40) | ports
+    return (int.from_bytes(raw[12:20], "big") << 40) | ports
+
+
+def reverse_flow_key(key):
+    """Packed 5-tuple of the other direction of a flow (addresses and ports swapped)."""
+    ports = (((key >> 8) & 0xFFFF) << 24) | (((key >> 24) & 0xFFFF) << 8) | (key & 0xFF)
+    if key & KEY_IPV6:
+        return KEY_IPV6 | (((key >> 40) & ADDR6_MASK) << 168) | (((key >> 168) & ADDR6_MASK) << 40) | ports
+    return (((key >> 40) & ADDR4_MASK) << 72) | ((key >> 72) << 40) | ports
+
+
+def unpack_addresses(key):
+    """(src address int, dst address int) of a packed key."""
+    if key & KEY_IPV6:
+        return IPV6_FLAG | ((key >> 168) & ADDR6_MASK), IPV6_FLAG | ((key >> 40) & ADDR6_MASK)
+    return key >> 72, (key >> 40) & ADDR4_MASK
+
+
+class FlowRecord:
+    """State of one 5-tuple, shared by the detectors."""
+    __slots__ = ("key", "src_addr", "dst_addr", "_src_ip", "_dst_ip", "src_port", "dst_port", "proto",
+                 "first_seen", "last_seen", "packets", "bytes",
+                 "policy", "tls", "http", "alert")
+
+    def __init__(self, key, src_addr, dst_addr, src_port, dst_port, proto, now):
+        self.key = key
+        self.src_addr = src_addr    # address ints
+        self.dst_addr = dst_addr
+        self._src_ip = None         # their text, made on first use
+        self._dst_ip = None
+        self.src_port = src_port
+        self.dst_port = dst_port
+        self.proto = proto          # "tcp" / "udp" / "icmp" / "ip"
+        self.first_seen = now
+        self.last_seen = now
+        self.packets = 0
+        self.bytes = 0
+
+        self.policy = None          # inspection policy verdict (inspect flags, rule index)
+        self.tls = None             # TLS ClientHello verdict
+        self.http = None            # HTTP request head / body state
+        self.alert = None           # key of the last alert raised on this flow
+
+    @property
+    def src_ip(self):
+        if self._src_ip is None:
+            self._src_ip = ip_to_str(self.src_addr)
+        return self._src_ip
+
+    @property
+    def dst_ip(self):
+        if self._dst_ip is None:
+            self._dst_ip = ip_to_str(self.dst_addr)
+        return self._dst_ip
+
+
+class FlowTable:
+    """
+    5-tuple -> FlowRecord, bounded, with idle expiry.
+    """
+    def __init__(self, max_flows=65536, idle_timeout=120):
+        """
+        Args:
+            max_flows: flows tracked at most (least recently seen evicted)
+            idle_timeout: seconds without packets after which a flow is dropped
+        """
+        self.max_flows = max_flows
+        self.idle_timeout = idle_timeout
+        self._flows = OrderedDict()
+
+        # Statistics
+        self.lookups = 0
+        self.created = 0
+        self.expired = 0
+        self.evicted = 0
+
+    def lookup(self, raw, proto, src_port, dst_port, size, now=None):
+        """
+        The flow of an IP packet, created on its first packet.
+
+        Args:
+            raw: packet bytes starting at the IP header
+            proto: IP protocol number
+            src_port, dst_port: transport ports (0 without ports)
+            size: packet length, added to the flow's byte counter
+            now: packet timestamp (defaults to time.time())
+
+        Returns:
+            FlowRecord
+        """
+        now = now or time.time()
+        key = pack_flow_key(raw, proto, src_port, dst_port)
+        self.lookups += 1
+
+        flows = self._flows
+        flow = flows.get(key)
+        if flow is None:
+            self._expire(now)
+            src_addr, dst_addr = unpack_addresses(key)
+            flow = flows[key] = FlowRecord(
+                key, src_addr, dst_addr, src_port, dst_port, PROTO_NAMES.get(proto, "ip"), now
+            )
+            self.created += 1
+        else:
+            flows.move_to_end(key)
+
+        flow.last_seen = now
+        flow.packets += 1
+        flow.bytes += size
+        return flow
+
+    def reverse(self, flow):
+        """The record of the other direction of `flow`, if it is tracked (not counted as a hit)."""
+        return self._flows.get(reverse_flow_key(flow.key))
+
+    def _expire(self, now):
+        """Drop idle flows from the front, then make room for one more."""
+        flows = self._flows
+        deadline = now - self.idle_timeout
+        while flows:
+            oldest = next(iter(flows.values()))
+            if oldest.last_seen > deadline:
+                break
+            flows.popitem(last=False)
+            self.expired += 1
+        if len(flows) >= self.max_flows:
+            flows.popitem(last=False)
+            self.evicted += 1
+
+    def __len__(self):
+        return len(self._flows)
+
+    def get_stats(self):
+        """Get flow table statistics"""
+        return {
+            'flows': len(self._flows),
+            'lookups': self.lookups,
+            'created': self.created,
+            'expired': self.expired,
+            'evicted': self.evicted,
+        }
@@ -0,0 +1,269 @@
+# Lightweight HTTP/1.x request parser
+# Splits a request into the fields signatures can target (uri, header,
+# host, body), so a rule like "login.php" only scans the request URI
+# instead of every byte of every payload.
+
+import threading
+from collections import OrderedDict
+
+from flow_table import FlowRecord
+
+
+# ============================================================
+# Fields
+# ============================================================
+#   any     the whole payload (default, same as before)
+#   uri     request target of the request line   "/login.php?user=x"
+#   header  the raw header block (without the request line)
+#   host    value of the Host header
+#   body    everything after the blank line (and follow-up packets of
+#           the same request, up to Content-Length)
+#
+# Incremental parsing (when the caller passes a flow key):
+#   - a request head split over several packets is buffered (bounded by
+#     max_head) and parsed once the blank line arrives
+#   - packets that follow a head with a Content-Length are treated as
+#     body of that request
+# Flow state lives in the flow's FlowRecord when the caller passes one
+# (the IDS), otherwise in a bounded LRU table keyed by the flow key (test
+# bench, scan pool workers). Without a flow every payload is parsed on
+# its own.
+# ============================================================
+
+FIELDS = ("any", "uri", "header", "host", "body")
+HTTP_FIELDS = frozenset(FIELDS[1:])
+
+HTTP_METHODS = frozenset((
+    b"GET", b"POST", b"PUT", b"DELETE", b"HEAD", b"OPTIONS", b"PATCH", b"CONNECT", b"TRACE",
+))
+
+# headers pulled out into HttpRequest.headers (lowercase names)
+SELECTED_HEADERS = frozenset((
+    b"host", b"user-agent", b"content-type", b"content-length", b"cookie", b"referer",
+    b"transfer-encoding",
+))
+
+
+class HttpRequest:
+    """The parts of one HTTP request that signatures can target."""
+    __slots__ = ("method", "uri", "version", "header", "headers", "body")
+
+    def __init__(self, method=None, uri=None, version=None, header=None, headers=None, body=None):
+        self.method = method
+        self.uri = uri
+        self.version = version
+        self.header = header          # raw header block
+        self.headers = headers or {}  # selected headers, lowercase name -> value
+        self.body = body
+
+    @property
+    def host(self):
+        return self.headers.get(b"host")
+
+    def field(self, name):
+        """Bytes of field `name` (see FIELDS), None if this request doesn't have it."""
+        if name == "uri":
+            return self.uri
+        if name == "header":
+            return self.header
+        if name == "host":
+            return self.host
+        if name == "body":
+            return self.body
+        return None
+
+
+class _FlowState:
+    __slots__ = ("pending", "body_remaining")
+
+    def __init__(self):
+        self.pending = b""        # request head received so far
+        self.body_remaining = 0   # body bytes still expected (Content-Length)
+
+
+class HttpRequestParser:
+    """
+    Parses HTTP/1.x requests out of TCP payloads.
+    """
+    def __init__(self, max_flows=4096, max_head=8192):
+        """
+        Args:
+            max_flows: flows tracked at most for split heads / bodies (oldest evicted)
+            max_head: request head bytes buffered at most, longer heads are parsed as is
+        """
+        self.max_flows = max_flows
+        self.max_head = max_head
+        self._flows = OrderedDict()
+        self._lock = threading.Lock()
+
+        # Statistics
+        self.requests_parsed = 0
+        self.heads_buffered = 0       # packets held back waiting for the rest of a head
+        self.body_packets = 0         # follow-up packets treated as request body
+        self.not_http = 0
+
+    @staticmethod
+    def looks_like_request(payload):
+        """Cheap check: does the payload start with an HTTP method and a space."""
+        space = payload.find(b" ", 0, 8)
+        return space > 0 and payload[:space] in HTTP_METHODS
+
+    def parse(self, payload, flow=None):
+        """
+        Parse one payload.
+
+        Args:
+            payload: TCP payload bytes
+            flow: optional FlowRecord or hashable flow key (e.g. (src_ip, src_port,
+                  dst_ip, dst_port)), enables incremental parsing across packets
+
+        Returns:
+            HttpRequest, or None if the payload is not (yet) an HTTP request
+        """
+        if flow is None:
+            if not self.looks_like_request(payload):
+                self.not_http += 1
+                return None
+            request, _ = self._parse_head(payload, payload.find(b"\r\n\r\n"))
+            self.requests_parsed += 1
+            return request
+
+        with self._lock:
+            state = self._state(flow)
+
+            if state is not None and state.pending:
+                data = state.pending + payload
+            elif self.looks_like_request(payload):
+                data = payload
+            elif state is not None and state.body_remaining > 0:
+                # follow-up packet of a request body
+                state.body_remaining -= len(payload)
+                if state.body_remaining <= 0:
+                    self._forget(flow)
+                self.body_packets += 1
+                return HttpRequest(body=payload)
+            else:
+                self.not_http += 1
+                return None
+
+            head_end = data.find(b"\r\n\r\n")
+            if head_end == -1 and len(data) < self.max_head:
+                # head continues in the next packet
+                if state is None:
+                    state = self._track(flow)
+                state.pending = data
+                self.heads_buffered += 1
+                return None
+
+            request, body_remaining = self._parse_head(data, head_end)
+            self.requests_parsed += 1
+            if body_remaining > 0:
+                if state is None:
+                    state = self._track(flow)
+                state.pending = b""
+                state.body_remaining = body_remaining
+            elif state is not None:
+                self._forget(flow)
+            return request
+
+    def _state(self, flow):
+        """Current state of a flow, None if it has none."""
+        if isinstance(flow, FlowRecord):
+            return flow.http
+        state = self._flows.get(flow)
+        if state is not None:
+            self._flows.move_to_end(flow)
+        return state
+
+    def _track(self, flow):
+        """New flow state (evicting the least recently used keyed one when full)."""
+        state = _FlowState()
+        if isinstance(flow, FlowRecord):
+            flow.http = state
+            return state
+        if len(self._flows) >= self.max_flows:
+            self._flows.popitem(last=False)
+        self._flows[flow] = state
+        return state
+
+    def _forget(self, flow):
+        if isinstance(flow, FlowRecord):
+            flow.http = None
+        else:
+            del self._flows[flow]
+
+    @staticmethod
+    def _parse_head(data, head_end):
+        """
+        Split request line / headers / body.
+
+        Args:
+            data: request bytes starting at the method
+            head_end: offset of the blank line (b"\\r\\n\\r\\n"), -1 if not received
+
+        Returns:
+            (HttpRequest, body bytes still expected)
+        """
+        if head_end == -1:
+            head, body = data, b""
+        else:
+            head, body = data[:head_end], data[head_end + 4:]
+
+        line_end = head.find(b"\r\n")
+        if line_end == -1:
+            request_line, header = head, b""
+        else:
+            request_line, header = head[:line_end], head[line_end + 2:]
+
+        parts = request_line.split(b" ", 2)
+        method = parts[0]
+        uri = parts[1] if len(parts) > 1 else b""
+        version = parts[2] if len(parts) > 2 else None
+
+        headers = {}
+        if header:
+            for line in header.split(b"\r\n"):
+                name, sep, value = line.partition(b":")
+                if sep:
+                    name = name.strip().lower()
+                    if name in SELECTED_HEADERS:
+                        headers[name] = value.strip()
+
+        body_remaining = 0
+        length = headers.get(b"content-length")
+        if length and length.isdigit():
+            body_remaining = int(length) - len(body)
+
+        return HttpRequest(method, uri, version, header, headers, body), body_remaining
+
+    def get_stats(self):
+        """Get parser statistics"""
+        return {
+            'requests': self.requests_parsed,
+            'heads_buffered': self.heads_buffered,
+            'body_packets': self.body_packets,
+            'not_http': self.not_http,
+            'tracked_flows': len(self._flows),
+        }
+
+
+def request_fields(request, wanted, normalizer=None):
+    """
+    Buffers of the fields a ruleset uses, normalized like payloads.
+
+    Args:
+        request: HttpRequest or None
+        wanted: iterable of field names (from CompiledRuleset.fields)
+        normalizer: optional PayloadNormalizer
+
+    Returns:
+        dict: field -> bytes (fields the request doesn't have are left out)
+    """
+    fields = {}
+    if request is None:
+        return fields
+    for name in wanted:
+        value = request.field(name)
+        if value is not None:
+            fields[name] = normalizer.normalize(value) if normalizer else value
+    return fields
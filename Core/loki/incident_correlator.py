@@ -0,0 +1,250 @@
+# Incident correlation
+# Every alert key has its own lifecycle (logger.py), so a scan followed by
+# a flood from the same host, or one SYN flood from 500 sources, shows up
+# as many unrelated alerts. The correlator groups the alerts LokiLogger
+# emits into incidents, incrementally: each alert record is tagged with
+# the id of its incident, and snapshots of the incidents that changed are
+# handed out periodically (incident log + API).
+
+import threading
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+
+
+# ============================================================
+# Grouping
+# ============================================================
+# Entities are addresses in a role: ("attacker", src_ip) and
+# ("victim", dst_ip). An alert joins its attacker and its victim to the
+# same incident:
+#
+#   - neither is known          a new incident starts
+#   - one is known              the alert joins that incident
+#   - both, in two incidents    the incidents merge (union-find): the
+#                               younger one points to the older one,
+#                               which takes over its counters; the
+#                               younger one is reported once as MERGED
+#
+# So a host that scans then floods stays one incident (same attacker),
+# and 500 sources flooding one host are one incident (same victim).
+#
+# State is bounded: the entity table is an OrderedDict in least recently
+# seen order (like flow_table.py). An entity quiet for `window` seconds
+# leaves its incident, past `max_entities` the oldest one is evicted; an
+# incident left without entities is CLOSED. Incidents keep counters and
+# a sample of addresses, not every address.
+#
+# Alerts are raised by the agent threads and the main loop collects
+# snapshots, so one lock guards the state (only emitted alerts get here,
+# repeats are already folded by the aggregator).
+# ============================================================
+
+OPEN = "OPEN"
+CLOSED = "CLOSED"
+MERGED = "MERGED"
+
+SAMPLE_SIZE = 20
+
+
+class Incident:
+    """One attack campaign (a set of attackers and victims linked by alerts)."""
+    __slots__ = ("incident_id", "parent", "status", "first_seen", "last_seen", "alerts",
+                 "attackers", "victims", "attacker_sample", "victim_sample", "kinds", "entities")
+
+    def __init__(self, now):
+        self.incident_id = str(uuid.uuid4())
+        self.parent = None          # incident this one was merged into
+        self.status = OPEN
+        self.first_seen = now
+        self.last_seen = now
+        self.alerts = 0             # attacks (STARTED alerts) in the incident
+        self.attackers = 0          # addresses that joined as attacker / victim
+        self.victims = 0
+        self.attacker_sample = []
+        self.victim_sample = []
+        self.kinds = {}             # subtype (or alert type) -> attacks
+        self.entities = 0           # entities currently pointing here
+
+    def summary(self):
+        kinds = ", ".join(sorted(self.kinds, key=self.kinds.get, reverse=True)[:3]) or "alerts"
+        attackers = self.attacker_sample[0] if self.attackers == 1 else f"{self.attackers} attackers"
+        victims = self.victim_sample[0] if self.victims == 1 else f"{self.victims} hosts"
+        return f"{kinds} from {attackers} against {victims}"
+
+    def to_record(self):
+        """Incident record (JSON serializable)."""
+        return {
+            "incident_id": self.incident_id,
+            "status": self.status,
+            "merged_into": self.parent.incident_id if self.parent else None,
+            "first_seen": datetime.utcfromtimestamp(self.first_seen).isoformat(),
+            "last_seen": datetime.utcfromtimestamp(self.last_seen).isoformat(),
+            "alert_count": self.alerts,
+            "attackers": self.attackers,
+            "victims": self.victims,
+            "attacker_sample": list(self.attacker_sample),
+            "victim_sample": list(self.victim_sample),
+            "kinds": dict(self.kinds),
+            "summary": self.summary(),
+        }
+
+
+class IncidentCorrelator:
+    """
+    Groups alert records into incidents by shared attacker or victim.
+    """
+    def __init__(self, window=300, max_entities=50000):
+        """
+        Args:
+            window: seconds an address stays part of its incident after its last alert
+            max_entities: addresses tracked at most (least recently seen evicted)
+        """
+        self.window = window
+        self.max_entities = max_entities
+
+        self._entities = OrderedDict()  # (role, address) -> [incident, last seen]
+        self._dirty = {}                # incident id -> incident changed since the last collect()
+        self._lock = threading.Lock()
+
+        # Statistics
+        self.opened = 0
+        self.merged = 0
+        self.closed = 0
+        self.evicted = 0
+
+    @staticmethod
+    def _find(incident):
+        """Incident a (possibly merged) incident ended up in, with path compression."""
+        root = incident
+        while root.parent is not None:
+            root = root.parent
+        while incident.parent is not None and incident.parent is not root:
+            incident.parent, incident = root, incident.parent
+        return root
+
+    def observe(self, record, now):
+        """
+        Correlate one alert record.
+
+        Args:
+            record: alert record as emitted by LokiLogger (status STARTED / ONGOING / ENDED)
+            now: time.time() of the alert
+
+        Returns:
+            str: id of the record's incident
+        """
+        attacker = ("attacker", record.get("src_ip"))
+        victim = ("victim", record.get("dst_ip"))
+        with self._lock:
+            entities = self._entities
+            joined = [entities.get(attacker), entities.get(victim)]
+            incidents = [self._find(entry[0]) for entry in joined if entry is not None]
+
+            if not incidents:
+                incident = Incident(now)
+                self.opened += 1
+            else:
+                incident = min(incidents, key=lambda i: i.first_seen)
+                for other in incidents:
+                    if other is not incident:
+                        self._merge(other, incident)
+
+            for entity, entry, sample in ((attacker, joined[0], incident.attacker_sample),
+                                          (victim, joined[1], incident.victim_sample)):
+                if entity[1] is None:
+                    continue
+                if entry is None:
+                    self._join(entity, incident, now)
+                    if entity[0] == "attacker":
+                        incident.attackers += 1
+                    else:
+                        incident.victims += 1
+                    if len(sample) < SAMPLE_SIZE:
+                        sample.append(entity[1])
+                else:
+                    entry[0] = incident
+                    entry[1] = now
+                    entities.move_to_end(entity)
+            self._evict((attacker, victim))
+
+            if record.get("status") == "STARTED":
+                incident.alerts += 1
+                kind = record.get("subtype") or record.get("type")
+                incident.kinds[kind] = incident.kinds.get(kind, 0) + 1
+            incident.last_seen = max(incident.last_seen, now)
+            self._dirty[incident.incident_id] = incident
+            return incident.incident_id
+
+    def _join(self, entity, incident, now):
+        self._entities[entity] = [incident, now]
+        incident.entities += 1
+
+    def _evict(self, keep):
+        """Drop the least recently seen entities past max_entities (never those in `keep`, the current alert's)."""
+        entities = self._entities
+        while len(entities) > self.max_entities:
+            entity = next(iter(entities))
+            if entity in keep:
+                break  # only the current alert's entities are left
+            self.evicted += 1
+            self._leave(entity, entities.pop(entity))
+
+    def _leave(self, entity, entry):
+        incident = self._find(entry[0])
+        incident.entities -= 1
+        if incident.entities <= 0:
+            incident.status = CLOSED
+            self.closed += 1
+            self._dirty[incident.incident_id] = incident
+
+    def _merge(self, young, old):
+        """Fold `young` into `old` (both roots)."""
+        young.parent = old
+        young.status = MERGED
+        old.first_seen = min(old.first_seen, young.first_seen)
+        old.last_seen = max(old.last_seen, young.last_seen)
+        old.alerts += young.alerts
+        old.attackers += young.attackers
+        old.victims += young.victims
+        old.entities += young.entities
+        old.attacker_sample.extend(young.attacker_sample[:SAMPLE_SIZE - len(old.attacker_sample)])
+        old.victim_sample.extend(young.victim_sample[:SAMPLE_SIZE - len(old.victim_sample)])
+        for kind, count in young.kinds.items():
+            old.kinds[kind] = old.kinds.get(kind, 0) + count
+        self.merged += 1
+        self._dirty[young.incident_id] = young
+
+    def expire(self, now):
+        """Remove addresses quiet for `window` seconds (closing incidents left empty)."""
+        with self._lock:
+            entities = self._entities
+            while entities:
+                entity, entry = next(iter(entities.items()))
+                if now - entry[1] < self.window:
+                    break
+                del entities[entity]
+                self._leave(entity, entry)
+
+    def collect(self):
+        """
+        Snapshots of the incidents that changed since the last call (one
+        per incident, however often it changed).
+
+        Returns:
+            list of incident records
+        """
+        with self._lock:
+            dirty, self._dirty = self._dirty, {}
+            return [incident.to_record() for incident in dirty.values()]
+
+    def get_stats(self):
+        """Get incident correlation statistics"""
+        with self._lock:
+            return {
+                'entities': len(self._entities),
+                'opened': self.opened,
+                'merged': self.merged,
+                'closed': self.closed,
+                'evicted': self.evicted,
+            }
@@ -0,0 +1,283 @@
+# Inspection bypass policy
+# Some traffic isn't worth inspecting: backups between two known hosts,
+# encrypted streams no signature can read. The policy (inspection_policy.yaml)
+# says, per (source CIDR, destination CIDR, port, proto), whether a flow
+# gets the behavior detectors, the signature scan, both, or neither.
+
+import ipaddress
+import os
+
+import yaml
+
+from signature_engine import ANY, parse_ports, port_matches
+from packet_parser import IPV6_FLAG
+
+
+# ============================================================
+# Lookup
+# ============================================================
+# Rules are numbered in file order and the FIRST matching rule wins,
+# like a firewall. Each rule is one bit of an int:
+#
+#   src trie / dst trie   binary prefix tries (one per address family);
+#                         a node holds the bits of the rules whose CIDR
+#                         ends there, so walking an address ORs together
+#                         every rule whose prefix contains it
+#   ports / proto         bits of the rules each port / proto satisfies
+#
+#   matching = src bits & dst bits & port bits & proto bits
+#   winner   = lowest set bit
+#
+# Rules marked `both_directions` also cover the replies of the flows
+# they matched (the reply half of a backup stream): a new flow whose
+# other direction is tracked in the flow table with such a verdict
+# inherits it. Replies are never matched against the rules with source
+# and destination swapped, that would let any host pick the verdict of
+# its traffic through its source port.
+#
+# The verdict is kept in the flow's record (flow_table.py), so the
+# tries are walked once per flow, not once per packet.
+# ============================================================
+
+INSPECT_NONE = 0
+INSPECT_BEHAVIOR = 1
+INSPECT_SIGNATURES = 2
+INSPECT_ALL = INSPECT_BEHAVIOR | INSPECT_SIGNATURES
+
+INSPECT_MODES = {
+    "none": INSPECT_NONE,
+    "behavior": INSPECT_BEHAVIOR,
+    "signatures": INSPECT_SIGNATURES,
+    "all": INSPECT_ALL,
+}
+
+POLICY_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "inspection_policy.yaml")
+
+
+class PrefixTrie:
+    """Binary trie of CIDRs; lookup() ORs the values of every prefix containing an address."""
+    __slots__ = ("root", "depth")
+
+    def __init__(self):
+        self.root = [None, None, 0]   # child for bit 0, child for bit 1, rule bits
+        self.depth = 0                # longest prefix inserted
+
+    def insert(self, network, bits):
+        node = self.root
+        address = int(network.network_address)
+        width = network.max_prefixlen
+        for i in range(network.prefixlen):
+            bit = (address >> (width - 1 - i)) & 1
+            if node[bit] is None:
+                node[bit] = [None, None, 0]
+            node = node[bit]
+        node[2] |= bits
+        self.depth = max(self.depth, network.prefixlen)
+
+    def lookup(self, address, width):
+        node = self.root
+        bits = node[2]
+        for i in range(self.depth):
+            node = node[(address >> (width - 1 - i)) & 1]
+            if node is None:
+                break
+            bits |= node[2]
+        return bits
+
+
+class PolicyRule:
+    """One entry of inspection_policy.yaml."""
+    __slots__ = ("name", "src", "dst", "ports", "proto", "inspect", "both_directions")
+
+    def __init__(self, name, src, dst, ports, proto, inspect, both_directions):
+        self.name = name
+        self.src = src
+        self.dst = dst
+        self.ports = ports
+        self.proto = proto
+        self.inspect = inspect
+        self.both_directions = both_directions
+
+    @classmethod
+    def from_dict(cls, entry, index):
+        """
+        Build a rule from its YAML mapping.
+
+        Raises:
+            ValueError: bad CIDR, port spec or inspect mode
+        """
+        name = str(entry.get("name") or f"rule-{index + 1}")
+        try:
+            src = [ipaddress.ip_network(str(cidr), strict=False) for cidr in _as_list(entry.get("src", ANY))]
+            dst = [ipaddress.ip_network(str(cidr), strict=False) for cidr in _as_list(entry.get("dst", ANY))]
+            ports = parse_ports(str(entry.get("ports", ANY)))
+        except ValueError as e:
+            raise ValueError(f"inspection policy rule '{name}': {e}") from None
+
+        inspect = str(entry.get("inspect", "none")).lower()
+        if inspect not in INSPECT_MODES:
+            raise ValueError(f"inspection policy rule '{name}': inspect must be one of {', '.join(INSPECT_MODES)}")
+        proto = str(entry.get("proto", ANY)).lower()
+        return cls(name, src, dst, ports, proto, INSPECT_MODES[inspect], bool(entry.get("both_directions", False)))
+
+
+def _as_list(value):
+    """CIDR list of a src / dst value ("any" = every IPv4 and IPv6 address)."""
+    if value == ANY:
+        return ["0.0.0.0/0", "::/0"]
+    return value if isinstance(value, list) else [value]
+
+
+def load_policy(path=POLICY_FILE):
+    """
+    Read the inspection policy YAML file (key: rules).
+
+    Returns:
+        list of PolicyRule, empty if the file is missing
+    """
+    try:
+        with open(path) as f:
+            data = yaml.safe_load(f) or {}
+    except FileNotFoundError:
+        return []
+    return [PolicyRule.from_dict(entry, i) for i, entry in enumerate(data.get("rules") or [])]
+
+
+class InspectionPolicy:
+    """
+    Decides per flow which inspections run, and counts what was skipped.
+    """
+    def __init__(self, rules=None):
+        """
+        Args:
+            rules: PolicyRule list, first match wins (flows matching none are fully inspected)
+        """
+        self.rules = list(rules or ())
+        self._compile()
+
+        # Statistics
+        self.packets = 0
+        self.bytes = 0
+        self.flows_resolved = 0
+        self.behavior_bypassed = [0, 0]     # packets, bytes
+        self.signature_bypassed = [0, 0]
+        self.rule_hits = [[0, 0] for _ in self.rules]
+
+    @classmethod
+    def from_file(cls, path=POLICY_FILE):
+        """Build a policy from a YAML file."""
+        return cls(load_policy(path))
+
+    def _compile(self):
+        self._src = {4: PrefixTrie(), 6: PrefixTrie()}
+        self._dst = {4: PrefixTrie(), 6: PrefixTrie()}
+        self._any_port = 0
+        self._port_rules = []           # (bit, parsed port spec)
+        self._proto = {}                # proto -> bits of the rules restricted to it
+        self._any_proto = 0
+
+        for index, rule in enumerate(self.rules):
+            bit = 1 << index
+            for network in rule.src:
+                self._src[network.version].insert(network, bit)
+            for network in rule.dst:
+                self._dst[network.version].insert(network, bit)
+            if rule.ports is None:
+                self._any_port |= bit
+            else:
+                self._port_rules.append((bit, rule.ports))
+            if rule.proto == ANY:
+                self._any_proto |= bit
+            else:
+                self._proto[rule.proto] = self._proto.get(rule.proto, 0) | bit
+
+    def check(self, flow, size, flows=None):
+        """
+        Verdict for one packet, counting bypassed traffic.
+
+        Args:
+            flow: the packet's FlowRecord, the verdict is resolved on its first packet
+            size: packet length in bytes
+            flows: the FlowTable of `flow`, to find the flow a reply answers (both_directions rules)
+
+        Returns:
+            INSPECT_* bit flags
+        """
+        self.packets += 1
+        self.bytes += size
+        if not self.rules:
+            return INSPECT_ALL
+
+        if flow.policy is None:
+            flow.policy = self._reply_policy(flow, flows) or \
+                self._resolve(flow.src_addr, flow.src_port, flow.dst_addr, flow.dst_port, flow.proto)
+        inspect, rule_index = flow.policy
+        if rule_index is not None:
+            hits = self.rule_hits[rule_index]
+            hits[0] += 1
+            hits[1] += size
+            if not inspect & INSPECT_BEHAVIOR:
+                self.behavior_bypassed[0] += 1
+                self.behavior_bypassed[1] += size
+            if not inspect & INSPECT_SIGNATURES:
+                self.signature_bypassed[0] += 1
+                self.signature_bypassed[1] += size
+        return inspect
+
+    def _reply_policy(self, flow, flows):
+        """Verdict of the flow `flow` replies to, if a both_directions rule matched it."""
+        if flows is None:
+            return None
+        forward = flows.reverse(flow)
+        if forward is None or forward.policy is None:
+            return None
+        rule_index = forward.policy[1]
+        if rule_index is None or not self.rules[rule_index].both_directions:
+            return None
+        return forward.policy
+
+    def _resolve(self, src_addr, src_port, dst_addr, dst_port, proto):
+        """(inspect flags, index of the winning rule or None) for a new flow (address ints)."""
+        self.flows_resolved += 1
+        candidates = self._any_proto | self._proto.get(proto, 0)
+        matching = candidates & self._match(src_addr, dst_addr, dst_port)
+        if not matching:
+            return INSPECT_ALL, None
+        index = (matching & -matching).bit_length() - 1
+        return self.rules[index].inspect, index
+
+    def _match(self, src, dst, port):
+        bits = self._lookup(self._src, src)
+        if not bits:
+            return 0
+        bits &= self._lookup(self._dst, dst)
+        if not bits:
+            return 0
+        port_bits = self._any_port
+        for bit, ports in self._port_rules:
+            if bits & bit and port_matches(ports, port):
+                port_bits |= bit
+        return bits & port_bits
+
+    @staticmethod
+    def _lookup(tries, addr):
+        if addr & IPV6_FLAG:
+            return tries[6].lookup(addr ^ IPV6_FLAG, 128)
+        return tries[4].lookup(addr, 32)
+
+    def get_stats(self):
+        """Get policy statistics"""
+        return {
+            'rules': len(self.rules),
+            'packets': self.packets,
+            'bytes': self.bytes,
+            'flows_resolved': self.flows_resolved,
+            'behavior_bypassed_packets': self.behavior_bypassed[0],
+            'behavior_bypassed_bytes': self.behavior_bypassed[1],
+            'signature_bypassed_packets': self.signature_bypassed[0],
+            'signature_bypassed_bytes': self.signature_bypassed[1],
+            'rule_hits': {
+                rule.name: {'packets': hits[0], 'bytes': hits[1]}
+                for rule, hits in zip(self.rules, self.rule_hits)
+            },
+        }
@@ -0,0 +1,270 @@
+# Buffered, rotating JSONL writer
+# The alert log (logs/loki_alerts.jsonl) used to be opened, appended to
+# and closed for every record, and grew forever. Records now go through
+# a queue to a writer thread that keeps the file open and writes them in
+# bulk, rotates the file by size / age and compresses rolled segments in
+# the background.
+
+import gzip
+import json
+import os
+import re
+import shutil
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+
+# ============================================================
+# Writing, rotation, retention
+# ============================================================
+#   write()        appends the record to a bounded queue, no syscall; past
+#                  `max_queued` records the OLDEST are dropped (and counted)
+#   writer thread  wakes every `flush_interval` seconds, or as soon as
+#                  `flush_records` records are queued, and writes them
+#                  with ONE write() (plus an fsync every `fsync_interval`
+#                  seconds; None leaves it to the OS, like before)
+#   rotation       once the file reaches `max_bytes`, or was opened
+#                  `max_age` seconds ago, it is renamed to
+#                  <name>.<YYYYmmdd-HHMMSS>.jsonl and a new file started;
+#                  the rolled segment is compressed (.gz, or .zst with the
+#                  optional `zstandard` package) by a background worker
+#   retention      only the newest `keep` rolled segments are kept
+# ============================================================
+
+COMPRESSIONS = ("gzip", "zstd", None)
+
+
+class JsonlWriter:
+    """
+    JSON-lines file written from its own thread, with rotation.
+    """
+    def __init__(self, path, max_bytes=16 << 20, max_age=24 * 3600, keep=10, compression="gzip",
+                 flush_interval=1.0, flush_records=1000, fsync_interval=None, max_queued=100000):
+        """
+        Args:
+            path: the live file (rolled segments go next to it)
+            max_bytes: size at which the file is rotated
+            max_age: seconds after which the file is rotated (None = size only)
+            keep: rolled segments kept at most (oldest deleted)
+            compression: "gzip", "zstd" (falls back to gzip without zstandard) or None
+            flush_interval: seconds a record waits at most before it is written
+            flush_records: queued records that trigger a write right away
+            fsync_interval: seconds between fsyncs (0 = every write, None = never)
+            max_queued: records kept while the disk is behind (oldest dropped)
+        """
+        if compression not in COMPRESSIONS:
+            raise ValueError(f"compression must be one of {', '.join(map(str, COMPRESSIONS))}")
+        if compression == "zstd" and not ZSTD_AVAILABLE:
+            print("[!] zstandard not installed, rolled alert logs are gzipped")
+            compression = "gzip"
+
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.keep = keep
+        self.compression = compression
+        self.flush_interval = flush_interval
+        self.flush_records = flush_records
+        self.fsync_interval = fsync_interval
+        self.max_queued = max_queued
+
+        directory, name = os.path.split(path)
+        stem = name[:-len(".jsonl")] if name.endswith(".jsonl") else name
+        self._rolled = re.compile(rf"^{re.escape(stem)}\.(\d{{8}}-\d{{6}})(?:-(\d+))?\.jsonl(?:\.gz|\.zst)?$")
+        self._directory = directory or "."
+        self._stem = stem
+
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopping = False
+        self._file = None
+        self._size = 0
+        self._opened_at = 0.0
+        self._synced_at = 0.0
+        self._executor = None
+
+        # Statistics
+        self.records_written = 0
+        self.bytes_written = 0
+        self.writes = 0
+        self.fsyncs = 0
+        self.rotations = 0
+        self.compressed = 0
+        self.dropped = 0
+        self.errors = 0
+
+    def write(self, record):
+        """Queue a record (a JSON-serializable dict) for the file."""
+        with self._cond:
+            if self._thread is None:
+                self._stopping = False
+                self._thread = threading.Thread(target=self._run, daemon=True, name="alert-log-writer")
+                self._thread.start()
+            if len(self._queue) >= self.max_queued:
+                self._queue.popleft()
+                self.dropped += 1
+            self._queue.append(record)
+            if len(self._queue) >= self.flush_records:
+                self._cond.notify()
+
+    def _run(self):
+        """Write queued records until close()."""
+        while True:
+            with self._cond:
+                if len(self._queue) < self.flush_records and not self._stopping:
+                    self._cond.wait(self.flush_interval)
+                records = list(self._queue)
+                self._queue.clear()
+                stopping = self._stopping
+
+            if records:
+                self._write(records)
+            if self._file is not None and self.max_age is not None and self._size \
+                    and time.time() - self._opened_at >= self.max_age:
+                self._rotate()
+            if stopping:
+                return
+
+    def _write(self, records):
+        lines = []
+        for record in records:
+            try:
+                lines.append(json.dumps(record) + "\n")
+            except (TypeError, ValueError) as e:
+                self.errors += 1
+                print(f"[!] Alert log record can't be serialized: {e}")
+        data = "".join(lines).encode("utf-8")
+
+        try:
+            if self._file is None:
+                self._open()
+            self._file.write(data)
+            self._file.flush()
+        except OSError as e:
+            self.errors += 1
+            print(f"[!] Failed to write to log file: {e}")
+            return
+        self.writes += 1
+        self.records_written += len(lines)
+        self.bytes_written += len(data)
+        self._size += len(data)
+
+        if self.fsync_interval is not None and time.monotonic() - self._synced_at >= self.fsync_interval:
+            self._synced_at = time.monotonic()
+            try:
+                os.fsync(self._file.fileno())
+                self.fsyncs += 1
+            except OSError as e:
+                self.errors += 1
+                print(f"[!] Failed to fsync the log file: {e}")
+        if self._size >= self.max_bytes:
+            self._rotate()
+
+    def _open(self):
+        os.makedirs(self._directory, exist_ok=True)
+        self._file = open(self.path, "ab")
+        self._size = self._file.tell()
+        self._opened_at = time.time()
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="alert-log-compress")
+        self._executor.submit(self._prune)  # segments a previous run left over the limit
+
+    def _rotate(self):
+        """Roll the live file and hand it to the background worker."""
+        self._file.close()
+        self._file = None
+        stamp = os.path.join(self._directory, f"{self._stem}.{datetime.now():%Y%m%d-%H%M%S}")
+        rolled, n = stamp + ".jsonl", 0
+        while any(os.path.exists(rolled + ext) for ext in ("", ".gz", ".zst")):
+            n += 1  # rotated twice within a second
+            rolled = f"{stamp}-{n}.jsonl"
+        try:
+            os.replace(self.path, rolled)
+        except OSError as e:
+            self.errors += 1
+            print(f"[!] Failed to rotate the log file: {e}")
+            return
+        self.rotations += 1
+        self._executor.submit(self._compress_and_prune, rolled)
+
+    def _compress_and_prune(self, rolled):
+        """Compress a rolled segment (background worker), then apply retention."""
+        if self.compression is not None:
+            target = rolled + (".gz" if self.compression == "gzip" else ".zst")
+            try:
+                with open(rolled, "rb") as src, open(target + ".tmp", "wb") as raw:
+                    if self.compression == "gzip":
+                        with gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=6) as dst:
+                            shutil.copyfileobj(src, dst, 1 << 20)
+                    else:
+                        zstandard.ZstdCompressor().copy_stream(src, raw)
+                os.replace(target + ".tmp", target)
+                os.unlink(rolled)
+                self.compressed += 1
+            except OSError as e:
+                self.errors += 1
+                print(f"[!] Failed to compress {rolled}: {e}")
+        self._prune()
+
+    def _prune(self):
+        """Delete the oldest rolled segments past `keep`."""
+        try:
+            rolled = []
+            for name in os.listdir(self._directory):
+                match = self._rolled.match(name)
+                if match:
+                    rolled.append((match.group(1), int(match.group(2) or 0), name))
+            rolled.sort()
+            for _, _, name in rolled[:max(0, len(rolled) - self.keep)]:
+                os.unlink(os.path.join(self._directory, name))
+        except OSError as e:
+            self.errors += 1
+            print(f"[!] Failed to prune rolled log files: {e}")
+
+    def close(self, timeout=5.0):
+        """Write what is queued, fsync and close the file (a later write() starts over)."""
+        with self._cond:
+            thread = self._thread
+            if thread is None:
+                return
+            self._stopping = True
+            self._cond.notify()
+        thread.join(timeout)
+        with self._cond:
+            self._thread = None
+        if self._file is not None:
+            try:
+                os.fsync(self._file.fileno())
+            except OSError as e:
+                self.errors += 1
+                print(f"[!] Failed to fsync the log file: {e}")
+            self._file.close()
+            self._file = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def get_stats(self):
+        """Get alert log writer statistics"""
+        return {
+            'queued': len(self._queue),
+            'records_written': self.records_written,
+            'bytes_written': self.bytes_written,
+            'writes': self.writes,
+            'fsyncs': self.fsyncs,
+            'rotations': self.rotations,
+            'compressed': self.compressed,
+            'dropped': self.dropped,
+            'errors': self.errors,
+            'file_bytes': self._size,
+        }
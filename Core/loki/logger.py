@@ -1,13 +1,17 @@
-import json
 import logging
 import os
 import time
+import uuid
 from datetime import datetime
 from collections import defaultdict
 from enum import Enum
 
+from alert_aggregator import ONGOING, STARTED, AlertAggregator, alert_key
 # Import database integration
 from db_integration import db_integration
+from incident_correlator import IncidentCorrelator
+from jsonl_writer import JsonlWriter
+from packet_parser import ip_to_str
 
 
 class AlertType(str, Enum):
@@ -23,6 +27,16 @@ class AlertSubtype(str, Enum):
     TCP_FLOOD = "TCP_FLOOD"
     UDP_FLOOD = "UDP_FLOOD"
     ICMP_FLOOD = "ICMP_FLOOD"
+    PAYLOAD_ANOMALY = "PAYLOAD_ANOMALY"
+    DNS_TUNNELING = "DNS_TUNNELING"
+    DNS_SUBDOMAIN_FLOOD = "DNS_SUBDOMAIN_FLOOD"
+    DNS_NXDOMAIN_FLOOD = "DNS_NXDOMAIN_FLOOD"
+
+# How the API stores an attack's records: "record" (one row per STARTED /
+# ONGOING / ENDED record) or "attack" (records carry the attack's id and
+# update one row in place)
+ALERT_STORAGES = ("record", "attack")
+
 
 class LokiLogger:
     """
@@ -36,7 +50,6 @@ class LokiLogger:
         self.log_dir = os.path.join(project_root, log_dir)
         
         self.filename = filename
-        self.filepath = os.path.join(self.log_dir, self.filename)
         
         # Ensure log directory exists
         if not os.path.exists(self.log_dir):
@@ -45,6 +58,11 @@ class LokiLogger:
             except Exception as e:
                 print(f"[!] couldn't create the log directory: {e}")
                 self.log_dir = current_dir # I will just work on the current directory.
+
+        # Alert log, written in bulk by its own thread (rotated, rolled segments compressed)
+        self.filepath = os.path.join(self.log_dir, self.filename)
+        self.writer = JsonlWriter(self.filepath)
+        self.incident_writer = JsonlWriter(os.path.join(self.log_dir, "loki_incidents.jsonl"))
         
         # Setup Python's built-in logging for console output
         self.console_logger = logging.getLogger("LokiIDS")
@@ -58,31 +76,46 @@ class LokiLogger:
             self.console_logger.addHandler(ch)
         
         # ===== NEW: Alert Aggregation =====
-        # Track active alerts to prevent flooding
-        self.active_alerts = {}  # Key: (type, src, dst, port) -> Alert state
-        
-        # Configuration
-        self.alert_cooldown = 10      # Seconds - attack considered "ended" after this
-        self.update_interval = 5      # Seconds - log updates during ongoing attacks
-        self.max_updates = 3          # Max number of "ONGOING" logs per attack
-        
-        # Statistics
-        self.suppressed_count = 0     # How many duplicate alerts we prevented
+        # Track active alerts to prevent flooding (shared by the agent threads, see alert_aggregator.py)
+        # Configuration: aggregator.cooldown (seconds - attack considered "ended" after this),
+        # aggregator.update_interval (seconds between "ONGOING" logs), aggregator.max_updates
+        self.aggregator = AlertAggregator(cooldown=10, update_interval=5, max_updates=3)
+        self.alert_storage = "record"
+
+        # Alerts sharing an attacker or a victim are grouped into incidents (see incident_correlator.py)
+        self.correlator = IncidentCorrelator(window=300)
     
+    def set_alert_storage(self, storage):
+        """
+        Choose how the API stores the records of one attack.
+
+        Args:
+            storage: "record" (a row per record) or "attack" (one row per attack, updated in place)
+
+        Raises:
+            ValueError: unknown storage
+        """
+        if storage not in ALERT_STORAGES:
+            raise ValueError(f"alert storage must be one of {', '.join(ALERT_STORAGES)}")
+        self.alert_storage = storage
+
     def log_alert(self, alert_type, src_ip, dst_ip, src_port, dst_port, message, details=None, subtype=None, pattern=None):
         """
         Logs an alert with smart deduplication.
         
         Args:
             alert_type (AlertType or str): "SIGNATURE", "BEHAVIOR", or "SYSTEM".
-            src_ip (str): The attacker's IP address.
-            dst_ip (str): The victim's IP address.
+            src_ip (str or int): The attacker's IP address (address ints are formatted only when logged).
+            dst_ip (str or int): The victim's IP address.
             src_port (int): Source port.
             dst_port (int): Destination port.
             message (str): A human-readable description (e.g., "Port Scan Detected").
             details (dict, optional): Extra data (e.g., ports scanned, payload snippet).
             subtype (AlertSubtype or str, optional): Sub-category of alert (e.g., "PORT_SCAN", "TCP_FLOOD", "UDP_FLOOD", "ICMP_FLOOD").
             pattern (str, optional): Pattern for SIGNATURE alerts (e.g., "UNION SELECT", "<script>").
+
+        Returns:
+            AlertKey: the alert's deduplication key (the same for every repeat of this attack)
         """
         # Convert enum to string if needed
         if isinstance(alert_type, AlertType):
@@ -93,184 +126,109 @@ class LokiLogger:
         # Extract pattern from details if not provided and it's a SIGNATURE alert
         if pattern is None and alert_type == "SIGNATURE" and details and "pattern" in details:
             pattern = details.get("pattern")
-        # Create unique key for this type of alert
-        # For port scans: group by (type, src_ip, dst_ip)
-        # For floods: group by (type, src_ip, dst_ip, dst_port)
-        if "Port Scan" in message or "Scan" in message:
-            alert_key = (alert_type, message, src_ip, dst_ip, "scan")
-        else:
-            alert_key = (alert_type, message, src_ip, dst_ip, dst_port)
-        
-        current_time = time.time()
+        # Port scans are grouped by (type, src_ip, dst_ip), everything else by (type, src_ip, dst_ip, dst_port)
+        key = alert_key(alert_type, subtype, message, src_ip, dst_ip, dst_port)
         
-        # Check if this is a new or ongoing alert
-        if alert_key not in self.active_alerts:
+        status, alert_state = self.aggregator.hit(key, time.time(), src_port, dst_port, details, subtype, pattern)
+        if status == STARTED:
             # NEW ALERT - Log it!
-            self._log_new_alert(alert_key, alert_type, src_ip, dst_ip, src_port, 
-                              dst_port, message, details, current_time, subtype, pattern)
-        else:
-            # ONGOING ALERT - Handle smartly
-            self._handle_ongoing_alert(alert_key, alert_type, src_ip, dst_ip, 
-                                       src_port, dst_port, message, details, current_time, subtype, pattern)
+            self._log_new_alert(key, src_port, dst_port, alert_state)
+        elif status == ONGOING:
+            # ONGOING ALERT - periodic update
+            self._log_ongoing_update(key, src_port, dst_port, alert_state)
+        elif alert_state['packet_count'] % 100 == 0:
+            # Suppressed duplicate, mention it on the console every N packets
+            self.console_logger.debug(
+                f"[{alert_type}] {ip_to_str(src_ip)} → {ip_to_str(dst_ip)}:{dst_port} - "
+                f"{message} ({alert_state['packet_count']} packets)"
+            )
+        return key
     
-    def _log_new_alert(self, alert_key, alert_type, src_ip, dst_ip, src_port, 
-                       dst_port, message, details, timestamp, subtype=None, pattern=None):
+    def _log_new_alert(self, key, src_port, dst_port, alert_state):
         """Log the FIRST occurrence of an alert"""
+        src_ip, dst_ip = ip_to_str(key.src_ip), ip_to_str(key.dst_ip)
         
         # Console Output - Emphasized for new attack
-        subtype_str = f" [{subtype}]" if subtype else ""
-        pattern_str = f" [Pattern: {pattern}]" if pattern else ""
+        subtype_str = f" [{key.subtype}]" if key.subtype else ""
+        pattern_str = f" [Pattern: {alert_state['pattern']}]" if alert_state['pattern'] else ""
         self.console_logger.warning(
-            f"[NEW] [{alert_type}]{subtype_str}{pattern_str} {src_ip}:{src_port} → {dst_ip}:{dst_port} - {message}"
+            f"[NEW] [{key.type}]{subtype_str}{pattern_str} {src_ip}:{src_port} → {dst_ip}:{dst_port} - {key.message}"
         )
         
         # File Output
         record = {
             "timestamp": datetime.utcnow().isoformat(),
             "status": "STARTED",  # NEW field to track lifecycle
-            "type": alert_type,
-            "subtype": subtype,  # Sub-category of alert (for BEHAVIOR)
-            "pattern": pattern,  # Pattern for SIGNATURE alerts
+            "type": key.type,
+            "subtype": key.subtype,  # Sub-category of alert (for BEHAVIOR)
+            "pattern": alert_state['pattern'],  # Pattern for SIGNATURE alerts
             "src_ip": src_ip,
             "src_port": src_port,
             "dst_ip": dst_ip,
             "dst_port": dst_port,
-            "message": message,
-            "details": details or {}
-        }
-        
-        self._write_to_file(record)
-        
-        # Send to Web Interface API if integration is enabled
-        if db_integration.enabled:
-            db_integration.insert_alert(record)
-        
-        # Track this alert
-        self.active_alerts[alert_key] = {
-            'first_seen': timestamp,
-            'last_seen': timestamp,
-            'last_logged': timestamp,
-            'packet_count': 1,
-            'update_count': 0,
-            'src_port': src_port,
-            'dst_port': dst_port,
-            'subtype': subtype,
-            'pattern': pattern,
-            'details': details or {}
+            "message": key.message,
+            "details": alert_state['details']
         }
-    
-    def _handle_ongoing_alert(self, alert_key, alert_type, src_ip, dst_ip, 
-                             src_port, dst_port, message, details, timestamp, subtype=None, pattern=None):
-        """Handle repeated alerts (ongoing attack)"""
-        
-        alert_state = self.active_alerts[alert_key]
         
-        # Update state
-        alert_state['last_seen'] = timestamp
-        alert_state['packet_count'] += 1
-        
-        # Merge new details with existing
-        if details:
-            alert_state['details'].update(details)
-        
-        # Store subtype if not already set
-        if subtype and 'subtype' not in alert_state:
-            alert_state['subtype'] = subtype
-        
-        # Store pattern if not already set
-        if pattern and 'pattern' not in alert_state:
-            alert_state['pattern'] = pattern
-        
-        # Check if we should log an update
-        time_since_last_log = timestamp - alert_state['last_logged']
-        
-        if (time_since_last_log >= self.update_interval and 
-            alert_state['update_count'] < self.max_updates):
-            # Log an ONGOING update
-            self._log_ongoing_update(alert_key, alert_type, src_ip, dst_ip, 
-                                    src_port, dst_port, message, timestamp, alert_state)
-        else:
-            # Suppress this duplicate alert
-            self.suppressed_count += 1
-            # Optionally log to console every N packets
-            if alert_state['packet_count'] % 100 == 0:
-                self.console_logger.debug(
-                    f"[{alert_type}] {src_ip} → {dst_ip}:{dst_port} - "
-                    f"{message} ({alert_state['packet_count']} packets)"
-                )
+        self._emit(record, alert_state['attack_id'])
     
-    def _log_ongoing_update(self, alert_key, alert_type, src_ip, dst_ip, 
-                           src_port, dst_port, message, timestamp, alert_state):
+    def _log_ongoing_update(self, key, src_port, dst_port, alert_state):
         """Log periodic updates during ongoing attack"""
+        src_ip, dst_ip = ip_to_str(key.src_ip), ip_to_str(key.dst_ip)
         
-        duration = timestamp - alert_state['first_seen']
+        duration = alert_state['last_seen'] - alert_state['first_seen']
         
         # Console Output
         self.console_logger.warning(
-            f"[ONGOING] [{alert_type}] {src_ip}:{src_port} → {dst_ip}:{dst_port} - "
-            f"{message} ({alert_state['packet_count']} packets, {duration:.1f}s)"
+            f"[ONGOING] [{key.type}] {src_ip}:{src_port} → {dst_ip}:{dst_port} - "
+            f"{key.message} ({alert_state['packet_count']} packets, {duration:.1f}s)"
         )
         
         # File Output
         record = {
             "timestamp": datetime.utcnow().isoformat(),
             "status": "ONGOING",
-            "type": alert_type,
+            "type": key.type,
             "subtype": alert_state.get('subtype'),
             "pattern": alert_state.get('pattern'),
             "src_ip": src_ip,
             "src_port": src_port,
             "dst_ip": dst_ip,
             "dst_port": dst_port,
-            "message": message,
+            "message": key.message,
             "duration_seconds": round(duration, 2),
             "packet_count": alert_state['packet_count'],
             "attack_rate_pps": round(alert_state['packet_count'] / duration, 1) if duration > 0 else 0,
             "details": alert_state['details']
         }
         
-        self._write_to_file(record)
-        
-        # Send to Web Interface API if integration is enabled
-        if db_integration.enabled:
-            db_integration.insert_alert(record)
-        
-        # Update tracking
-        alert_state['last_logged'] = timestamp
-        alert_state['update_count'] += 1
+        self._emit(record, alert_state['attack_id'])
     
     def check_ended_alerts(self):
         """
         Check for attacks that have ended.
         Call this periodically (e.g., every 1-2 seconds) from your main IDS loop.
+        Only the alerts whose expiry is due are looked at.
+
+        Returns:
+            int: number of alerts ended
         """
         current_time = time.time()
-        ended_alerts = []
-        
-        for alert_key, alert_state in self.active_alerts.items():
-            # Check if attack has been inactive for cooldown period
-            time_since_last = current_time - alert_state['last_seen']
-            
-            if time_since_last >= self.alert_cooldown:
-                self._log_ended_alert(alert_key, alert_state, current_time)
-                ended_alerts.append(alert_key)
-        
-        # Remove ended alerts
-        for key in ended_alerts:
-            del self.active_alerts[key]
-        
-        return len(ended_alerts)
+        ended = self.aggregator.expire(current_time)
+        for key, alert_state in ended:
+            self._log_ended_alert(key, alert_state, current_time)
+        return len(ended)
     
-    def _log_ended_alert(self, alert_key, alert_state, timestamp):
+    def _log_ended_alert(self, key, alert_state, timestamp):
         """Log when an attack ends"""
         
-        alert_type, message, src_ip, dst_ip, dst_port_or_scan = alert_key
+        src_ip, dst_ip = ip_to_str(key.src_ip), ip_to_str(key.dst_ip)
         
         total_duration = alert_state['last_seen'] - alert_state['first_seen']
         
         # Console Output
         self.console_logger.info(
-            f"ENDED] [{alert_type}] {src_ip} → {dst_ip} - {message} "
+            f"ENDED] [{key.type}] {src_ip} → {dst_ip} - {key.message} "
             f"(Total: {alert_state['packet_count']} packets, {total_duration:.1f}s)"
         )
         
@@ -278,14 +236,14 @@ class LokiLogger:
         record = {
             "timestamp": datetime.utcnow().isoformat(),
             "status": "ENDED",
-            "type": alert_type,
+            "type": key.type,
             "subtype": alert_state.get('subtype'),
             "pattern": alert_state.get('pattern'),
             "src_ip": src_ip,
             "dst_ip": dst_ip,
             "src_port": alert_state.get('src_port', 0),
             "dst_port": alert_state.get('dst_port', 0),
-            "message": message,
+            "message": key.message,
             "total_duration_seconds": round(total_duration, 2),
             "total_packets": alert_state['packet_count'],
             "average_rate_pps": round(alert_state['packet_count'] / total_duration, 1) if total_duration > 0 else 0,
@@ -294,26 +252,54 @@ class LokiLogger:
             "details": alert_state['details']
         }
         
-        self._write_to_file(record)
-        
-        # Send to Web Interface API if integration is enabled
-        if db_integration.enabled:
-            db_integration.insert_alert(record)
+        self._emit(record, alert_state['attack_id'])
     
+    def _emit(self, record, attack_id=None):
+        """
+        Write a record to the log file and queue it for the Web Interface API
+        (shipped in batches, spooled to disk while the API is down).
+        The uuid lets the API store it once however often it is sent;
+        alerts are tagged with the incident they belong to, and with
+        their attack's id in "attack" storage.
+        """
+        record["uuid"] = str(uuid.uuid4())
+        if attack_id is not None and self.alert_storage == "attack":
+            record["attack_id"] = attack_id
+        if record["type"] != "SYSTEM":
+            record["incident_id"] = self.correlator.observe(record, time.time())
+        self._write_to_file(record)
+        db_integration.insert_alert(record)
+
     def _write_to_file(self, record):
-        """Write JSON record to log file"""
-        try:
-            with open(self.filepath, 'a') as f:
-                f.write(json.dumps(record) + "\n")
-        except Exception as e:
-            self.console_logger.error(f"Failed to write to log file: {e}")
+        """Queue JSON record for the log file (written and rotated by the writer thread)"""
+        self.writer.write(record)
+
+    def flush_incidents(self):
+        """
+        Close the incidents gone quiet and write the incidents that changed
+        to the incident log. Call this periodically from the main IDS loop.
+
+        Returns:
+            list: the incident records (for the Web Interface API)
+        """
+        self.correlator.expire(time.time())
+        incidents = self.correlator.collect()
+        for incident in incidents:
+            self.incident_writer.write(incident)
+        return incidents
+
+    def close(self):
+        """Write out the queued records and close the log files"""
+        self.writer.close()
+        self.incident_writer.close()
     
     def get_stats(self):
         """Get logging statistics"""
+        active, suppressed = len(self.aggregator), self.aggregator.suppressed
         return {
-            'active_alerts': len(self.active_alerts),
-            'suppressed_alerts': self.suppressed_count,
-            'suppression_rate': f"{(self.suppressed_count / max(1, self.suppressed_count + len(self.active_alerts))) * 100:.1f}%"
+            'active_alerts': active,
+            'suppressed_alerts': suppressed,
+            'suppression_rate': f"{(suppressed / max(1, suppressed + active)) * 100:.1f}%"
         }
     
     def log_system_event(self, message, level="INFO"):
@@ -341,11 +327,7 @@ class LokiLogger:
             "details": {"level": level}
         }
         
-        self._write_to_file(record)
-        
-        # Send to Web Interface API if integration is enabled
-        if db_integration.enabled:
-            db_integration.insert_alert(record)
+        self._emit(record)
 
 # Create a singleton instance for easy import
 logger = LokiLogger()
\ No newline at end of file
@@ -1,39 +1,150 @@
 from netfilterqueue import NetfilterQueue
 import threading
 import time
-from packet_parser import scan_packet
+from packet_parser import parse_packet, ICMP_ECHO_REQUEST
+from flow_table import FlowTable
+from packet_parser import ip_from_str, ip_to_str
 from detectore_engine import PortScanningDetector
+from payload_anomaly import PayloadAnomalyDetector
+from dns_detector import DnsDetector, DNS_PORT
+from tls_fingerprint import TlsFingerprinter
+from inspection_policy import InspectionPolicy, INSPECT_ALL, INSPECT_NONE, INSPECT_BEHAVIOR, INSPECT_SIGNATURES
 from signature_engine import SignatureScanning
-from scapy.all import IP, Raw, ICMP
+from payload_normalizer import PayloadNormalizer
+from ruleset_cache import RulesetCache
+from scan_pool import ScanPool
 from logger import logger, AlertType, AlertSubtype  # my logger module
 from db_integration import db_integration
 
-
-def process_packet(packet, IsInput, port_scanner, sig_scanner):
+# Signature matching worker processes (0 = match inline in the NFQUEUE threads)
+SIGNATURE_WORKERS = 0
+
+# How alerts reach the API: "http" (POST /alerts/bulk over keep-alive connections) or "unix"
+# (binary frames on the API's local socket; not faster so far, see benchmark.py alert_transport)
+ALERT_TRANSPORT = "http"
+
+# How the API stores an attack: "attack" (one row, updated as it goes on) or "record" (a row per record)
+ALERT_STORAGE = "attack"
+
+# Scan / flood state is kept per network of this size (IPv6 hosts rotate addresses within their /64)
+IPV4_AGGREGATE_PREFIX = 32
+IPV6_AGGREGATE_PREFIX = 64
+
+LOOPBACK = (ip_from_str("127.0.0.1"), ip_from_str("::1"))
+
+
+def log_signature_alert(context, result):
+    """Raise the alert for a signature match (inline or from the scan pool), returns its key."""
+    src_ip, dst_ip, src_port, dst_port, chain_name = context
+    RuleName, RulePattern, Drop = result
+    return logger.log_alert(
+        alert_type=AlertType.SIGNATURE,
+        src_ip=src_ip,
+        dst_ip= dst_ip,
+        src_port= src_port,
+        dst_port= dst_port,
+        message=f"Signature Match: {RuleName}",
+        details={
+            "pattern": str(RulePattern),
+            "action": "ALERT",
+            "chain": chain_name
+        },
+        subtype=None,  # Signatures don't have subtypes
+        pattern=str(RulePattern)  # Store pattern for filtering
+    )
+
+
+def log_tls_match(context, hello, match):
+    """Raise the alert for a ClientHello on the TLS blocklist (SNI or JA3)."""
+    src_ip, dst_ip, src_port, dst_port, chain_name = context
+    kind, value = match
+    pattern = f"{kind}:{value}"
+    return logger.log_alert(
+        alert_type=AlertType.SIGNATURE,
+        src_ip=src_ip,
+        dst_ip=dst_ip,
+        src_port=src_port,
+        dst_port=dst_port,
+        message=f"TLS Blocklist Match: {kind.upper()} {value}",
+        details={**hello.to_dict(), "pattern": pattern, "action": "ALERT", "chain": chain_name},
+        subtype=None,
+        pattern=pattern
+    )
+
+
+def log_payload_anomaly(anomaly, chain_name):
+    """Raise the alert for a port whose payloads diverge from their baseline."""
+    src_ip, dst_ip = ip_to_str(anomaly["src_ip"]), ip_to_str(anomaly["dst_ip"])
+    logger.log_alert(
+        alert_type=AlertType.BEHAVIOR,
+        src_ip=src_ip,
+        dst_ip=dst_ip,
+        src_port=None,
+        dst_port=anomaly["dst_port"],
+        message=f"Payload Anomaly Detected on {chain_name} chain",
+        details={**anomaly, "src_ip": src_ip, "dst_ip": dst_ip, "chain": chain_name},
+        subtype=AlertSubtype.PAYLOAD_ANOMALY
+    )
+
+
+def log_dns_alert(context, subtype, details):
+    """Raise the alert for a registered domain whose DNS traffic crossed a threshold."""
+    src_ip, dst_ip, src_port, dst_port, chain_name = context
+    label = {
+        "DNS_TUNNELING": "DNS Tunneling",
+        "DNS_SUBDOMAIN_FLOOD": "DNS Random Subdomain Flood",
+        "DNS_NXDOMAIN_FLOOD": "DNS NXDOMAIN Flood",
+    }[subtype]
+    return logger.log_alert(
+        alert_type=AlertType.BEHAVIOR,
+        src_ip=src_ip,
+        dst_ip=dst_ip,
+        src_port=src_port,
+        dst_port=dst_port,
+        message=f"{label} Detected ({details['domain']}) on {chain_name} chain",
+        details={**details, "chain": chain_name},
+        subtype=getattr(AlertSubtype, subtype)
+    )
+
+
+def process_packet(packet, IsInput, port_scanner, sig_scanner, scan_pool=None, payload_detector=None,
+                   tls_fingerprinter=None, dns_detector=None, inspection_policy=None, flow_table=None):
     
     chain_name = "INPUT" if IsInput else "FORWARD"
 
     try:
-        # now we are working in the input chain packet..
-        packetInfo = scan_packet(packet)
-        src_ip = packetInfo.get("src_ip")
-        dst_ip = packetInfo.get("dst_ip")
-        src_port = packetInfo.get("src_port")
-        dst_port = packetInfo.get("dst_port")
-        raw_timestamp = packetInfo.get("rawts")
-        tcp_flags = packetInfo.get("tcp_flags")
-        port = packetInfo.get('port')
+        # safe, nfqueue always returns the IP layer not the ethernet..
+        raw_packet = packet.get_payload()
+        parsed = parse_packet(raw_packet)
+        if parsed is None:
+            packet.accept()
+            return
+        proto_number, src_port, dst_port, flags, payload_offset = parsed
+        raw_timestamp = packet.get_timestamp() or time.time()
+
+        # the ONE flow lookup of this packet, detectors keep their per-flow state in it
+        flow = flow_table.lookup(raw_packet, proto_number, src_port, dst_port, len(raw_packet), raw_timestamp)
+        # address ints, the logger formats them only for the alerts it emits
+        src_ip = flow.src_addr
+        dst_ip = flow.dst_addr
+        port = flow.proto.upper()
+        tcp_flags = flags if port == "TCP" else 0
+        is_icmp = port == "ICMP"
 
         #ignore some useless packets not important to us..
-        if src_ip == "127.0.0.1" and dst_ip == "127.0.0.1":
+        if src_ip == dst_ip and src_ip in LOOPBACK:
             packet.accept()
             return
 
-        # safe, nfqueue always returns the IP layer not the ethernet..
-        ip_layer = IP(packet.get_payload())
-        is_icmp = ip_layer.haslayer(ICMP)
-        if is_icmp:
-            port = "ICMP"
+        inspect = INSPECT_ALL
+        if inspection_policy:
+            # trusted / opaque flows (inspection_policy.yaml), verdict cached in the flow
+            inspect = inspection_policy.check(flow, len(raw_packet), flow_table)
+            if inspect == INSPECT_NONE:
+                packet.accept()
+                return
+        behavior = inspect & INSPECT_BEHAVIOR
+        signatures = inspect & INSPECT_SIGNATURES
 
 
         # if src_ip in ip_blacklist:
@@ -60,7 +171,7 @@ def process_packet(packet, IsInput, port_scanner, sig_scanner):
         #print("the data are: ")
         #print(packetInfo)
         
-        logger.console_logger.info(f"[{chain_name}] Packet: {src_ip}:{src_port} -> {dst_ip}:{dst_port} ({port})")
+        logger.console_logger.info("[%s] Packet: %s:%s -> %s:%s (%s)", chain_name, flow.src_ip, src_port, flow.dst_ip, dst_port, port)
         
         # let's now try to analyze it with the port scanner:
 
@@ -78,7 +189,7 @@ def process_packet(packet, IsInput, port_scanner, sig_scanner):
 
         # TCP should be only matter if SYN and not ACK to be classified as an
         # attack (again just for the moment, maybe modified latter)..
-        if port == "TCP" and (tcp_flags & 0x02) and not (tcp_flags & 0x10):
+        if behavior and port == "TCP" and (tcp_flags & 0x02) and not (tcp_flags & 0x10):
 
             analyze_result = port_scanner.analyze_tcp(src_ip, dst_ip, raw_timestamp, dst_port)
 
@@ -99,14 +210,14 @@ def process_packet(packet, IsInput, port_scanner, sig_scanner):
                     dst_port= dst_port,
                     message= message,
                     details={
-                        "dst_ip": dst_ip,
+                        "dst_ip": flow.dst_ip,
                         "dst_port": dst_port,
                         "chain": chain_name
                     },
                     subtype=subtype
                 )
 
-        elif port == "UDP":
+        elif behavior and port == "UDP":
 
             analyze_result = port_scanner.analyze_udp(dst_ip, raw_timestamp, dst_port)
 
@@ -120,14 +231,19 @@ def process_packet(packet, IsInput, port_scanner, sig_scanner):
                     dst_port= dst_port,
                     message=f"UDP Flood (DoS/DDoS) Detected on {chain_name} chain",
                     details={
-                        "dst_ip": dst_ip,
+                        "dst_ip": flow.dst_ip,
                         "dst_port": dst_port,
                         "chain": chain_name
                     },
                     subtype=AlertSubtype.UDP_FLOOD
                 )
 
-        elif is_icmp and ip_layer[ICMP].type == 8 : # echo req
+            if dns_detector and DNS_PORT in (src_port, dst_port):
+                dns_result = dns_detector.analyze(raw_packet[payload_offset:], raw_timestamp)
+                if dns_result:
+                    flow.alert = log_dns_alert((src_ip, dst_ip, src_port, dst_port, chain_name), *dns_result)
+
+        elif behavior and is_icmp and flags == ICMP_ECHO_REQUEST[proto_number] : # echo req (v4 or v6)
             analyze_result = port_scanner.analyze_icmp(dst_ip, raw_timestamp)
             if analyze_result:
                 # ALERT: ICMP Flood Detected
@@ -139,7 +255,7 @@ def process_packet(packet, IsInput, port_scanner, sig_scanner):
                     dst_port= dst_port,
                     message=f"ICMP Flood (DoS/DDoS) Detected on {chain_name} chain",
                     details={
-                        "dst_ip": dst_ip,
+                        "dst_ip": flow.dst_ip,
                         "dst_port": dst_port,
                         "chain": chain_name
                     },
@@ -147,7 +263,7 @@ def process_packet(packet, IsInput, port_scanner, sig_scanner):
                 )
 
         else : # some other packet, we may just log it to type of packets in normal conditions
-            logger.console_logger.info(f"[{chain_name}] Packet: {src_ip}:{src_port} -> {dst_ip}:{dst_port} ({port})")
+            logger.console_logger.info("[%s] Packet: %s:%s -> %s:%s (%s)", chain_name, flow.src_ip, src_port, flow.dst_ip, dst_port, port)
 
 
         #analyze_result = port_scanner.analyze_packet(src_ip, dst_ip, raw_timestamp, dst_port, tcp_flags)
@@ -172,29 +288,34 @@ def process_packet(packet, IsInput, port_scanner, sig_scanner):
 
         # let's now test the signature based scanning..
               
-        if ip_layer.haslayer(Raw):
-          # print("packet has a Raw layer..")
-            RawData = ip_layer[Raw].load
-            RuleName, RulePattern, Drop = sig_scanner.CheckPacketPayload(RawData)
-           #print(f"Rule Name: {RuleName}, Rule Pattern: {RulePattern}, Drop: {Drop}")
-            
-            if RuleName: # Match Found
-                # ALERT: Signature Match
-                logger.log_alert(
-                    alert_type=AlertType.SIGNATURE,
-                    src_ip=src_ip,
-                    dst_ip= dst_ip,
-                    src_port= src_port,
-                    dst_port= dst_port,
-                    message=f"Signature Match: {RuleName}",
-                    details={
-                        "pattern": str(RulePattern),
-                        "action": "ALERT",
-                        "chain": chain_name
-                    },
-                    subtype=None,  # Signatures don't have subtypes
-                    pattern=str(RulePattern)  # Store pattern for filtering
+        if len(raw_packet) > payload_offset:
+            RawData = raw_packet[payload_offset:]
+            proto = flow.proto
+            context = (src_ip, dst_ip, src_port, dst_port, chain_name)
+
+            if signatures and tls_fingerprinter and proto == "tcp":
+                # first segment(s) of a flow only, the verdict is cached in the flow
+                tls_match = tls_fingerprinter.inspect(RawData, dst_port, flow)
+                if tls_match:
+                    flow.alert = log_tls_match(context, *tls_match)
+
+            if behavior and payload_detector:
+                # sampled + batched, see payload_anomaly.py
+                for anomaly in payload_detector.observe(RawData, dst_port, src_ip, dst_ip):
+                    log_payload_anomaly(anomaly, chain_name)
+
+            if signatures and scan_pool:
+                # matched in a worker process, the alert is raised from its result thread
+                scan_pool.submit(RawData, proto, src_port, dst_port, context, flow=flow)
+            elif signatures:
+                RuleName, RulePattern, Drop = sig_scanner.CheckPacketPayload(
+                    RawData, proto, src_port, dst_port, flow=flow
                 )
+               #print(f"Rule Name: {RuleName}, Rule Pattern: {RulePattern}, Drop: {Drop}")
+
+                if RuleName: # Match Found
+                    # ALERT: Signature Match
+                    flow.alert = log_signature_alert(context, (RuleName, RulePattern, Drop))
                 
                 # Check if we need to drop based on signature rule
                 # if Drop:
@@ -213,10 +334,16 @@ def process_packet(packet, IsInput, port_scanner, sig_scanner):
         logger.console_logger.error(f"[!] Error processing packet: {e}")
         packet.accept()
 
-def forward_agent(sig_object):
+def forward_agent(sig_object, scan_pool=None, tls_fingerprinter=None, inspection_policy=None):
     nfq = NetfilterQueue()
-    port_scanner_object_forward = PortScanningDetector(15, 10)
-    nfq.bind(200, lambda packet: process_packet(packet, False, port_scanner_object_forward, sig_object))
+    port_scanner_object_forward = PortScanningDetector(15, 10, IPV4_AGGREGATE_PREFIX, IPV6_AGGREGATE_PREFIX)
+    payload_detector_forward = PayloadAnomalyDetector()
+    dns_detector_forward = DnsDetector()
+    flow_table_forward = FlowTable()
+    nfq.bind(200, lambda packet: process_packet(
+        packet, False, port_scanner_object_forward, sig_object, scan_pool, payload_detector_forward,
+        tls_fingerprinter, dns_detector_forward, inspection_policy, flow_table_forward
+    ))
 
     try:
         nfq.run()
@@ -225,11 +352,17 @@ def forward_agent(sig_object):
         logger.console_logger.critical(f"[!] Forward agent crashed: {e}")
 
 
-def input_agent(sig_object):
+def input_agent(sig_object, scan_pool=None, tls_fingerprinter=None, inspection_policy=None):
     nfq = NetfilterQueue()
-    port_scanner_object_input = PortScanningDetector(15, 10)
+    port_scanner_object_input = PortScanningDetector(15, 10, IPV4_AGGREGATE_PREFIX, IPV6_AGGREGATE_PREFIX)
     #sig_scanner_object_input = SignatureScanning()
-    nfq.bind(100, lambda packet: process_packet(packet, True, port_scanner_object_input, sig_object))
+    payload_detector_input = PayloadAnomalyDetector()
+    dns_detector_input = DnsDetector()
+    flow_table_input = FlowTable()
+    nfq.bind(100, lambda packet: process_packet(
+        packet, True, port_scanner_object_input, sig_object, scan_pool, payload_detector_input,
+        tls_fingerprinter, dns_detector_input, inspection_policy, flow_table_input
+    ))
         
     try:
         nfq.run()
@@ -243,6 +376,8 @@ if __name__ == "__main__":
     logger.log_system_event("Detection: Sliding Window + EWMA rate estimation (no eBPF/XDP)", "INFO")
     
     # Enable API integration first (needed for signature loading and alert submission)
+    db_integration.set_alert_transport(ALERT_TRANSPORT)
+    logger.set_alert_storage(ALERT_STORAGE)
     if db_integration.enable():
         logger.log_system_event("API integration enabled - alerts will be sent to Web Interface", "INFO")
     else:
@@ -250,15 +385,48 @@ if __name__ == "__main__":
     
     # let's now create the 2 threads..
     try:
-        sig_object = SignatureScanning() # Load rules from database
-        logger.log_system_event("Signature rules loaded successfully from database", "INFO")
+        # Load rules (from the local cache if present, otherwise from the API),
+        # payloads are normalized (URL decoding, case folding) before matching
+        sig_object = SignatureScanning(normalizer=PayloadNormalizer(), cache=RulesetCache())
+        logger.log_system_event(
+            f"Signature rules loaded successfully from {sig_object.ruleset.source} "
+            f"({len(sig_object.rules)} rules)", "INFO"
+        )
+        sig_object.report_ruleset()
+
+        # follow dashboard edits: rebuild in the background and hot-swap the matcher
+        sig_object.start_auto_reload(
+            on_swap=lambda ruleset: logger.log_system_event(
+                f"Signature ruleset {ruleset.version} active "
+                f"({len(ruleset)} rules, rebuilt in {ruleset.build_time_ms:.1f} ms)",
+                "INFO"
+            )
+        )
     except Exception as e:
         logger.log_system_event(f"Failed to load signatures: {e}", "ERROR")
         sig_object = None # Handle gracefully or exit
 
+    scan_pool = None
+    if sig_object and SIGNATURE_WORKERS > 0:
+        # payload matching runs in worker processes, off the NFQUEUE threads
+        scan_pool = ScanPool(sig_object, workers=SIGNATURE_WORKERS, on_match=log_signature_alert)
+        scan_pool.start()
+        logger.log_system_event(f"Signature scan pool started with {SIGNATURE_WORKERS} worker(s)", "INFO")
+
+    # SNI / JA3 blocklist for TLS flows (shared by both chains)
+    tls_fingerprinter = TlsFingerprinter.from_file()
+    logger.log_system_event(
+        f"TLS blocklist loaded ({len(tls_fingerprinter.blocked_sni)} SNI, "
+        f"{len(tls_fingerprinter.blocked_ja3)} JA3)", "INFO"
+    )
+
+    # flows that skip behavior detection and/or signatures (shared by both chains)
+    inspection_policy = InspectionPolicy.from_file()
+    logger.log_system_event(f"Inspection policy loaded ({len(inspection_policy.rules)} rules)", "INFO")
+
     if sig_object:
-        input_thread = threading.Thread(target=input_agent, args=(sig_object,), daemon=True)
-        forward_thread = threading.Thread(target=forward_agent, args=(sig_object,), daemon=True)
+        input_thread = threading.Thread(target=input_agent, args=(sig_object, scan_pool, tls_fingerprinter, inspection_policy), daemon=True)
+        forward_thread = threading.Thread(target=forward_agent, args=(sig_object, scan_pool, tls_fingerprinter, inspection_policy), daemon=True)
 
         # now let's start it:::
         input_thread.start()
@@ -269,6 +437,10 @@ if __name__ == "__main__":
     # Alert lifecycle management
     last_check_time = time.time()
     check_interval = 2  # Check every 2 seconds
+
+    # Per-rule hit counters are pushed to the API periodically
+    last_stats_flush = time.time()
+    stats_flush_interval = 30  # seconds
     
     # let's make sure the main thread exit peacefully::
     try:
@@ -286,7 +458,20 @@ if __name__ == "__main__":
                         f"Active: {stats['active_alerts']} | "
                         f"Suppressed: {stats['suppressed_alerts']}"
                     )
+                db_integration.send_incidents(logger.flush_incidents())
                 last_check_time = current_time
+
+            if current_time - last_stats_flush >= stats_flush_interval:
+                if sig_object:
+                    sig_object.flush_rule_stats()
+                if db_integration.enabled:
+                    db_integration.report_ids_stats("inspection_policy", inspection_policy.get_stats())
+                    db_integration.report_ids_stats("alert_shipper", db_integration.get_shipper_stats())
+                    db_integration.report_ids_stats("api_transport", db_integration.http.get_stats())
+                    db_integration.report_ids_stats("alert_log", logger.writer.get_stats())
+                    db_integration.report_ids_stats("alert_aggregator", logger.aggregator.get_stats())
+                    db_integration.report_ids_stats("incidents", logger.correlator.get_stats())
+                last_stats_flush = current_time
                 
     except KeyboardInterrupt:
         print()
@@ -294,6 +479,15 @@ if __name__ == "__main__":
         
         # Final cleanup
         logger.check_ended_alerts()
+        db_integration.send_incidents(logger.flush_incidents())
+        if scan_pool:
+            logger.log_system_event(f"Scan pool stats: {scan_pool.get_stats()}", "INFO")
+            scan_pool.stop()
+        if sig_object:
+            sig_object.flush_rule_stats()
+        logger.log_system_event(f"TLS fingerprint stats: {tls_fingerprinter.get_stats()}", "INFO")
+        if db_integration.enabled:
+            db_integration.report_ids_stats("inspection_policy", inspection_policy.get_stats())
         stats = logger.get_stats()
         logger.log_system_event(
             f"Session stats - Active alerts: {stats['active_alerts']}, "
@@ -302,4 +496,8 @@ if __name__ == "__main__":
             "INFO"
         )
         
-        logger.log_system_event("========== Stopping LOKI IDS ==========", "INFO")
\ No newline at end of file
+        logger.log_system_event("========== Stopping LOKI IDS ==========", "INFO")
+
+        # send the alerts still queued for the API, write out the alert log
+        db_integration.stop_shipper()
+        logger.close()
\ No newline at end of file
@@ -1,52 +1,137 @@
-from scapy.all import TCP, UDP, IP
-import datetime
-import time
-
-def scan_packet(packet):
-    pkt = IP(packet.get_payload()) # get the IP layerrr.
-    src_ip = pkt[IP].src
-    dst_ip = pkt[IP].dst
-    timestamp = packet.get_timestamp()
-    if not timestamp:
-        timestamp = time.time()
-
-    packetID = packet.id
-    payloadLen = packet.get_payload_len()
-    dst_port = 0
-    src_port = 0 # incase the packet has no TCP or UDP layer.
-    port = ""
-    tcp_flags = 0
-    
-    if pkt.haslayer(TCP):
-        dst_port = pkt[TCP].dport
-        src_port = pkt[TCP].sport
-        tcp_flags = int(pkt[TCP].flags)
-        is_syn = bool(tcp_flags & 0x02)
-        is_ack = bool(tcp_flags & 0x10)
-        is_rst = bool(tcp_flags & 0x04)
-        is_fin = bool(tcp_flags & 0x01)
-
-        port = "TCP"
-
-    elif pkt.haslayer(UDP):
-        dst_port = pkt[UDP].dport
-        src_port = pkt[UDP].sport
-        port = "UDP"
-
-    # now calc the timestamp to be in a good format..
-    finalTimeStamp = datetime.datetime.fromtimestamp(timestamp, datetime.UTC).strftime('%Y-%m-%d %H:%M:%S')
-
-    Result = {
-            "src_ip" : src_ip,
-            "dst_ip" : dst_ip,
-            "timestamp" : finalTimeStamp,
-            "packetID" : packetID,
-            "payloadLen" : payloadLen,
-            "src_port" : src_port,
-            "dst_port" : dst_port,
-            "port" : port,
-            "rawts" : timestamp,
-            "tcp_flags": tcp_flags,
-            }
-    return Result # finaly returning the dictionary..
-    
+# Packet header parsing
+# Reads the few header fields the detectors need straight from the bytes
+# NFQUEUE hands us (starting at the IP header), with no scapy objects and
+# no per-packet dict. IPv4 and IPv6 (extension headers included).
+
+import socket
+import struct
+
+
+IPPROTO_ICMP = 1
+IPPROTO_TCP = 6
+IPPROTO_UDP = 17
+IPPROTO_ICMPV6 = 58
+
+# ICMP type of an echo request, per protocol (ICMP flood detection)
+ICMP_ECHO_REQUEST = {IPPROTO_ICMP: 8, IPPROTO_ICMPV6: 128}
+
+_ports = struct.Struct("!HH")
+
+
+# ============================================================
+# Addresses
+# ============================================================
+# The detection core carries addresses as ints: hashing an int is
+# trivial and reading one from the packet bytes allocates nothing
+# worth mentioning, where a dotted string costs an allocation, a
+# format and a hash per packet. Text is made only for alerts and logs.
+#
+#   IPv4   the 32-bit address
+#   IPv6   the 128-bit address | IPV6_FLAG, so ::1 and 0.0.0.1 differ
+# ============================================================
+
+IPV6_FLAG = 1 << 128
+
+
+def ip_to_str(addr):
+    """Text form of an address int (strings and None are returned as is)."""
+    if not isinstance(addr, int):
+        return addr
+    if addr & IPV6_FLAG:
+        return socket.inet_ntop(socket.AF_INET6, (addr ^ IPV6_FLAG).to_bytes(16, "big"))
+    return socket.inet_ntoa(addr.to_bytes(4, "big"))
+
+
+def ip_from_str(text):
+    """Address int of an IPv4 / IPv6 string."""
+    if ":" in text:
+        return IPV6_FLAG | int.from_bytes(socket.inet_pton(socket.AF_INET6, text), "big")
+    return int.from_bytes(socket.inet_pton(socket.AF_INET, text), "big")
+
+
+def prefix_mask(ipv4_prefix=32, ipv6_prefix=128):
+    """
+    Mask that, ANDed with an address int, keeps its network part.
+
+    Returns:
+        (IPv4 mask, IPv6 mask); the IPv6 one keeps IPV6_FLAG
+    """
+    ipv4 = ((1 << ipv4_prefix) - 1) << (32 - ipv4_prefix)
+    ipv6 = IPV6_FLAG | ((1 << ipv6_prefix) - 1) << (128 - ipv6_prefix)
+    return ipv4, ipv6
+
+
+# ============================================================
+# IPv6 extension headers
+# ============================================================
+# The upper-layer header of an IPv6 packet sits behind a chain of
+# extension headers, each naming the next. We walk at most
+# MAX_EXTENSION_HEADERS of them (a crafted chain can't make us loop),
+# a packet with a longer chain is reported with proto = the header we
+# stopped at and no ports.
+#
+#   hop-by-hop / routing / dest options / mobility   (1 + len) * 8 bytes
+#   fragment                                         8 bytes
+#   AH                                               (2 + len) * 4 bytes
+#
+# Only the first fragment carries the transport header, the others
+# get ports 0 (same as IPv4).
+# ============================================================
+
+MAX_EXTENSION_HEADERS = 8
+IPV6_HEADER_LEN = 40
+IPV6_FRAGMENT = 44
+IPV6_AH = 51
+IPV6_EXTENSION_HEADERS = frozenset((0, 43, IPV6_FRAGMENT, IPV6_AH, 60, 135, 139, 140))
+
+
+def parse_packet(raw):
+    """
+    Parse the IP (v4 or v6) + transport headers of a packet.
+
+    Args:
+        raw: packet bytes starting at the IP header (packet.get_payload())
+
+    Returns:
+        (proto, src_port, dst_port, flags, payload_offset), or None if it
+        isn't an IP packet. proto is the (upper-layer) IP protocol number,
+        ports are 0 without a TCP/UDP header, flags are the TCP flags (TCP)
+        or the ICMP type (ICMP / ICMPv6), payload_offset is where the
+        transport payload starts.
+    """
+    if len(raw) < 20:
+        return None
+    version = raw[0] >> 4
+    if version == 4:
+        header_len = (raw[0] & 0x0F) * 4
+        proto = raw[9]
+        if (raw[6] & 0x1F) or raw[7]:
+            return proto, 0, 0, 0, header_len  # non-first fragment, no transport header
+    elif version == 6 and len(raw) >= IPV6_HEADER_LEN:
+        proto = raw[6]
+        header_len = IPV6_HEADER_LEN
+        hops = 0
+        while proto in IPV6_EXTENSION_HEADERS:
+            if hops == MAX_EXTENSION_HEADERS or len(raw) < header_len + 8:
+                return proto, 0, 0, 0, header_len
+            hops += 1
+            if proto == IPV6_FRAGMENT:
+                if (raw[header_len + 2] << 8 | raw[header_len + 3]) & 0xFFF8:
+                    return raw[header_len], 0, 0, 0, header_len + 8  # non-first fragment
+                proto, header_len = raw[header_len], header_len + 8
+            elif proto == IPV6_AH:
+                proto, header_len = raw[header_len], header_len + (raw[header_len + 1] + 2) * 4
+            else:
+                proto, header_len = raw[header_len], header_len + (raw[header_len + 1] + 1) * 8
+    else:
+        return None
+
+    if proto == IPPROTO_TCP and len(raw) >= header_len + 20:
+        src_port, dst_port = _ports.unpack_from(raw, header_len)
+        return proto, src_port, dst_port, raw[header_len + 13], header_len + (raw[header_len + 12] >> 4) * 4
+    if proto == IPPROTO_UDP and len(raw) >= header_len + 8:
+        src_port, dst_port = _ports.unpack_from(raw, header_len)
+        return proto, src_port, dst_port, 0, header_len + 8
+    if (proto == IPPROTO_ICMP or proto == IPPROTO_ICMPV6) and len(raw) >= header_len + 8:
+        return proto, 0, 0, raw[header_len], header_len + 8
+    return proto, 0, 0, 0, header_len
@@ -0,0 +1,278 @@
+# Payload entropy / size anomaly detection
+# Literal signatures can't see encrypted C2 or exfiltration on odd ports.
+# This detector learns, per destination port, what payloads normally look
+# like (byte distribution, entropy, size) and flags a port when its recent
+# traffic diverges from that.
+
+import logging
+import time
+from collections import OrderedDict, Counter
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+    logging.warning("numpy not installed. Payload anomaly detection will be disabled.")
+
+
+# ============================================================
+# Sampling budget + micro-batches
+# ============================================================
+# Looking at every payload would cost the most exactly when we can
+# afford it the least (floods), so:
+#
+#   1. A token bucket lets at most `sample_budget` payloads per second
+#      in (tokens refill continuously, burst capped at one batch), and
+#      only the first `max_bytes` of each are kept.
+#   2. Samples are buffered and analyzed `batch_size` at a time, with
+#      numpy: all payloads are concatenated into one uint8 array and a
+#      single bincount over (row * 256 + byte) gives every histogram.
+#
+# Worst case cost = sample_budget * max_bytes bytes of numpy work per
+# second, whatever the packet rate.
+# ============================================================
+
+
+# ============================================================
+# Per-port distributions
+# ============================================================
+# Every destination port keeps:
+#   baseline  EWMA of the byte histogram, the payload size histogram
+#             (log2 buckets) and the mean Shannon entropy
+#   recent    the same, summed over the last `window` samples
+#
+# When `window` samples have accumulated the recent distributions are
+# compared with the baseline:
+#   - Jensen-Shannon divergence of the byte histograms    (0..1 bits)
+#   - Jensen-Shannon divergence of the size histograms    (0..1 bits)
+#   - shift of the mean entropy                            (bits/byte)
+# and then folded into the baseline (anomalous windows 10x slower, so
+# a long exfiltration doesn't quickly become "normal").
+#
+# Ports still learning (fewer than `warmup` samples) are compared with
+# the all-ports baseline instead, so a brand new port carrying random
+# looking data still stands out.
+# ============================================================
+
+SIZE_BUCKETS = 16  # log2(size) buckets: 1, 2-3, 4-7, ... 32k+
+
+
+class _PortProfile:
+    __slots__ = ("byte_hist", "size_hist", "entropy", "samples",
+                 "recent_bytes", "recent_sizes", "recent_entropy", "recent_count", "sources")
+
+    def __init__(self):
+        self.byte_hist = np.zeros(256)
+        self.size_hist = np.zeros(SIZE_BUCKETS)
+        self.entropy = 0.0
+        self.samples = 0               # samples folded into the baseline
+        self.reset_recent()
+
+    def reset_recent(self):
+        self.recent_bytes = np.zeros(256)
+        self.recent_sizes = np.zeros(SIZE_BUCKETS)
+        self.recent_entropy = 0.0
+        self.recent_count = 0
+        self.sources = Counter()       # (src_ip, dst_ip) of the recent samples
+
+
+def js_divergence(p, q):
+    """Jensen-Shannon divergence (bits) of two histograms (normalized here)."""
+    p = p / p.sum()
+    q = q / q.sum()
+    m = (p + q) / 2
+    with np.errstate(divide="ignore", invalid="ignore"):
+        left = np.where(p > 0, p * np.log2(p / m), 0.0).sum()
+        right = np.where(q > 0, q * np.log2(q / m), 0.0).sum()
+    return float((left + right) / 2)
+
+
+class PayloadAnomalyDetector:
+    """
+    Flags destination ports whose payloads stop looking like they used to.
+    """
+    def __init__(self, sample_budget=200, max_bytes=512, batch_size=64, window=64,
+                 warmup=512, alpha=0.05, byte_threshold=0.3, size_threshold=0.4,
+                 entropy_threshold=1.5, max_ports=1024):
+        """
+        Args:
+            sample_budget: payloads analyzed per second at most
+            max_bytes: bytes of each sampled payload looked at
+            batch_size: samples per numpy batch
+            window: recent samples of a port compared to its baseline
+            warmup: samples before a port has its own baseline
+            alpha: EWMA weight of a window in the baseline
+            byte_threshold: byte histogram JS divergence that raises an alert
+            size_threshold: size histogram JS divergence that raises an alert
+            entropy_threshold: mean entropy shift (bits/byte) that raises an alert
+            max_ports: ports tracked at most (least recently seen evicted)
+        """
+        self.enabled = NUMPY_AVAILABLE
+        self.sample_budget = sample_budget
+        self.max_bytes = max_bytes
+        self.batch_size = batch_size
+        self.window = window
+        self.warmup = warmup
+        self.alpha = alpha
+        self.byte_threshold = byte_threshold
+        self.size_threshold = size_threshold
+        self.entropy_threshold = entropy_threshold
+        self.max_ports = max_ports
+
+        self._tokens = float(batch_size)
+        self._last_refill = time.monotonic()
+        self._batch = []               # (payload slice, full size, dst_port, src_ip, dst_ip)
+        self._ports = OrderedDict()
+        self._global = _PortProfile() if self.enabled else None
+
+        # Statistics
+        self.payloads_seen = 0
+        self.payloads_sampled = 0
+        self.batches = 0
+        self.windows_checked = 0
+        self.anomalies = 0
+
+    def observe(self, payload, dst_port, src_ip=None, dst_ip=None):
+        """
+        Offer one payload (cheap: most calls only spend a token check).
+
+        Returns:
+            list of anomaly dicts (usually empty, see _check_window)
+        """
+        if not self.enabled or not payload:
+            return []
+        self.payloads_seen += 1
+
+        now = time.monotonic()
+        self._tokens = min(self.batch_size, self._tokens + (now - self._last_refill) * self.sample_budget)
+        self._last_refill = now
+        if self._tokens < 1:
+            return []
+        self._tokens -= 1
+
+        self.payloads_sampled += 1
+        self._batch.append((payload[:self.max_bytes], len(payload), dst_port, src_ip, dst_ip))
+        if len(self._batch) < self.batch_size:
+            return []
+        return self.flush()
+
+    def flush(self):
+        """Analyze the buffered samples now."""
+        batch, self._batch = self._batch, []
+        if not batch:
+            return []
+        self.batches += 1
+
+        # one histogram row per payload, in a single bincount
+        lengths = np.fromiter((len(sample[0]) for sample in batch), dtype=np.int64, count=len(batch))
+        data = np.frombuffer(b"".join(sample[0] for sample in batch), dtype=np.uint8)
+        rows = np.repeat(np.arange(len(batch)), lengths)
+        hist = np.bincount(rows * 256 + data, minlength=len(batch) * 256).reshape(len(batch), 256)
+
+        probs = hist / lengths[:, None]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            entropy = -np.where(probs > 0, probs * np.log2(probs), 0.0).sum(axis=1)
+
+        sizes = np.fromiter((sample[1] for sample in batch), dtype=np.int64, count=len(batch))
+        size_buckets = np.minimum(np.log2(np.maximum(sizes, 1)).astype(np.int64), SIZE_BUCKETS - 1)
+        ports = np.fromiter((sample[2] or 0 for sample in batch), dtype=np.int64, count=len(batch))
+
+        anomalies = []
+        for port in np.unique(ports).tolist():
+            mask = ports == port
+            profile = self._profile(port)
+            profile.recent_bytes += hist[mask].sum(axis=0)
+            profile.recent_sizes += np.bincount(size_buckets[mask], minlength=SIZE_BUCKETS)
+            profile.recent_entropy += float(entropy[mask].sum())
+            profile.recent_count += int(mask.sum())
+            for i in np.flatnonzero(mask).tolist():
+                profile.sources[(batch[i][3], batch[i][4])] += 1
+
+            if profile.recent_count >= self.window:
+                anomaly = self._check_window(port, profile)
+                if anomaly:
+                    anomalies.append(anomaly)
+        return anomalies
+
+    def _profile(self, port):
+        profile = self._ports.get(port)
+        if profile is None:
+            if len(self._ports) >= self.max_ports:
+                self._ports.popitem(last=False)
+            profile = self._ports[port] = _PortProfile()
+        else:
+            self._ports.move_to_end(port)
+        return profile
+
+    def _check_window(self, port, profile):
+        """
+        Compare a full recent window with the baseline, then learn it.
+
+        Returns:
+            dict describing the anomaly, or None
+        """
+        self.windows_checked += 1
+        entropy = profile.recent_entropy / profile.recent_count
+        baseline = profile if profile.samples >= self.warmup else self._global
+
+        anomaly = None
+        if baseline.samples >= self.warmup:
+            byte_divergence = js_divergence(profile.recent_bytes, baseline.byte_hist)
+            size_divergence = js_divergence(profile.recent_sizes, baseline.size_hist)
+            entropy_shift = entropy - baseline.entropy
+
+            reasons = []
+            if byte_divergence >= self.byte_threshold:
+                reasons.append("byte distribution")
+            if size_divergence >= self.size_threshold:
+                reasons.append("size distribution")
+            if abs(entropy_shift) >= self.entropy_threshold:
+                reasons.append("entropy " + ("rise" if entropy_shift > 0 else "drop"))
+
+            if reasons:
+                self.anomalies += 1
+                (src_ip, dst_ip), _ = profile.sources.most_common(1)[0]
+                anomaly = {
+                    "dst_port": port,
+                    "src_ip": src_ip,
+                    "dst_ip": dst_ip,
+                    "reasons": reasons,
+                    "entropy": round(entropy, 3),
+                    "baseline_entropy": round(baseline.entropy, 3),
+                    "byte_divergence": round(byte_divergence, 3),
+                    "size_divergence": round(size_divergence, 3),
+                    "samples": profile.recent_count,
+                    "baseline": "port" if baseline is profile else "all ports",
+                }
+
+        alpha = self.alpha / 10 if anomaly else self.alpha
+        for target in (profile, self._global):
+            self._learn(target, profile, entropy, alpha)
+        profile.reset_recent()
+        return anomaly
+
+    @staticmethod
+    def _learn(target, window, entropy, alpha):
+        """Fold a recent window into `target`'s baseline (plain average while it is young)."""
+        weight = max(alpha, window.recent_count / (target.samples + window.recent_count))
+        byte_hist = window.recent_bytes / window.recent_bytes.sum()
+        size_hist = window.recent_sizes / window.recent_sizes.sum()
+        target.byte_hist = (1 - weight) * target.byte_hist + weight * byte_hist
+        target.size_hist = (1 - weight) * target.size_hist + weight * size_hist
+        target.entropy = (1 - weight) * target.entropy + weight * entropy
+        target.samples += window.recent_count
+
+    def get_stats(self):
+        """Get detector statistics"""
+        return {
+            'enabled': self.enabled,
+            'payloads_seen': self.payloads_seen,
+            'payloads_sampled': self.payloads_sampled,
+            'sample_rate': f"{self.payloads_sampled / max(self.payloads_seen, 1) * 100:.1f}%",
+            'batches': self.batches,
+            'windows_checked': self.windows_checked,
+            'anomalies': self.anomalies,
+            'tracked_ports': len(self._ports),
+        }
+
@@ -0,0 +1,270 @@
+# Streaming pcap / pcapng reader
+# Yields the transport payload of every packet in a capture file, one
+# record at a time, so multi-GB captures never have to fit in memory.
+# No scapy: decoding a few headers with struct is a lot faster.
+
+import socket
+import struct
+from collections import namedtuple
+
+
+# ============================================================
+# Supported input
+# ============================================================
+#   files       classic pcap (us / ns timestamps, either byte order)
+#               pcapng (SHB / IDB / EPB / SPB blocks, others skipped)
+#   link types  Ethernet (+ 802.1Q / QinQ tags), raw IP, Linux cooked
+#               (SLL / SLL2), BSD loopback
+#   network     IPv4 (non-first fragments skipped), IPv6 (extension
+#               headers walked)
+#   transport   tcp / udp / icmp, same proto names as nfqueue_app
+#
+# Packets without a payload (pure ACKs...) are still yielded, with an
+# empty payload, so callers can count them.
+# ============================================================
+
+PcapPacket = namedtuple("PcapPacket", "timestamp proto src_ip src_port dst_ip dst_port payload")
+
+PCAP_MAGIC = {
+    b"\xd4\xc3\xb2\xa1": ("<", 1e-6),
+    b"\xa1\xb2\xc3\xd4": (">", 1e-6),
+    b"\x4d\x3c\xb2\xa1": ("<", 1e-9),
+    b"\xa1\xb2\x3c\x4d": (">", 1e-9),
+}
+PCAPNG_SHB = b"\x0a\x0d\x0d\x0a"
+
+LINKTYPE_NULL = 0
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = (12, 14, 101)
+LINKTYPE_IPV4 = 228
+LINKTYPE_IPV6 = 229
+LINKTYPE_LINUX_SLL = 113
+LINKTYPE_LINUX_SLL2 = 276
+
+ETH_IPV4 = 0x0800
+ETH_IPV6 = 0x86DD
+ETH_VLAN = (0x8100, 0x88A8, 0x9100)
+
+IPV6_EXTENSIONS = (0, 43, 60)  # hop-by-hop, routing, destination options
+IPV6_FRAGMENT = 44
+
+MAX_RECORD = 256 * 1024  # larger records mean a corrupt file
+
+
+class PcapError(ValueError):
+    """The file is not a capture we can read."""
+
+
+class PcapReader:
+    """
+    Iterates over the packets of a capture file.
+    """
+    def __init__(self, fileobj):
+        """
+        Args:
+            fileobj: binary file object positioned at the start of the capture
+        """
+        self.file = fileobj
+
+        # Statistics
+        self.records = 0
+        self.bytes_read = 0
+        self.skipped = 0      # records that are not IPv4/IPv6 tcp/udp/icmp (ARP, fragments...)
+
+    def __iter__(self):
+        magic = self._read(4)
+        if magic in PCAP_MAGIC:
+            records = self._pcap_records(*PCAP_MAGIC[magic])
+        elif magic == PCAPNG_SHB:
+            records = self._pcapng_records()
+        else:
+            raise PcapError("not a pcap or pcapng file")
+
+        for timestamp, linktype, frame in records:
+            self.records += 1
+            packet = decode_frame(linktype, frame, timestamp)
+            if packet is None:
+                self.skipped += 1
+            else:
+                yield packet
+
+    def _read(self, size):
+        data = self.file.read(size)
+        self.bytes_read += len(data)
+        return data
+
+    def _pcap_records(self, endian, resolution):
+        """(timestamp, linktype, frame) of a classic pcap file (magic already read)."""
+        header = self._read(20)
+        if len(header) < 20:
+            raise PcapError("truncated pcap header")
+        linktype = struct.unpack(endian + "HHiIII", header)[5] & 0x0FFFFFFF
+        record = struct.Struct(endian + "IIII")
+
+        while True:
+            head = self._read(16)
+            if len(head) < 16:
+                return
+            seconds, fraction, caplen, _ = record.unpack(head)
+            if caplen > MAX_RECORD:
+                raise PcapError(f"record {self.records + 1} is {caplen} bytes, file looks corrupt")
+            frame = self._read(caplen)
+            if len(frame) < caplen:
+                return  # truncated last record
+            yield seconds + fraction * resolution, linktype, frame
+
+    def _pcapng_records(self):
+        """(timestamp, linktype, frame) of a pcapng file (first block type already read)."""
+        endian = "<"
+        interfaces = []
+        block_type = PCAPNG_SHB
+
+        while True:
+            head = self._read(4)
+            if len(head) < 4:
+                return
+
+            if block_type == PCAPNG_SHB:
+                # section header: the byte order magic tells the endianness of the section
+                order = self._read(4)
+                if len(order) < 4:
+                    return
+                endian = "<" if order == b"\x4d\x3c\x2b\x1a" else ">"
+                length = struct.unpack(endian + "I", head)[0]
+                if length < 28 or length > MAX_RECORD:
+                    raise PcapError(f"bad pcapng section header length {length}")
+                self._read(length - 16)  # version, section length, options
+                interfaces = []
+            else:
+                length = struct.unpack(endian + "I", head)[0]
+                if length < 12 or length > MAX_RECORD:
+                    raise PcapError(f"bad pcapng block length {length}")
+                body = self._read(length - 12)
+                if len(body) < length - 12:
+                    return
+                code = struct.unpack(endian + "I", block_type)[0]
+
+                if code == 1:    # interface description
+                    interfaces.append(struct.unpack_from(endian + "H", body)[0])
+                elif code == 6:  # enhanced packet
+                    interface, high, low, caplen = struct.unpack_from(endian + "IIII", body)
+                    linktype = interfaces[interface] if interface < len(interfaces) else LINKTYPE_ETHERNET
+                    # default resolution (if_tsresol is rarely set)
+                    yield ((high << 32) | low) * 1e-6, linktype, body[20:20 + caplen]
+                elif code == 3:  # simple packet
+                    linktype = interfaces[0] if interfaces else LINKTYPE_ETHERNET
+                    yield 0.0, linktype, body[4:]
+
+            self._read(4)  # trailing block length
+            block_type = self._read(4)
+            if len(block_type) < 4:
+                return
+
+    def get_stats(self):
+        """Get reader statistics"""
+        return {
+            'records': self.records,
+            'bytes_read': self.bytes_read,
+            'skipped': self.skipped,
+        }
+
+
+def decode_frame(linktype, frame, timestamp=0.0):
+    """
+    Decode one link layer frame down to the transport payload.
+
+    Returns:
+        PcapPacket, or None for anything that isn't tcp/udp/icmp over IP
+    """
+    if linktype == LINKTYPE_ETHERNET:
+        if len(frame) < 14:
+            return None
+        ethertype = struct.unpack_from("!H", frame, 12)[0]
+        offset = 14
+        while ethertype in ETH_VLAN and len(frame) >= offset + 4:
+            ethertype = struct.unpack_from("!H", frame, offset + 2)[0]
+            offset += 4
+    elif linktype in LINKTYPE_RAW or linktype in (LINKTYPE_IPV4, LINKTYPE_IPV6):
+        if not frame:
+            return None
+        ethertype = ETH_IPV6 if frame[0] >> 4 == 6 else ETH_IPV4
+        offset = 0
+    elif linktype == LINKTYPE_LINUX_SLL:
+        if len(frame) < 16:
+            return None
+        ethertype = struct.unpack_from("!H", frame, 14)[0]
+        offset = 16
+    elif linktype == LINKTYPE_LINUX_SLL2:
+        if len(frame) < 20:
+            return None
+        ethertype = struct.unpack_from("!H", frame, 0)[0]
+        offset = 20
+    elif linktype == LINKTYPE_NULL:
+        if len(frame) < 4:
+            return None
+        # address family in the byte order of the capturing host
+        family = frame[0] or frame[3]
+        ethertype = ETH_IPV4 if family == 2 else ETH_IPV6
+        offset = 4
+    else:
+        return None
+
+    if ethertype == ETH_IPV4:
+        return _decode_ipv4(frame, offset, timestamp)
+    if ethertype == ETH_IPV6:
+        return _decode_ipv6(frame, offset, timestamp)
+    return None
+
+
+def _decode_ipv4(frame, offset, timestamp):
+    if len(frame) < offset + 20:
+        return None
+    header_len = (frame[offset] & 0x0F) * 4
+    total_len, fragment = struct.unpack_from("!H2xH", frame, offset + 2)
+    if fragment & 0x1FFF:
+        return None  # non-first fragment, no transport header
+    end = min(len(frame), offset + total_len) if total_len else len(frame)
+    src = socket.inet_ntop(socket.AF_INET, frame[offset + 12:offset + 16])
+    dst = socket.inet_ntop(socket.AF_INET, frame[offset + 16:offset + 20])
+    return _decode_transport(frame[offset + 9], frame, offset + header_len, end, src, dst, timestamp)
+
+
+def _decode_ipv6(frame, offset, timestamp):
+    if len(frame) < offset + 40:
+        return None
+    payload_len = struct.unpack_from("!H", frame, offset + 4)[0]
+    next_header = frame[offset + 6]
+    src = socket.inet_ntop(socket.AF_INET6, frame[offset + 8:offset + 24])
+    dst = socket.inet_ntop(socket.AF_INET6, frame[offset + 24:offset + 40])
+    end = min(len(frame), offset + 40 + payload_len) if payload_len else len(frame)
+
+    offset += 40
+    while next_header in IPV6_EXTENSIONS or next_header == IPV6_FRAGMENT:
+        if len(frame) < offset + 8:
+            return None
+        if next_header == IPV6_FRAGMENT:
+            if struct.unpack_from("!H", frame, offset + 2)[0] & 0xFFF8:
+                return None  # non-first fragment
+            next_header, length = frame[offset], 8
+        else:
+            next_header, length = frame[offset], (frame[offset + 1] + 1) * 8
+        offset += length
+
+    return _decode_transport(next_header, frame, offset, end, src, dst, timestamp)
+
+
+def _decode_transport(protocol, frame, offset, end, src, dst, timestamp):
+    if protocol == 6:
+        if end < offset + 20:
+            return None
+        src_port, dst_port, data_offset = struct.unpack_from("!HH8xB", frame, offset)
+        start = offset + (data_offset >> 4) * 4
+        return PcapPacket(timestamp, "tcp", src, src_port, dst, dst_port, frame[start:end])
+    if protocol == 17:
+        if end < offset + 8:
+            return None
+        src_port, dst_port = struct.unpack_from("!HH", frame, offset)
+        return PcapPacket(timestamp, "udp", src, src_port, dst, dst_port, frame[offset + 8:end])
+    if protocol in (1, 58):
+        return PcapPacket(timestamp, "icmp", src, None, dst, None, frame[offset + 8:end])
+    return None
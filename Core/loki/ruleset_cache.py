@@ -0,0 +1,164 @@
+# On-disk cache of the compiled signature ruleset
+# Lets the IDS boot with its last known rules in a few milliseconds,
+# even when the Web Interface API is not reachable yet.
+
+import hashlib
+import json
+import marshal
+import mmap
+import os
+import struct
+import time
+
+
+# ============================================================
+# File format
+# ============================================================
+#   offset  size  field
+#   0       8     magic  b"LOKIRS01"
+#   8       32    sha256 of the rule contents (the cache key)
+#   40      32    sha256 of the body (integrity check)
+#   72      4     body length (little endian)
+#   76      ...   body = marshal.dumps({...})
+#
+# The body holds the COMPILED rules (patterns already normalized) plus
+# metadata (API version/ETag, save time), so loading it is just an mmap,
+# a hash check and one marshal.loads - no recompilation.
+#
+# Writes go to a temp file + os.replace(), so a reader (or a crash in
+# the middle of a save) never sees a half-written cache.
+# ============================================================
+
+MAGIC = b"LOKIRS01"
+HEADER = struct.Struct("<8s32s32sI")
+
+
+def ruleset_content_hash(signatures, normalizer=None):
+    """
+    Hash of everything that affects the compiled rules.
+
+    Args:
+        signatures: list of signature dicts (as returned by the API)
+        normalizer: PayloadNormalizer used for the patterns (or None)
+
+    Returns:
+        str: hex sha256
+    """
+    digest = hashlib.sha256()
+    digest.update(json.dumps(normalizer.config_key() if normalizer else None).encode('utf-8'))
+    for sig in signatures:
+        digest.update(json.dumps([
+            sig.get('name'), sig.get('pattern'), sig.get('action'), sig.get('description', ''),
+            sig.get('proto'), sig.get('src_ports'), sig.get('dst_ports'),
+            sig.get('nocase'), sig.get('offset'), sig.get('depth'), sig.get('field')
+        ]).encode('utf-8'))
+        digest.update(b"\n")
+    return digest.hexdigest()
+
+
+class RulesetCache:
+    """
+    Persists a compiled ruleset to a single local file.
+    """
+    def __init__(self, cache_dir="cache", filename="ruleset.cache"):
+
+        current_dir = os.path.dirname(os.path.abspath(__file__))
+        project_root = os.path.dirname(os.path.dirname(current_dir))
+        self.cache_dir = os.path.join(project_root, cache_dir)
+        self.filepath = os.path.join(self.cache_dir, filename)
+
+    def save(self, rules, content_hash, version=None, normalizer_key=None):
+        """
+        Write the compiled rules to disk (skipped if the cache already holds them).
+
+        Args:
+            rules: tuple of compiled rule dicts
+            content_hash: hex key from ruleset_content_hash()
+            version: ruleset ETag reported by the API
+            normalizer_key: PayloadNormalizer.config_key() the patterns were built with
+
+        Returns:
+            bool: True if the file was written
+        """
+        key = bytes.fromhex(content_hash)
+        if self._read_key() == key:
+            return False  # same contents already on disk
+
+        body = marshal.dumps({
+            'version': version,
+            'normalizer': normalizer_key,
+            'saved_at': time.time(),
+            'rules': list(rules),
+        })
+        header = HEADER.pack(MAGIC, key, hashlib.sha256(body).digest(), len(body))
+
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp_path = self.filepath + ".tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(header)
+                f.write(body)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.filepath)
+            return True
+        except Exception as e:
+            print(f"[!] couldn't write the ruleset cache: {e}")
+            return False
+
+    def load(self):
+        """
+        Map the cache file and decode it.
+
+        Returns:
+            dict with keys: rules, version, normalizer, content_hash, saved_at, load_ms
+            or None if there is no (valid) cache
+        """
+        start = time.perf_counter()
+        try:
+            with open(self.filepath, 'rb') as f:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    if len(mm) < HEADER.size:
+                        return None
+
+                    magic, key, body_hash, body_len = HEADER.unpack_from(mm, 0)
+                    if magic != MAGIC or len(mm) != HEADER.size + body_len:
+                        print("[!] Ignoring ruleset cache: bad header")
+                        return None
+
+                    view = memoryview(mm)[HEADER.size:]
+                    try:
+                        if hashlib.sha256(view).digest() != body_hash:
+                            print("[!] Ignoring ruleset cache: checksum mismatch")
+                            return None
+                        body = marshal.loads(view)
+                    finally:
+                        view.release()
+
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"[!] couldn't read the ruleset cache: {e}")
+            return None
+
+        return {
+            'rules': tuple(body['rules']),
+            'version': body.get('version'),
+            'normalizer': body.get('normalizer'),
+            'content_hash': key.hex(),
+            'saved_at': body.get('saved_at'),
+            'load_ms': (time.perf_counter() - start) * 1000,
+        }
+
+    def _read_key(self):
+        """Content hash stored in the current cache file (header only)."""
+        try:
+            with open(self.filepath, 'rb') as f:
+                header = f.read(HEADER.size)
+            if len(header) == HEADER.size:
+                magic, key, _, _ = HEADER.unpack(header)
+                if magic == MAGIC:
+                    return key
+        except OSError:
+            pass
+        return None
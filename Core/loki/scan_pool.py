@@ -0,0 +1,444 @@
+# Process-pool signature scanning
+# Moves payload matching out of the NFQUEUE threads (and out of the GIL)
+# into worker processes. Payloads travel through shared-memory rings,
+# nothing is pickled on the packet path.
+
+import itertools
+import multiprocessing
+import queue
+import struct
+import threading
+import time
+from multiprocessing import shared_memory
+
+from signature_engine import CompiledRuleset
+from payload_normalizer import PayloadNormalizer
+from http_parser import HttpRequestParser, request_fields
+from flow_table import FlowRecord
+
+
+# ============================================================
+# Shared-memory rings
+# ============================================================
+# Every worker owns two single-producer / single-consumer rings:
+#
+#   request ring  (IDS -> worker)   slot = REQUEST header + payload bytes
+#   result ring   (worker -> IDS)   slot = RESULT (seq, generation, rule ID)
+#
+# A ring is one SharedMemory block cut into fixed-size slots plus two
+# semaphores:  `items` counts filled slots, `free` counts empty ones.
+# The semaphores are the only synchronisation (and the memory barrier)
+# between the processes; each side keeps its own slot index privately,
+# which is safe because slots are always consumed in FIFO order.
+#
+# Flows:
+#   A payload submitted with its flow goes to the worker picked by the
+#   flow key's hash, and the hash travels in the request header. Every
+#   segment of a flow is therefore parsed by the same worker, in order,
+#   and its HTTP parser keeps the flow's state under that hash: a
+#   request head split over several segments is reassembled as on the
+#   inline path. Payloads without a flow go round robin.
+#
+# Falling behind:
+#   When a worker's request ring is full the next worker is tried (only
+#   for payloads without a flow, a flow never changes worker); when no
+#   ring can take it the packet is scanned inline in the calling thread
+#   (overflow="inline", the default) or not scanned at all
+#   (overflow="skip"). Either way the NFQUEUE thread never blocks on
+#   the pool, and the counters show how often it happened. A flow that
+#   overflows while its worker holds part of a request head loses that
+#   head (it is matched packet by packet until the next request).
+#
+# Rulesets:
+#   Workers get the compiled rules (already normalized) through a
+#   control queue whenever the scanner publishes a new ruleset. Each
+#   one is tagged with a generation number, results carry the
+#   generation they were computed with, so a rule ID is always resolved
+#   against the right ruleset even across a hot-swap. A worker looks at
+#   its control queue every 256 payloads or when idle, so it may finish
+#   a few packets on the previous ruleset after a swap.
+# ============================================================
+
+REQUEST = struct.Struct("<IQBHHH")   # seq, flow hash (0 = none), proto code, src port, dst port, payload length
+RESULT = struct.Struct("<IIi")       # seq, ruleset generation, rule ID (-1 = no match)
+
+# proto strings <-> one byte in the request header
+PROTOS = (None, "tcp", "udp", "icmp", "")
+PROTO_CODES = {proto: code for code, proto in enumerate(PROTOS)}
+
+RULESETS_KEPT = 4                    # old generations kept to resolve in-flight results
+
+
+class SharedRing:
+    """
+    Fixed-slot ring buffer in shared memory (single producer, single consumer).
+    """
+    def __init__(self, ctx, slots, slot_size):
+        """
+        Args:
+            ctx: multiprocessing context (for the semaphores)
+            slots: number of slots
+            slot_size: bytes per slot
+        """
+        self.slots = slots
+        self.slot_size = slot_size
+        self.shm = shared_memory.SharedMemory(create=True, size=slots * slot_size)
+        self.items = ctx.Semaphore(0)
+        self.free = ctx.Semaphore(slots)
+        self._index = 0   # next slot to write (producer) or read (consumer)
+
+    def spec(self):
+        """What a child process needs to attach (picklable)."""
+        return (self.shm.name, self.slots, self.slot_size, self.items, self.free)
+
+    @classmethod
+    def attach(cls, spec):
+        """Open a ring created by another process."""
+        name, slots, slot_size, items, free = spec
+        ring = cls.__new__(cls)
+        ring.slots = slots
+        ring.slot_size = slot_size
+        ring.shm = shared_memory.SharedMemory(name=name)
+        ring.items = items
+        ring.free = free
+        ring._index = 0
+        return ring
+
+    def next_offset(self):
+        """Byte offset of the current slot, and advance."""
+        offset = self._index * self.slot_size
+        self._index = (self._index + 1) % self.slots
+        return offset
+
+    def close(self, unlink=False):
+        try:
+            self.shm.close()
+            if unlink:
+                self.shm.unlink()
+        except Exception:
+            pass
+
+
+# ============================================================
+# Worker process
+# ============================================================
+
+def _worker_main(request_spec, result_spec, control, normalizer_config):
+    """
+    Worker loop: read payloads, match, write results.
+
+    Args:
+        request_spec / result_spec: SharedRing.spec() of this worker's rings
+        control: queue of (generation, rules, version) tuples, None = stop
+        normalizer_config: PayloadNormalizer.config_key(), or None for no normalization
+    """
+    requests = SharedRing.attach(request_spec)
+    results = SharedRing.attach(result_spec)
+    buf_in = requests.shm.buf
+    buf_out = results.shm.buf
+    normalizer = PayloadNormalizer(*normalizer_config) if normalizer_config else None
+    case_folded = bool(normalizer and normalizer.case_fold)
+    # every payload of a flow comes to this worker, its state is kept under the flow hash
+    http_parser = HttpRequestParser()
+
+    ruleset = None
+    generation = 0
+    since_check = 0
+
+    try:
+        while True:
+            # pick up ruleset updates (when idle, or every 256 packets)
+            if since_check >= 256 or ruleset is None:
+                since_check = 0
+                try:
+                    while True:
+                        message = control.get_nowait()
+                        if message is None:
+                            return
+                        generation, rules, version = message
+                        ruleset = CompiledRuleset(rules, version, case_folded=case_folded)
+                except queue.Empty:
+                    pass
+
+            if not requests.items.acquire(timeout=0.2):
+                since_check = 256
+                continue
+            since_check += 1
+
+            offset = requests.next_offset()
+            seq, flow, proto, src_port, dst_port, length = REQUEST.unpack_from(buf_in, offset)
+            start = offset + REQUEST.size
+            payload = bytes(buf_in[start:start + length])
+            requests.free.release()
+
+            rule_id = -1
+            if ruleset is not None:
+                proto = PROTOS[proto]
+                fields = None
+                if ruleset.fields and proto in (None, "tcp"):
+                    fields = request_fields(http_parser.parse(payload, flow or None), ruleset.fields, normalizer)
+                if normalizer and ruleset.scans_payload:
+                    payload = normalizer.normalize(payload)
+                rule_id = ruleset.match(payload, proto, src_port or None, dst_port or None, fields)
+
+            results.free.acquire()
+            RESULT.pack_into(buf_out, results.next_offset(), seq, generation, rule_id)
+            results.items.release()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        del buf_in, buf_out
+        requests.close()
+        results.close()
+
+
+# ============================================================
+# Pool (lives in the IDS process)
+# ============================================================
+
+class ScanPool:
+    """
+    Offloads SignatureScanning matching to worker processes.
+    """
+    def __init__(self, scanner, workers=2, slots=1024, slot_size=2048,
+                 overflow="inline", on_match=None):
+        """
+        Args:
+            scanner: SignatureScanning providing the rules (its hot-swaps are followed)
+            workers: number of worker processes
+            slots: slots per ring (per worker)
+            slot_size: bytes per request slot, bigger payloads are scanned inline
+            overflow: "inline" (scan in the caller) or "skip" when every ring is full
+            on_match: callback(context, (name, pattern, action)) for every match
+        """
+        self.scanner = scanner
+        self.workers = workers
+        self.slots = slots
+        self.slot_size = slot_size
+        self.max_payload = slot_size - REQUEST.size
+        self.overflow = overflow
+        self.on_match = on_match
+
+        self._ctx = multiprocessing.get_context("spawn")  # no fork() of a threaded process
+        self._processes = []
+        self._requests = []
+        self._results = []
+        self._controls = []
+        self._send_locks = []
+        self._collectors = []
+        self._running = False
+
+        self._seq = itertools.count()
+        self._pending = {}               # seq -> context, until the result comes back
+        self._next_worker = 0
+        self._ruleset = None             # last ruleset sent to the workers
+        self._generation = 0
+        self._generations = {}           # generation -> CompiledRuleset
+        self._sync_lock = threading.Lock()
+
+        # Statistics
+        self.queued_count = 0
+        self.inline_count = 0            # pool full, scanned in the caller
+        self.skipped_count = 0           # pool full, not scanned (overflow="skip")
+        self.oversize_count = 0          # payload bigger than a slot, scanned inline
+        self.result_count = 0
+        self.match_count = 0
+
+    def start(self):
+        """Create the rings and spawn the workers."""
+        if self._running:
+            return
+
+        normalizer = self.scanner.normalizer
+        normalizer_config = normalizer.config_key() if normalizer else None
+
+        for index in range(self.workers):
+            requests = SharedRing(self._ctx, self.slots, self.slot_size)
+            results = SharedRing(self._ctx, self.slots, RESULT.size)
+            control = self._ctx.Queue()
+            process = self._ctx.Process(
+                target=_worker_main,
+                args=(requests.spec(), results.spec(), control, normalizer_config),
+                daemon=True,
+                name=f"loki-scan-{index}"
+            )
+            process.start()
+
+            self._requests.append(requests)
+            self._results.append(results)
+            self._controls.append(control)
+            self._send_locks.append(threading.Lock())
+            self._processes.append(process)
+
+        self._running = True
+        self._sync_ruleset(self.scanner.ruleset)
+
+        for index in range(self.workers):
+            collector = threading.Thread(
+                target=self._collect_loop, args=(index,), daemon=True, name=f"scan-results-{index}"
+            )
+            collector.start()
+            self._collectors.append(collector)
+
+        print(f"[*] Signature scan pool started: {self.workers} worker(s), "
+              f"{self.slots} slots x {self.slot_size} bytes per ring")
+
+    def stop(self, timeout=2.0):
+        """Stop the workers and free the shared memory."""
+        if not self._running:
+            return
+        self._running = False
+
+        for control in self._controls:
+            control.put(None)
+        for process in self._processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+        for collector in self._collectors:
+            collector.join(timeout)
+
+        for ring in self._requests + self._results:
+            ring.close(unlink=True)
+
+        self._processes, self._requests, self._results = [], [], []
+        self._controls, self._send_locks, self._collectors = [], [], []
+
+    def _sync_ruleset(self, ruleset):
+        """Send a newly published ruleset to every worker."""
+        with self._sync_lock:
+            if ruleset is self._ruleset:
+                return
+            self._generation += 1
+            self._generations[self._generation] = ruleset
+            self._generations.pop(self._generation - RULESETS_KEPT, None)
+            self._ruleset = ruleset
+
+            message = (self._generation, ruleset.rules, ruleset.version)
+            for control in self._controls:
+                control.put(message)
+
+    def submit(self, payload, proto=None, src_port=None, dst_port=None, context=None, flow=None):
+        """
+        Queue one payload for scanning. Never blocks.
+
+        Args:
+            payload: raw payload bytes
+            proto, src_port, dst_port: packet headers (select rule groups)
+            context: anything, handed back to on_match (e.g. the packet's addresses)
+            flow: optional FlowRecord or hashable flow key; the flow's payloads all go
+                  to one worker, so HTTP requests split over several packets are followed
+
+        Returns:
+            bool: True if a worker will scan it, False if it was handled inline or skipped
+        """
+        ruleset = self.scanner.ruleset
+        if ruleset is not self._ruleset:
+            self._sync_ruleset(ruleset)
+
+        if len(payload) > self.max_payload:
+            self.oversize_count += 1
+            self._scan_inline(payload, proto, src_port, dst_port, context, flow)
+            return False
+
+        ruleset.count_scanned(len(payload), proto, src_port, dst_port)
+        if self.scanner.profile_due():
+            self.scanner.profile(ruleset, payload)
+
+        flow_hash = 0
+        if flow is not None:
+            # a flow sticks to one worker (its parser holds the flow's HTTP state)
+            flow_hash = hash(flow.key if isinstance(flow, FlowRecord) else flow) & 0xFFFFFFFFFFFFFFFF or 1
+            start, attempts = flow_hash % self.workers, 1
+        else:
+            # first worker with a free slot, starting from the next in line
+            start, attempts = self._next_worker, self.workers
+        for attempt in range(attempts):
+            index = (start + attempt) % self.workers
+            requests = self._requests[index]
+            if not requests.free.acquire(False):
+                continue  # this worker is behind, try the next one
+
+            seq = next(self._seq) & 0xFFFFFFFF
+            self._pending[seq] = context
+            with self._send_locks[index]:
+                offset = requests.next_offset()
+                REQUEST.pack_into(
+                    requests.shm.buf, offset, seq, flow_hash, PROTO_CODES.get(proto, 4),
+                    src_port or 0, dst_port or 0, len(payload)
+                )
+                body = offset + REQUEST.size
+                requests.shm.buf[body:body + len(payload)] = payload
+            requests.items.release()
+
+            if not flow_hash:
+                self._next_worker = (index + 1) % self.workers
+            self.queued_count += 1
+            return True
+
+        # every ring is full: degrade instead of blocking the NFQUEUE thread
+        if self.overflow == "inline":
+            self.inline_count += 1
+            self._scan_inline(payload, proto, src_port, dst_port, context, flow)
+        else:
+            self.skipped_count += 1
+        return False
+
+    def _scan_inline(self, payload, proto, src_port, dst_port, context, flow=None):
+        name, pattern, action = self.scanner.CheckPacketPayload(payload, proto, src_port, dst_port, flow=flow)
+        if name:
+            self.match_count += 1
+            if self.on_match:
+                self.on_match(context, (name, pattern, action))
+
+    def _collect_loop(self, index):
+        """Read results of one worker and report the matches."""
+        results = self._results[index]
+        buf = results.shm.buf
+        while self._running:
+            if not results.items.acquire(timeout=0.2):
+                continue
+
+            seq, generation, rule_id = RESULT.unpack_from(buf, results.next_offset())
+            results.free.release()
+            self.result_count += 1
+
+            context = self._pending.pop(seq, None)
+            if rule_id < 0:
+                continue
+
+            ruleset = self._generations.get(generation)
+            if ruleset is None:
+                continue  # too old, the rule IDs can't be resolved anymore
+
+            ruleset.stats.record_match(rule_id)
+            self.match_count += 1
+            if self.on_match:
+                try:
+                    self.on_match(context, ruleset.results[rule_id])
+                except Exception as e:
+                    print(f"[!] ERROR in scan pool match callback: {e}")
+        del buf
+
+    def wait_idle(self, timeout=5.0):
+        """Wait until every queued payload has a result (benchmarks, shutdown)."""
+        deadline = time.time() + timeout
+        while self._pending and time.time() < deadline:
+            time.sleep(0.001)
+        return not self._pending
+
+    def get_stats(self):
+        """Get pool statistics"""
+        submitted = self.queued_count + self.inline_count + self.skipped_count + self.oversize_count
+        return {
+            'workers': self.workers,
+            'alive': sum(1 for process in self._processes if process.is_alive()),
+            'queued': self.queued_count,
+            'in_flight': len(self._pending),
+            'inline': self.inline_count,
+            'skipped': self.skipped_count,
+            'oversize': self.oversize_count,
+            'matches': self.match_count,
+            'offload_rate': f"{(self.queued_count / max(1, submitted)) * 100:.1f}%",
+            'generation': self._generation,
+        }
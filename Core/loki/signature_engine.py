@@ -1,8 +1,391 @@
 # Signature detection engine
 # Now uses API integration instead of direct database access
 
+import threading
+import time
+from array import array
+from datetime import datetime
+
 # Import API integration client (sends HTTP requests to Web Interface)
 from db_integration import db_integration
+from ruleset_cache import ruleset_content_hash
+from http_parser import HttpRequestParser, request_fields
+
+
+# ============================================================
+# Compiled ruleset + atomic hot-swap
+# ============================================================
+# The packet threads never touch a ruleset that is being built.
+#
+#   1. A background thread long-polls the API for ruleset changes.
+#   2. When the ETag changes it fetches the signatures and compiles a
+#      brand new CompiledRuleset (immutable once built).
+#   3. It publishes it with ONE attribute assignment:
+#          self.ruleset = new_ruleset
+#      Under the GIL that assignment is atomic, so a packet thread sees
+#      either the old ruleset or the new one, never a half-built one.
+#
+# CheckPacketPayload reads self.ruleset exactly once per packet, so no
+# lock is needed and there is no pause while rules are rebuilt.
+# ============================================================
+
+
+# ============================================================
+# Per-rule hit counters
+# ============================================================
+# Every CompiledRuleset owns a RuleStats. A rule ID is simply the rule's
+# position in the ruleset, so the counters are flat typed arrays indexed
+# by rule ID (8 bytes per rule per counter, no dicts on the packet path):
+#
+#   matches[i]      packets that matched rule i
+#   last_match[i]   unix time of the last match of rule i (0 = never)
+#   cost_ns[i]      time spent in rule i on the profiled packets
+#   group_bytes[g]  payload bytes scanned by rule group g
+#
+# The counters live WITH the ruleset, so a hot-swap can never pair rule
+# IDs from one ruleset with the counters of another.
+#
+# Cost profiling: timing every rule on every packet would cost more than
+# the matching itself, so only one packet every `profile_every` is timed
+# rule by rule (perf_counter_ns around each needle).
+#
+# Increments are not locked: the input and forward threads can lose the
+# odd increment under contention, which is fine for statistics.
+# ============================================================
+
+class RuleStats:
+    """
+    Hit counters and sampled cost of the rules of one CompiledRuleset.
+    """
+    def __init__(self, rule_count, group_count=1):
+        """
+        Args:
+            rule_count: number of rules in the ruleset
+            group_count: number of rule groups
+        """
+        self.matches = array('Q', [0]) * rule_count
+        self.last_match = array('d', [0.0]) * rule_count
+        self.cost_ns = array('Q', [0]) * rule_count
+        self.group_bytes = array('Q', [0]) * group_count
+        self.profiled_packets = 0
+
+        # values at the last flush, to send deltas
+        self._flushed_matches = array('Q', self.matches)
+        self._flushed_cost_ns = array('Q', self.cost_ns)
+        self._flushed_group_bytes = array('Q', self.group_bytes)
+        self._flushed_profiled = 0
+        self._flushed_last_match = array('d', self.last_match)
+
+    def record_match(self, rule_id):
+        """Count one match of rule `rule_id`."""
+        self.matches[rule_id] += 1
+        self.last_match[rule_id] = time.time()
+
+    def collect_deltas(self, rules, rule_groups):
+        """
+        Counter changes since the previous call.
+
+        Args:
+            rules: rule dicts of the ruleset (for the names)
+            rule_groups: group index of every rule
+
+        Returns:
+            dict: rule name -> [matches, bytes_scanned, cost_ns, profiled_packets, last_match]
+                  (only rules whose counters moved)
+        """
+        # snapshot first, the packet threads keep counting while we diff
+        matches = array('Q', self.matches)
+        cost_ns = array('Q', self.cost_ns)
+        group_bytes = array('Q', self.group_bytes)
+        last_match = array('d', self.last_match)
+        profiled = self.profiled_packets
+
+        profiled_delta = profiled - self._flushed_profiled
+        group_delta = [now - before for now, before in zip(group_bytes, self._flushed_group_bytes)]
+
+        deltas = {}
+        for i, rule in enumerate(rules):
+            match_delta = matches[i] - self._flushed_matches[i]
+            bytes_delta = group_delta[rule_groups[i]]
+            cost_delta = cost_ns[i] - self._flushed_cost_ns[i]
+            if match_delta or bytes_delta or cost_delta or profiled_delta:
+                changed = last_match[i] != self._flushed_last_match[i]
+                deltas[rule['name']] = [
+                    match_delta, bytes_delta, cost_delta, profiled_delta,
+                    last_match[i] if changed else None
+                ]
+
+        self._flushed_matches = matches
+        self._flushed_cost_ns = cost_ns
+        self._flushed_group_bytes = group_bytes
+        self._flushed_last_match = last_match
+        self._flushed_profiled = profiled
+        return deltas
+
+
+# ============================================================
+# Rule groups
+# ============================================================
+# A rule can be restricted to a protocol and to source/destination
+# ports (the Snort/Suricata subset we import). Rules sharing the same
+# (proto, src_ports, dst_ports) form a group, so those checks run once
+# per group per packet instead of once per rule. Imported rule files
+# use a handful of headers, so there are only a few groups.
+#
+# Inside a group:
+#   plain        (needle, rule_id)                      needle in payload
+#   constrained  (needle, rule_id, nocase, start, end)  nocase / offset / depth
+#
+# offset/depth apply to the buffer the matcher runs on, i.e. to the
+# NORMALIZED payload when a normalizer is set.
+# ============================================================
+
+ANY = "any"
+
+
+def parse_ports(spec):
+    """
+    Parse a port spec: "any", "80", "80,443", "1024:", ":1023", "!22".
+
+    Returns:
+        None for any port, otherwise (negated, ports) where ports is a
+        frozenset (small specs) or a tuple of (low, high) ranges
+    """
+    if not spec or spec == ANY:
+        return None
+
+    negated = spec.startswith('!')
+    if negated:
+        spec = spec[1:]
+
+    ranges = []
+    for item in spec.split(','):
+        if ':' in item:
+            low, high = item.split(':', 1)
+            ranges.append((int(low) if low else 0, int(high) if high else 65535))
+        elif item:
+            ranges.append((int(item), int(item)))
+
+    # small specs become a set, one hash lookup per packet
+    if sum(high - low + 1 for low, high in ranges) <= 4096:
+        return negated, frozenset(port for low, high in ranges for port in range(low, high + 1))
+    return negated, tuple(ranges)
+
+
+def port_matches(ports, port):
+    """Does `port` satisfy a spec returned by parse_ports()."""
+    if ports is None:
+        return True
+    if port is None:
+        return False  # port-restricted rule vs. a packet without ports (ICMP)
+
+    negated, allowed = ports
+    if isinstance(allowed, frozenset):
+        found = port in allowed
+    else:
+        found = any(low <= port <= high for low, high in allowed)
+    return found != negated
+
+
+class RuleGroup:
+    """Rules sharing the same proto / port constraints and target field."""
+    __slots__ = ("name", "proto", "src_ports", "dst_ports", "field", "plain", "constrained")
+
+    def __init__(self, proto, src_ports, dst_ports, field, plain, constrained):
+        self.name = f"{proto} {src_ports} -> {dst_ports}"
+        if field != ANY:
+            self.name += f" [http {field}]"
+        self.proto = None if proto == ANY else proto
+        self.field = None if field == ANY else field
+        self.src_ports = parse_ports(src_ports)
+        self.dst_ports = parse_ports(dst_ports)
+        self.plain = tuple(plain)
+        self.constrained = tuple(constrained)
+
+    def accepts(self, proto, src_port, dst_port):
+        """Should a packet with these headers be scanned by this group."""
+        if self.proto is not None and proto != self.proto:
+            return False
+        return port_matches(self.src_ports, src_port) and port_matches(self.dst_ports, dst_port)
+
+
+class CompiledRuleset:
+    """
+    Immutable, ready-to-match set of rules.
+    Never modified after __init__ - build a new one instead.
+    """
+    def __init__(self, rules, version=None, content_hash=None, build_time_ms=0.0,
+                 source="api", case_folded=False):
+        """
+        Args:
+            rules: iterable of compiled rule dicts (pattern_bytes already normalized)
+            version: ruleset ETag reported by the API (None = unknown)
+            content_hash: hash of the rule contents (key of the on-disk cache)
+            build_time_ms: how long compiling/loading took
+            source: "api" or "cache"
+            case_folded: payloads are already lowercased by the normalizer
+                         (nocase rules need no extra work)
+        """
+        self.rules = tuple(rules)
+        self.results = tuple(
+            (rule['name'], rule['pattern'], rule['action']) for rule in self.rules
+        )
+
+        # hot loop only needs (needle, rule ID) tuples grouped by header,
+        # pre-built so the packet path does no dict lookups
+        grouped = {}
+        for rule_id, rule in enumerate(self.rules):
+            key = (
+                rule.get('proto') or ANY, rule.get('src_ports') or ANY,
+                rule.get('dst_ports') or ANY, rule.get('field') or ANY
+            )
+            plain, constrained = grouped.setdefault(key, ([], []))
+
+            nocase = bool(rule.get('nocase')) and not case_folded
+            offset = rule.get('offset') or 0
+            depth = rule.get('depth')
+            if nocase or offset or depth:
+                constrained.append((
+                    rule['pattern_bytes'].lower() if nocase else rule['pattern_bytes'],
+                    rule_id, nocase, offset, offset + depth if depth else None
+                ))
+            else:
+                plain.append((rule['pattern_bytes'], rule_id))
+
+        self.groups = tuple(
+            RuleGroup(proto, src_ports, dst_ports, field, plain, constrained)
+            for (proto, src_ports, dst_ports, field), (plain, constrained) in grouped.items()
+        )
+        # HTTP fields used by some rule (empty = no HTTP parsing needed)
+        self.fields = frozenset(group.field for group in self.groups if group.field)
+        # does any group scan the whole payload
+        self.scans_payload = any(group.field is None for group in self.groups)
+        self.group_names = tuple(group.name for group in self.groups)
+        self.rule_groups = array('H', [0]) * len(self.rules)
+        for group_id, group in enumerate(self.groups):
+            for entry in group.plain + group.constrained:
+                self.rule_groups[entry[1]] = group_id
+
+        self.stats = RuleStats(len(self.rules), len(self.groups))
+        self.version = version
+        self.content_hash = content_hash
+        self.build_time_ms = build_time_ms
+        self.source = source
+        self.case_folded = case_folded
+        self.compiled_at = datetime.utcnow().isoformat()
+
+    @classmethod
+    def compile(cls, signatures, normalizer=None, version=None):
+        """
+        Compile signature dicts into a ruleset.
+
+        Args:
+            signatures: list of dicts with keys: name, pattern, action, description
+                        and optionally proto, src_ports, dst_ports, nocase, offset, depth
+            normalizer: optional PayloadNormalizer applied to the patterns
+            version: ruleset ETag reported by the API (None = unknown)
+        """
+        start = time.perf_counter()
+
+        rules = []
+        for sig in signatures:
+            pattern_bytes = sig['pattern'].encode('utf-8')
+            if normalizer:
+                # patterns must live in the same normalized space as payloads
+                pattern_bytes = normalizer.normalize_pattern(pattern_bytes)
+
+            rules.append({
+                'name': sig['name'],
+                'pattern': sig['pattern'],
+                'pattern_bytes': pattern_bytes,
+                'action': sig['action'],
+                'description': sig.get('description', ''),
+                'proto': sig.get('proto') or ANY,
+                'src_ports': sig.get('src_ports') or ANY,
+                'dst_ports': sig.get('dst_ports') or ANY,
+                'nocase': bool(sig.get('nocase')),
+                'offset': sig.get('offset'),
+                'depth': sig.get('depth'),
+                'field': sig.get('field') or ANY,
+            })
+
+        content_hash = ruleset_content_hash(signatures, normalizer)
+        return cls(rules, version, content_hash, (time.perf_counter() - start) * 1000,
+                   case_folded=bool(normalizer and normalizer.case_fold))
+
+    def match(self, payload, proto=None, src_port=None, dst_port=None, fields=None):
+        """
+        Args:
+            payload: buffer to scan (already normalized)
+            proto: "tcp", "udp", "icmp"... (None = unknown, no group filtering)
+            src_port, dst_port: packet ports (None for ICMP)
+            fields: HTTP field buffers (see http_parser.request_fields), None = not HTTP
+
+        Returns:
+            int: rule ID of the first matching rule, or -1
+        """
+        group_bytes = self.stats.group_bytes
+        folded = {}
+
+        for group_id, group in enumerate(self.groups):
+            if proto is not None and not group.accepts(proto, src_port, dst_port):
+                continue
+
+            buffer = payload
+            if group.field is not None:
+                buffer = fields.get(group.field) if fields else None
+                if buffer is None:
+                    continue  # not an HTTP request, or it has no such field
+            group_bytes[group_id] += len(buffer)
+
+            for needle, rule_id in group.plain:
+                if needle in buffer:
+                    return rule_id
+
+            for needle, rule_id, nocase, start, end in group.constrained:
+                if nocase:
+                    lowered = folded.get(group.field)
+                    if lowered is None:
+                        lowered = folded[group.field] = buffer.lower()
+                    if lowered.find(needle, start, end) != -1:
+                        return rule_id
+                elif buffer.find(needle, start, end) != -1:
+                    return rule_id
+        return -1
+
+    def count_scanned(self, size, proto=None, src_port=None, dst_port=None):
+        """
+        Add `size` bytes to the groups that would scan this packet
+        (for callers that match elsewhere, e.g. the scan pool).
+        """
+        group_bytes = self.stats.group_bytes
+        for group_id, group in enumerate(self.groups):
+            # HTTP field groups scan a slice the caller doesn't know the size of
+            if group.field is None and (proto is None or group.accepts(proto, src_port, dst_port)):
+                group_bytes[group_id] += size
+
+    def profile(self, payload):
+        """
+        Time every rule against `payload` and add it to the cost counters.
+        Only called on sampled packets. HTTP field rules are timed on the
+        whole payload too (an upper bound of their cost).
+        """
+        cost_ns = self.stats.cost_ns
+        clock = time.perf_counter_ns
+        folded = payload.lower()
+        for group in self.groups:
+            for needle, rule_id in group.plain:
+                start = clock()
+                needle in payload
+                cost_ns[rule_id] += clock() - start
+            for needle, rule_id, nocase, begin, end in group.constrained:
+                start = clock()
+                (folded if nocase else payload).find(needle, begin, end)
+                cost_ns[rule_id] += clock() - start
+        self.stats.profiled_packets += 1
+
+    def __len__(self):
+        return len(self.rules)
 
 
 class SignatureScanning:
@@ -11,11 +394,80 @@ class SignatureScanning:
 
     This class loads signatures from the Web Interface API.
     """
-    def __init__(self):
+    def __init__(self, normalizer=None, cache=None, autoload=True):
+        """
+        Args:
+            normalizer: optional PayloadNormalizer. When set, payloads AND
+                        rule patterns are normalized before matching.
+            cache: optional RulesetCache. When set, the IDS boots from the
+                   cached ruleset and reconciles with the API in the background.
+            autoload: load the rules (cache or API) right away. False for
+                      offline use (benchmarks, test bench): call build_rules().
+        """
         # the dict will be : RULE_ID -> (description, data, action, rule id)
         self.rule = {"TEST_RULE" : ("test malicious rule", b"ATTACK_TEST", True, "ID1 TEST_RULE")} # just for testing..
-        self.rules = []
-        self.load_rules()
+        self.normalizer = normalizer
+        self.cache = cache
+        # splits HTTP requests for rules that target a field (uri, header, ...)
+        self.http_parser = HttpRequestParser()
+
+        # the currently published ruleset (swapped atomically, see above)
+        self.ruleset = CompiledRuleset.compile([], normalizer)
+
+        # hot-swap statistics
+        self.swap_count = 0
+        self.last_swap_time = None
+
+        # background reload thread
+        self._watcher = None
+        self._stop_event = threading.Event()
+        self.poll_timeout = 25        # seconds the API may hold a change request
+        self.retry_interval = 5       # seconds to wait after an API error
+
+        # per-rule counters (see RuleStats)
+        self.profile_every = 1000     # time each rule on one packet out of N
+        self._packet_count = 0
+        self._retired = []            # swapped-out rulesets with counters not flushed yet
+        self._unsent = {}             # deltas the API did not accept yet
+        self._flush_lock = threading.Lock()
+
+        # Fast boot: last known rules from disk, the watcher reconciles with the API later.
+        # No cache (first boot): block on the API like before.
+        if autoload and not self.load_cached_rules():
+            self.load_rules()
+
+    @property
+    def rules(self):
+        """Rules of the active ruleset."""
+        return self.ruleset.rules
+
+    def load_cached_rules(self):
+        """
+        Publish the ruleset stored in the on-disk cache.
+
+        Returns:
+            bool: True if a cached ruleset is now active
+        """
+        if not self.cache:
+            return False
+
+        cached = self.cache.load()
+        if not cached:
+            return False
+
+        # the cached patterns were normalized with a specific config, make sure it still applies
+        if cached['normalizer'] != self._normalizer_key():
+            print("[!] Ignoring ruleset cache: built with a different normalizer config")
+            return False
+
+        self._publish(CompiledRuleset(
+            cached['rules'], cached['version'], cached['content_hash'],
+            cached['load_ms'], source="cache",
+            case_folded=bool(self.normalizer and self.normalizer.case_fold)
+        ))
+        print(f"[*] Loaded {len(self.rules)} rules from cache in {cached['load_ms']:.1f} ms "
+              f"(version {cached['version']})")
+        return True
 
     def load_rules(self):
         """
@@ -23,30 +475,59 @@ class SignatureScanning:
         Only loads enabled signatures.
         """
         try:
+            # Ask for the version first: if the rules change while we download
+            # them, the watcher sees a newer ETag and simply rebuilds again.
+            version_info = db_integration.get_ruleset_version()
+            version = version_info.get('etag') if version_info else None
+
             # Get enabled signatures from API
             signatures = db_integration.get_signatures(enabled_only=True)
-            
-            # Clear existing rules
-            self.rules = []
-            
-            # Convert database signatures to rule format
-            for sig in signatures:
-                rule = {
-                    'name': sig['name'],
-                    'pattern': sig['pattern'],
-                    'pattern_bytes': sig['pattern'].encode('utf-8'),
-                    'action': sig['action'],
-                    'description': sig.get('description', '')
-                }
-                self.rules.append(rule)
+            if signatures is None:
+                print(f"[!] API not reachable, keeping the current {len(self.rules)} rules.")
+                return
+
+            self.build_rules(signatures, version=version)
 
             print(f"[*] Loading of rules from API is done.")
             print(f"[*] Number of rules loaded is {len(self.rules)}.")
 
         except Exception as e:
             print(f"[!] ERROR while loading signatures from API: {e}")
-            self.rules = []  # Ensure rules list is empty on error
-    
+
+    def build_rules(self, signatures, version=None):
+        """
+        Compile signature dicts (as returned by the API) and publish them.
+
+        Args:
+            signatures: list of dicts with keys: name, pattern, action, description
+            version: ruleset ETag reported by the API
+
+        Returns:
+            CompiledRuleset: the ruleset that is now active
+        """
+        # compile off to the side...
+        ruleset = CompiledRuleset.compile(signatures, self.normalizer, version)
+
+        # ...then publish with a single reference assignment
+        self._publish(ruleset)
+
+        if self.cache:
+            self.cache.save(ruleset.rules, ruleset.content_hash, version, self._normalizer_key())
+
+        return ruleset
+
+    def _normalizer_key(self):
+        return self.normalizer.config_key() if self.normalizer else None
+
+    def _publish(self, ruleset):
+        """Make `ruleset` the active one (single atomic reference swap)."""
+        with self._flush_lock:
+            # keep the old counters around until the next flush
+            self._retired.append(self.ruleset)
+        self.ruleset = ruleset
+        self.swap_count += 1
+        self.last_swap_time = time.time()
+
     def reload_rules(self):
         """
         Reload rules from the Web Interface API.
@@ -56,18 +537,178 @@ class SignatureScanning:
         print(f"[*] Reloaded {len(self.rules)} signatures")
         return len(self.rules)
 
-    def CheckPacketPayload(self, payload):
+    # ===== Background hot-swap =====
+
+    def start_auto_reload(self, on_swap=None):
+        """
+        Start the background thread that follows ruleset changes in the API.
+
+        Args:
+            on_swap: optional callback(ruleset) called after a new ruleset is published
+        """
+        if self._watcher and self._watcher.is_alive():
+            return
+
+        self._stop_event.clear()
+        self._watcher = threading.Thread(
+            target=self._watch_loop, args=(on_swap,), daemon=True, name="ruleset-watcher"
+        )
+        self._watcher.start()
+
+    def stop_auto_reload(self):
+        """Stop the background reload thread."""
+        self._stop_event.set()
+
+    def _watch_loop(self, on_swap):
+        """Long-poll the API for ruleset changes and hot-swap on every change."""
+        while not self._stop_event.is_set():
+            if not db_integration.enabled:
+                # API was down at boot (we may be running on the cached rules),
+                # keep trying quietly until it comes up
+                if not db_integration.enable(quiet=True):
+                    self._stop_event.wait(self.retry_interval)
+                    continue
+
+            info = db_integration.wait_for_ruleset_change(self.ruleset.version, self.poll_timeout)
+            if info is None:
+                # API error, back off a bit
+                self._stop_event.wait(self.retry_interval)
+                continue
+
+            if info.get('etag') == self.ruleset.version:
+                continue  # poll timed out, nothing changed
+
+            try:
+                signatures = db_integration.get_signatures(enabled_only=True)
+                if signatures is None:
+                    self._stop_event.wait(self.retry_interval)
+                    continue
+
+                ruleset = self.build_rules(signatures, version=info.get('etag'))
+                print(
+                    f"[*] Signature ruleset swapped: version {ruleset.version} "
+                    f"({len(ruleset)} rules, built in {ruleset.build_time_ms:.1f} ms)"
+                )
+                self.report_ruleset()
+                if on_swap:
+                    on_swap(ruleset)
+            except Exception as e:
+                print(f"[!] ERROR while rebuilding signatures: {e}")
+                self._stop_event.wait(self.retry_interval)
+
+    def get_ruleset_info(self):
+        """Active ruleset version and rebuild stats (for logs and the dashboard)."""
+        ruleset = self.ruleset
+        return {
+            'version': ruleset.version,
+            'rules': len(ruleset),
+            'rebuild_ms': round(ruleset.build_time_ms, 2),
+            'compiled_at': ruleset.compiled_at,
+            'source': ruleset.source,
+            'swaps': self.swap_count,
+        }
+
+    def report_ruleset(self):
+        """Send the active ruleset info to the API so the dashboard can show it."""
+        if db_integration.enabled:
+            db_integration.report_ids_stats("signatures", self.get_ruleset_info())
+
+    def collect_rule_stats(self):
+        """
+        Per-rule counter deltas since the last call, including the
+        rulesets swapped out in between and any deltas the API refused.
+
+        Returns:
+            dict: rule name -> [matches, bytes_scanned, cost_ns, profiled_packets, last_match]
+        """
+        with self._flush_lock:
+            rulesets, self._retired = self._retired, []
+            rulesets.append(self.ruleset)
+
+            deltas, self._unsent = self._unsent, {}
+            for ruleset in rulesets:
+                stats = ruleset.stats.collect_deltas(ruleset.rules, ruleset.rule_groups)
+                self._merge_deltas(deltas, stats)
+            return deltas
+
+    @staticmethod
+    def _merge_deltas(into, deltas):
+        """Add `deltas` to `into` (same rule seen in an old and a new ruleset, or a retry)."""
+        for name, delta in deltas.items():
+            merged = into.get(name)
+            if merged is None:
+                into[name] = delta
+                continue
+            for i in range(4):
+                merged[i] += delta[i]
+            if delta[4] is not None:
+                merged[4] = max(merged[4] or 0, delta[4])
+
+    def flush_rule_stats(self):
+        """
+        Send the per-rule counter deltas to the API.
+
+        Returns:
+            int: number of rules reported
+        """
+        if not db_integration.enabled:
+            return 0
+
+        deltas = self.collect_rule_stats()
+        if not deltas:
+            return 0
+
+        if not db_integration.send_signature_stats(deltas):
+            # keep them for the next flush
+            with self._flush_lock:
+                self._merge_deltas(self._unsent, deltas)
+            return 0
+        return len(deltas)
+
+    def profile_due(self):
+        """Count a packet, True when it is the one in `profile_every` to time rule by rule."""
+        self._packet_count += 1
+        return self._packet_count % self.profile_every == 0
+
+    def profile(self, ruleset, payload):
+        """Time every rule of `ruleset` on a raw payload (normalized first)."""
+        if self.normalizer:
+            payload = self.normalizer.normalize(payload)
+        ruleset.profile(payload)
+
+    def CheckPacketPayload(self, payload, proto=None, src_port=None, dst_port=None, flow=None):
         # we should get the payload itself like pkt[Raw].load
-        # it won't matter if it's tcp or udp
+        # proto/ports select the rule groups that apply ("tcp", "udp", "icmp"),
+        # without them every rule is checked. flow (the FlowRecord, or a
+        # (src_ip, src_port, dst_ip, dst_port) key) lets the HTTP parser follow
+        # requests split over several packets.
         Rule = self.rule.get("TEST_RULE")
         try:
-            for rule in self.rules:
-                if rule.get('pattern_bytes') in payload:
-                    return rule.get('name'), rule.get('pattern'), rule.get('action')
-                    # note that if the packet matches many ruless, then now this code will return
-                    # only the first rule that matches, keep in mind that we need to modify it.
-            
+            # read the published ruleset ONCE, a swap in the middle of this
+            # packet can't affect us
+            ruleset = self.ruleset
+
+            fields = None
+            if ruleset.fields and proto in (None, "tcp"):
+                # cut out only the HTTP fields some rule targets (from the raw payload)
+                request = self.http_parser.parse(payload, flow)
+                fields = request_fields(request, ruleset.fields, self.normalizer)
+
+            if self.normalizer and ruleset.scans_payload:
+                # the matcher runs on the normalized buffer
+                payload = self.normalizer.normalize(payload)
+
+            if self.profile_due():
+                ruleset.profile(payload)
+
+            rule_id = ruleset.match(payload, proto, src_port, dst_port, fields)
+            if rule_id >= 0:
+                ruleset.stats.record_match(rule_id)
+                return ruleset.results[rule_id]
+                # note that if the packet matches many ruless, then now this code will return
+                # only the first rule that matches, keep in mind that we need to modify it.
+
         except Exception as e:
             print(f"[-] ERROR while checking the packet : {e}")
-            
+
         return 0,0,0
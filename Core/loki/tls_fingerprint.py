@@ -0,0 +1,286 @@
+# TLS ClientHello fingerprinting
+# Payload signatures see nothing but ciphertext on TLS flows. What IS
+# visible is the ClientHello: the server name (SNI) and the client's
+# cipher / extension choices, which identify the client software
+# (JA3). This module pulls those out and matches them against blocklists.
+
+import hashlib
+import os
+import struct
+
+import yaml
+
+
+# ============================================================
+# What runs per packet
+# ============================================================
+#   1. flow already seen?          -> verdict kept in its FlowRecord
+#   2. not a TLS port and the payload doesn't start like a handshake
+#      record (0x16 0x03)?         -> flow cached as "not TLS"
+#   3. parse the ClientHello straight from a memoryview (no copies
+#      except the few fields we keep), compute JA3, look the SNI (and
+#      its parent domains) and the JA3 hash up in two sets
+#   4. keep the verdict in the flow record (flow_table.py)
+#
+# A ClientHello bigger than one segment (post-quantum key shares make
+# Chrome's ~1.7 KB) is buffered until the record is complete.
+# ============================================================
+
+TLS_PORTS = frozenset((443, 465, 636, 853, 993, 995, 5061, 8443, 9443))
+
+HANDSHAKE = 0x16
+CLIENT_HELLO = 0x01
+EXT_SERVER_NAME = 0x0000
+EXT_SUPPORTED_GROUPS = 0x000a
+EXT_EC_POINT_FORMATS = 0x000b
+MAX_RECORD = 5 + 16384 + 2048   # record header + max plaintext + slack
+
+BLOCKLIST_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tls_blocklist.yaml")
+
+
+def is_grease(value):
+    """GREASE values (RFC 8701: 0x0a0a, 0x1a1a, ...) are random per client, JA3 skips them."""
+    return (value & 0x0f0f) == 0x0a0a and (value >> 8) == (value & 0xff)
+
+
+class ClientHello:
+    """Fields of a ClientHello that fingerprints are built from."""
+    __slots__ = ("version", "sni", "ciphers", "extensions", "groups", "point_formats", "_ja3")
+
+    def __init__(self, version, sni, ciphers, extensions, groups, point_formats):
+        self.version = version
+        self.sni = sni
+        self.ciphers = ciphers
+        self.extensions = extensions
+        self.groups = groups
+        self.point_formats = point_formats
+        self._ja3 = None
+
+    @property
+    def ja3_string(self):
+        """SSLVersion,Ciphers,Extensions,EllipticCurves,EllipticCurvePointFormats"""
+        return ",".join((
+            str(self.version),
+            "-".join(map(str, self.ciphers)),
+            "-".join(map(str, self.extensions)),
+            "-".join(map(str, self.groups)),
+            "-".join(map(str, self.point_formats)),
+        ))
+
+    @property
+    def ja3(self):
+        """MD5 of ja3_string (computed once)."""
+        if self._ja3 is None:
+            self._ja3 = hashlib.md5(self.ja3_string.encode("ascii"), usedforsecurity=False).hexdigest()
+        return self._ja3
+
+    def to_dict(self):
+        return {
+            "sni": self.sni,
+            "tls_version": self.version,
+            "ja3": self.ja3,
+            "ja3_string": self.ja3_string,
+        }
+
+
+def client_hello_length(payload):
+    """
+    Bytes the TLS record holding a ClientHello needs.
+
+    Returns:
+        int, or 0 if the payload doesn't start with a handshake record
+    """
+    if len(payload) < 6 or payload[0] != HANDSHAKE or payload[1] != 0x03 or payload[5] != CLIENT_HELLO:
+        return 0
+    return 5 + int.from_bytes(payload[3:5], "big")
+
+
+def _u16_list(data, pos, length):
+    """Big endian uint16 list of data[pos:pos + length], in one struct call."""
+    count = min(length, len(data) - pos) // 2
+    return struct.unpack_from(f">{count}H", data, pos)
+
+
+def parse_client_hello(payload):
+    """
+    Parse a ClientHello out of the first bytes of a TLS flow.
+
+    Args:
+        payload: bytes (or memoryview) starting at the TLS record header
+
+    Returns:
+        ClientHello, or None if the payload isn't a (complete enough) ClientHello
+    """
+    data = memoryview(payload)
+    try:
+        if client_hello_length(data) == 0:
+            return None
+        end = min(len(data), 5 + int.from_bytes(data[3:5], "big"))
+
+        # handshake header (4) + client_version (2) + random (32)
+        pos = 9
+        version = int.from_bytes(data[pos:pos + 2], "big")
+        pos += 34
+
+        session_len = data[pos]
+        pos += 1 + session_len
+
+        cipher_len = int.from_bytes(data[pos:pos + 2], "big")
+        pos += 2
+        ciphers = [value for value in _u16_list(data, pos, cipher_len) if not is_grease(value)]
+        pos += cipher_len
+
+        compression_len = data[pos]
+        pos += 1 + compression_len
+
+        sni = None
+        extensions, groups, point_formats = [], [], []
+        if pos + 2 <= end:
+            ext_end = min(end, pos + 2 + int.from_bytes(data[pos:pos + 2], "big"))
+            pos += 2
+            while pos + 4 <= ext_end:
+                ext_type, ext_len = struct.unpack_from(">HH", data, pos)
+                body = data[pos + 4:pos + 4 + ext_len]
+                pos += 4 + ext_len
+                if is_grease(ext_type):
+                    continue
+                extensions.append(ext_type)
+
+                if ext_type == EXT_SERVER_NAME and len(body) >= 5 and body[2] == 0:
+                    name_len = int.from_bytes(body[3:5], "big")
+                    sni = bytes(body[5:5 + name_len]).decode("ascii", "replace").lower()
+                elif ext_type == EXT_SUPPORTED_GROUPS and len(body) >= 2:
+                    groups = [value for value in _u16_list(body, 2, len(body) - 2) if not is_grease(value)]
+                elif ext_type == EXT_EC_POINT_FORMATS and len(body) >= 1:
+                    point_formats = list(body[1:1 + body[0]])
+
+        return ClientHello(version, sni, ciphers, extensions, groups, point_formats)
+    except (IndexError, struct.error):
+        return None  # truncated in the fixed part
+    finally:
+        data.release()
+
+
+def load_blocklist(path=BLOCKLIST_FILE):
+    """
+    Read a TLS blocklist YAML file (keys: sni, ja3).
+
+    Returns:
+        (set of SNI names, set of JA3 hashes), empty sets if the file is missing
+    """
+    try:
+        with open(path) as f:
+            data = yaml.safe_load(f) or {}
+    except FileNotFoundError:
+        return set(), set()
+    sni = {str(name).lower().strip(".") for name in data.get("sni") or []}
+    ja3 = {str(value).lower() for value in data.get("ja3") or []}
+    return sni, ja3
+
+
+class _FlowVerdict:
+    __slots__ = ("pending", "hello", "match")
+
+    def __init__(self):
+        self.pending = None     # partial ClientHello record
+        self.hello = None       # parsed ClientHello (None = not TLS)
+        self.match = None       # (kind, value) if blocklisted
+
+
+class TlsFingerprinter:
+    """
+    Fingerprints the ClientHello of each TLS flow once, the verdict stays in the flow record.
+    """
+    def __init__(self, blocked_sni=None, blocked_ja3=None, ports=TLS_PORTS):
+        """
+        Args:
+            blocked_sni: server names to alert on (parent domains match subdomains)
+            blocked_ja3: JA3 MD5 hashes to alert on
+            ports: destination ports where a ClientHello is expected (other
+                   ports are only checked when the payload looks like one)
+        """
+        self.blocked_sni = set(blocked_sni or ())
+        self.blocked_ja3 = set(blocked_ja3 or ())
+        self.ports = ports
+
+        # Statistics
+        self.hellos_parsed = 0
+        self.cache_hits = 0
+        self.matches = 0
+
+    @classmethod
+    def from_file(cls, path=BLOCKLIST_FILE, **kwargs):
+        """Build a fingerprinter with the blocklists of a YAML file."""
+        blocked_sni, blocked_ja3 = load_blocklist(path)
+        return cls(blocked_sni, blocked_ja3, **kwargs)
+
+    def inspect(self, payload, dst_port, flow):
+        """
+        Look at a TCP payload of `flow` (its FlowRecord).
+
+        Returns:
+            (ClientHello, (kind, value)) when the flow's ClientHello hits a
+            blocklist, only for the packet that completes the ClientHello;
+            None otherwise
+        """
+        verdict = flow.tls
+        if verdict is not None and verdict.pending is None:
+            self.cache_hits += 1
+            return None  # decided on an earlier segment
+
+        if verdict is None:
+            verdict = flow.tls = _FlowVerdict()
+            if dst_port not in self.ports and payload[:1] != b"\x16":
+                return None
+            data = payload
+        else:
+            data = verdict.pending + payload
+
+        needed = client_hello_length(data)
+        if needed > MAX_RECORD:
+            needed = 0
+        if needed and len(data) < needed:
+            verdict.pending = data  # rest of the ClientHello in the next segment
+            return None
+        verdict.pending = None
+        if not needed:
+            return None
+
+        hello = parse_client_hello(data)
+        if hello is None:
+            return None
+        self.hellos_parsed += 1
+        verdict.hello = hello
+        verdict.match = self.match(hello)
+        if verdict.match:
+            self.matches += 1
+            return hello, verdict.match
+        return None
+
+    def match(self, hello):
+        """
+        Check a ClientHello against the blocklists (hash set lookups only).
+
+        Returns:
+            ("sni", name) / ("ja3", hash), or None
+        """
+        if hello.sni and self.blocked_sni:
+            # evil.example.com is blocked by example.com too
+            name = hello.sni
+            while name:
+                if name in self.blocked_sni:
+                    return "sni", name
+                name = name.partition(".")[2]
+        if self.blocked_ja3 and hello.ja3 in self.blocked_ja3:
+            return "ja3", hello.ja3
+        return None
+
+    def get_stats(self):
+        """Get fingerprinter statistics"""
+        return {
+            'hellos_parsed': self.hellos_parsed,
+            'cache_hits': self.cache_hits,
+            'matches': self.matches,
+            'blocked_sni': len(self.blocked_sni),
+            'blocked_ja3': len(self.blocked_ja3),
+        }
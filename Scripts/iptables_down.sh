@@ -17,15 +17,22 @@ echo "[+] Deleting NFQUEUE rule(s) from FORWARD chain..."
 while sudo iptables -D FORWARD -j NFQUEUE --queue-num $QUEUE_NUM_FORWARD --queue-bypass 2>/dev/null; do
     echo "    -> Removed one FORWARD rule"
 done
+while sudo ip6tables -D FORWARD -j NFQUEUE --queue-num $QUEUE_NUM_FORWARD --queue-bypass 2>/dev/null; do
+    echo "    -> Removed one FORWARD rule (IPv6)"
+done
 
 # Delete ALL NFQUEUE rules from the INPUT chain
 echo "[+] Deleting NFQUEUE rule(s) from INPUT chain..."
 while sudo iptables -D INPUT -j NFQUEUE --queue-num $QUEUE_NUM_INPUT --queue-bypass 2>/dev/null; do
     echo "    -> Removed one INPUT rule"
 done
+while sudo ip6tables -D INPUT -j NFQUEUE --queue-num $QUEUE_NUM_INPUT --queue-bypass 2>/dev/null; do
+    echo "    -> Removed one INPUT rule (IPv6)"
+done
 
 # 2. VERIFICATION
 echo "[+] Remaining NFQUEUE rules (should be empty):"
 sudo iptables -L --line-numbers | grep NFQUEUE || echo "    (none - all clean!)"
+sudo ip6tables -L --line-numbers | grep NFQUEUE || echo "    (none - all clean, IPv6)"
 echo "------------------------------------------------------"
 echo "[+] IPTABLES cleanup complete."
\ No newline at end of file
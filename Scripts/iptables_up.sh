@@ -9,18 +9,23 @@ echo "======================================================"
 # 1. ENABLE IP FORWARDING 
 echo "[1/3] Enabling IP forwarding..."
 sudo sysctl -w net.ipv4.ip_forward=1
+sudo sysctl -w net.ipv6.conf.all.forwarding=1
 
 # 2. ADD NFQUEUE RULES FIRST (so localhost rules can be inserted ABOVE them)
 echo "[2/4] Inserting NFQUEUE rule to FORWARD chain with bypass..."
 sudo iptables -I FORWARD -j NFQUEUE --queue-num $QUEUE_NUM_FORWARD --queue-bypass
+sudo ip6tables -I FORWARD -j NFQUEUE --queue-num $QUEUE_NUM_FORWARD --queue-bypass
 
 echo "[2/4] Inserting NFQUEUE rule to INPUT chain (for traffic to the Pi itself) with bypass..."
 sudo iptables -I INPUT -j NFQUEUE --queue-num $QUEUE_NUM_INPUT --queue-bypass
+sudo ip6tables -I INPUT -j NFQUEUE --queue-num $QUEUE_NUM_INPUT --queue-bypass
 
 # 3. EXCLUDE LOCALHOST FROM INSPECTION (inserted AFTER so it goes ABOVE nfqueue)
 echo "[3/4] Excluding localhost traffic from inspection..."
 sudo iptables -I INPUT -i lo -j ACCEPT
 sudo iptables -I OUTPUT -o lo -j ACCEPT
+sudo ip6tables -I INPUT -i lo -j ACCEPT
+sudo ip6tables -I OUTPUT -o lo -j ACCEPT
 
 # 4. VERIFICATION
 echo "[4/4] Rules set. Localhost excluded, other packets sent to Queue $QUEUE_NUM_FORWARD & $QUEUE_NUM_INPUT."
@@ -29,4 +34,5 @@ echo " *** Printing the iptables rules *** "
 
 echo "------------------------------------------------------"
 sudo iptables -L --line-numbers | grep NFQUEUE
+sudo ip6tables -L --line-numbers | grep NFQUEUE
 echo "------------------------------------------------------"
@@ -176,6 +176,10 @@ async function loadDashboard() {
             statusText.textContent = 'IDS Offline';
         }
         
+        // Traffic skipped by the inspection policy
+        const idsStatsRes = await fetch(`${API_BASE}/system/ids-stats`);
+        updateBypassedTraffic((await idsStatsRes.json()).inspection_policy);
+        
         // Update charts
         updateAlertsByTypeChart(stats.alerts_by_type);
         updateTopIPsList(stats.top_attacking_ips);
@@ -185,11 +189,29 @@ async function loadDashboard() {
         const alertsData = await alertsRes.json();
         displayRecentAlerts(alertsData.alerts);
         
+        // Alerts grouped into attack campaigns by the IDS
+        const incidentsRes = await fetch(`${API_BASE}/incidents?page=1&page_size=10`);
+        displayIncidents((await incidentsRes.json()).incidents);
+        
     } catch (error) {
         console.error('Error loading dashboard:', error);
     }
 }
 
+function updateBypassedTraffic(policy) {
+    const value = document.getElementById('bypassedTraffic');
+    const detail = document.getElementById('bypassedDetail');
+    if (!policy) {
+        value.textContent = '-';
+        detail.textContent = 'IDS has not reported its inspection policy yet';
+        return;
+    }
+    const share = policy.bytes ? (policy.signature_bypassed_bytes / policy.bytes * 100).toFixed(1) : '0.0';
+    value.textContent = formatBytes(policy.signature_bypassed_bytes);
+    detail.textContent = `${policy.signature_bypassed_packets.toLocaleString()} pkts unscanned (${share}%) · `
+        + `${policy.behavior_bypassed_packets.toLocaleString()} pkts skip behavior · ${policy.rules} rule(s)`;
+}
+
 function updateAlertsByTypeChart(data) {
     // Store original data for filtering
     chartData = { ...data };
@@ -339,6 +361,41 @@ function displayRecentAlerts(alerts) {
     `).join('');
 }
 
+function displayIncidents(incidents) {
+    const container = document.getElementById('incidentsList');
+    if (!container) return;
+    
+    if (incidents.length === 0) {
+        container.innerHTML = '<p style="color: #888;">No incidents</p>';
+        return;
+    }
+    
+    container.innerHTML = incidents.map(incident => `
+        <div class="alert-item incident">
+            <div class="alert-info">
+                <div style="display: flex; align-items: center; gap: 10px; margin-bottom: 8px;">
+                    ${Object.keys(incident.kinds).map(kind => `<span class="badge subtype-badge">${kind.replace(/_/g, ' ')}</span>`).join('')}
+                    <span class="badge status-badge status-${incident.status.toLowerCase()}">${incident.status}</span>
+                </div>
+                <strong>${incident.summary || ''}</strong>
+                <br>
+                <small style="color: #888;">${incident.alert_count} attack(s) · ${incident.attackers} attacker(s): ${incident.attacker_sample.slice(0, 5).join(', ')}${incident.attackers > 5 ? ', …' : ''} · ${incident.victims} target(s): ${incident.victim_sample.slice(0, 5).join(', ')}${incident.victims > 5 ? ', …' : ''}</small>
+                <br>
+                <small style="color: #666;">${new Date(incident.first_seen + 'Z').toLocaleString()} → ${new Date(incident.last_seen + 'Z').toLocaleString()}</small>
+            </div>
+            <div class="item-actions">
+                <button class="btn-edit" onclick="showIncidentAlerts('${incident.incident_id}')">Alerts</button>
+            </div>
+        </div>
+    `).join('');
+}
+
+function showIncidentAlerts(incidentId) {
+    document.getElementById('incidentFilter').value = incidentId;
+    currentPage = 1;
+    document.querySelector('.tab-btn[data-tab="alerts"]').click();
+}
+
 // Alerts
 function changePageSize() {
     const newPageSize = parseInt(document.getElementById('pageSizeSelect').value);
@@ -367,6 +424,7 @@ async function loadAlerts() {
         const statusFilter = document.getElementById('alertStatusFilter')?.value || '';
         const srcIpFilter = document.getElementById('srcIpFilter')?.value || '';
         const dstIpFilter = document.getElementById('dstIpFilter')?.value || '';
+        const incidentFilter = document.getElementById('incidentFilter')?.value || '';
         
         // Update page size from selector if it exists
         const pageSizeSelect = document.getElementById('pageSizeSelect');
@@ -381,6 +439,7 @@ async function loadAlerts() {
         if (statusFilter) url += `&status=${statusFilter}`;
         if (srcIpFilter) url += `&src_ip=${encodeURIComponent(srcIpFilter)}`;
         if (dstIpFilter) url += `&dst_ip=${encodeURIComponent(dstIpFilter)}`;
+        if (incidentFilter) url += `&incident_id=${encodeURIComponent(incidentFilter.trim())}`;
         
         const res = await fetch(url);
         const data = await res.json();
@@ -475,6 +534,11 @@ async function loadSignatures(showFeedback = false) {
         const data = await res.json();
         const signatures = data.signatures || [];
         
+        loadRulesetStatus();
+        if (document.getElementById('noisyRulesReport').style.display !== 'none') {
+            loadNoisyRules();
+        }
+        
         const container = document.getElementById('signaturesList');
         if (signatures.length === 0) {
             container.innerHTML = '<p style="color: #888;">No signatures found</p>';
@@ -501,6 +565,8 @@ async function loadSignatures(showFeedback = false) {
                     <small style="color: #888;">Pattern: <code>${sig.pattern}</code></small>
                     <br>
                     <span class="badge action-badge action-alert">ALERT</span>
+                    ${formatSignatureConstraints(sig)}
+                    ${formatSignatureHits(sig.stats)}
                     ${sig.description ? `<br><small style="color: #666;">${sig.description}</small>` : ''}
                 </div>
                 <div class="item-actions">
@@ -524,6 +590,191 @@ async function loadSignatures(showFeedback = false) {
     }
 }
 
+// Active ruleset in the IDS vs. current ruleset in the database
+async function loadRulesetStatus() {
+    const container = document.getElementById('rulesetStatus');
+    try {
+        const [versionRes, statsRes] = await Promise.all([
+            fetch(`${API_BASE}/signatures/version`),
+            fetch(`${API_BASE}/system/ids-stats`)
+        ]);
+        const current = await versionRes.json();
+        const idsStats = await statsRes.json();
+        const active = idsStats.signatures;
+        
+        if (!active) {
+            container.innerHTML = `Database ruleset <code>${current.etag}</code> (${current.count} enabled) &middot; IDS has not reported its ruleset yet`;
+            return;
+        }
+        
+        const inSync = active.version === current.etag;
+        container.innerHTML = `
+            IDS ruleset <code>${active.version || 'unknown'}</code>
+            &middot; ${active.rules} rules
+            &middot; rebuilt in ${active.rebuild_ms} ms
+            &middot; ${active.swaps} swap(s)
+            &middot; <span class="${inSync ? 'ruleset-sync' : 'ruleset-pending'}">${inSync ? '✓ In sync' : 'Update pending'}</span>
+        `;
+    } catch (error) {
+        console.error('Error loading ruleset status:', error);
+        container.innerHTML = '';
+    }
+}
+
+// Proto / port / offset / HTTP field constraints
+function formatSignatureConstraints(sig) {
+    const parts = [];
+    if (sig.field && sig.field !== 'any') parts.push(`http ${sig.field}`);
+    if (sig.proto && sig.proto !== 'any') parts.push(sig.proto.toUpperCase());
+    if (sig.src_ports && sig.src_ports !== 'any') parts.push(`src ${sig.src_ports}`);
+    if (sig.dst_ports && sig.dst_ports !== 'any') parts.push(`dst ${sig.dst_ports}`);
+    if (sig.nocase) parts.push('nocase');
+    if (sig.offset !== null && sig.offset !== undefined) parts.push(`offset ${sig.offset}`);
+    if (sig.depth !== null && sig.depth !== undefined) parts.push(`depth ${sig.depth}`);
+    if (sig.sid) parts.push(`sid ${sig.sid}`);
+    return parts.length ? `<span class="signature-hits">${parts.join(' &middot; ')}</span>` : '';
+}
+
+// Per-rule hit counters reported by the IDS
+function formatSignatureHits(stats) {
+    if (!stats) return '';
+    const parts = [`${stats.matches.toLocaleString()} hit(s)`];
+    parts.push(stats.last_match ? `last ${new Date(stats.last_match + 'Z').toLocaleString()}` : 'never matched');
+    if (stats.avg_cost_ns !== null) parts.push(`~${(stats.avg_cost_ns / 1000).toFixed(2)} µs/packet`);
+    return `<span class="signature-hits">${parts.join(' &middot; ')}</span>`;
+}
+
+function formatBytes(bytes) {
+    if (bytes >= 1e9) return `${(bytes / 1e9).toFixed(2)} GB`;
+    if (bytes >= 1e6) return `${(bytes / 1e6).toFixed(2)} MB`;
+    if (bytes >= 1e3) return `${(bytes / 1e3).toFixed(1)} KB`;
+    return `${bytes} B`;
+}
+
+function toggleNoisyRules() {
+    const container = document.getElementById('noisyRulesReport');
+    const visible = container.style.display !== 'none';
+    container.style.display = visible ? 'none' : '';
+    if (!visible) loadNoisyRules();
+}
+
+// Noisy rules report: top matchers, most expensive rules, dead rules
+async function loadNoisyRules() {
+    const container = document.getElementById('noisyRulesReport');
+    try {
+        const res = await fetch(`${API_BASE}/signatures/noisy?limit=10`);
+        const report = await res.json();
+        
+        const list = (rules, format) => rules.length
+            ? `<ol>${rules.map(r => `<li><strong>${r.name}</strong> &middot; ${format(r)}</li>`).join('')}</ol>`
+            : '<p style="color: #888;">Nothing to report yet</p>';
+        
+        container.innerHTML = `
+            <div class="noisy-summary">
+                ${report.rules} enabled rules &middot; ${report.total_matches.toLocaleString()} matches
+                &middot; ${formatBytes(report.bytes_scanned)} scanned
+                &middot; ${report.dead_count} rule(s) never matched
+            </div>
+            <div>
+                <h4>Noisiest rules</h4>
+                ${list(report.noisy, r => `${r.matches.toLocaleString()} hits (${r.hits_per_mb}/MB)`)}
+            </div>
+            <div>
+                <h4>Most expensive rules</h4>
+                ${list(report.expensive, r => `~${(r.avg_cost_ns / 1000).toFixed(2)} µs/packet`)}
+            </div>
+            <div>
+                <h4>Dead rules</h4>
+                ${list(report.dead, r => `<code>${r.pattern}</code>`)}
+            </div>
+        `;
+    } catch (error) {
+        console.error('Error loading noisy rules report:', error);
+        container.innerHTML = '<p style="color: #888;">Could not load the noisy rules report</p>';
+    }
+}
+
+// ===== Signature test bench (ruleset vs. uploaded pcap) =====
+
+function toggleTestBench() {
+    const container = document.getElementById('testBench');
+    container.style.display = container.style.display !== 'none' ? 'none' : '';
+}
+
+document.getElementById('testBenchForm').addEventListener('submit', async (e) => {
+    e.preventDefault();
+    
+    const pcap = document.getElementById('testPcapInput').files[0];
+    const rules = document.getElementById('testRulesInput').files[0];
+    if (!pcap) return;
+    
+    const formData = new FormData();
+    formData.append('pcap', pcap);
+    if (rules) formData.append('rules', rules);
+    
+    const button = document.getElementById('testBenchRunBtn');
+    const result = document.getElementById('testBenchResult');
+    button.disabled = true;
+    result.innerHTML = `<p>Uploading ${pcap.name}...</p>`;
+    
+    try {
+        const res = await fetch(`${API_BASE}/signatures/test`, { method: 'POST', body: formData });
+        const job = await res.json();
+        if (!res.ok) throw new Error(job.detail || 'Failed to start the test');
+        await pollSignatureTest(job.id);
+    } catch (error) {
+        console.error('Error running signature test:', error);
+        result.innerHTML = `<p style="color: #ef4444;">${error.message}</p>`;
+    } finally {
+        button.disabled = false;
+    }
+});
+
+async function pollSignatureTest(jobId) {
+    const result = document.getElementById('testBenchResult');
+    while (true) {
+        const res = await fetch(`${API_BASE}/signatures/test/${jobId}`);
+        const job = await res.json();
+        if (!res.ok) throw new Error(job.detail || 'Test run not found');
+        
+        if (job.status === 'failed') throw new Error(`Test failed: ${job.error}`);
+        if (job.status === 'done') {
+            renderSignatureTest(job);
+            return;
+        }
+        result.innerHTML = `<p>Testing ${job.rules} rules (${job.ruleset}) on ${job.pcap}: `
+            + `${Math.round(job.progress * 100)}% &middot; ${job.packets.toLocaleString()} packets</p>`;
+        await new Promise(resolve => setTimeout(resolve, 1000));
+    }
+}
+
+function renderSignatureTest(job) {
+    const r = job.result;
+    const rows = r.top_rules.map(rule => `
+        <tr>
+            <td>${rule.name}</td>
+            <td>${rule.matches.toLocaleString()}</td>
+            <td>${(rule.hit_rate * 100).toFixed(2)}%</td>
+            <td>${formatBytes(rule.bytes_scanned)}</td>
+            <td>${rule.avg_cost_ns !== null ? (rule.avg_cost_ns / 1000).toFixed(2) + ' µs' : '-'}</td>
+        </tr>`).join('');
+    
+    document.getElementById('testBenchResult').innerHTML = `
+        <p>
+            <strong>${job.ruleset}</strong> (${r.rules} rules) on <strong>${job.pcap}</strong>:
+            ${r.payload_packets.toLocaleString()} payload packets &middot; ${formatBytes(r.payload_bytes)}
+            &middot; ${formatBytes(r.bytes_scanned)} scanned
+            &middot; <strong>${r.mb_per_s ?? '-'} MB/s</strong> (${(r.packets_per_s ?? 0).toLocaleString()} pkt/s)
+            &middot; ${r.alerts.toLocaleString()} alerts (${(r.alert_rate * 100).toFixed(2)}% of packets)
+            &middot; ${r.rules_matched} rule(s) matched
+        </p>
+        <table>
+            <thead><tr><th>Rule</th><th>Matches</th><th>Hit rate</th><th>Bytes scanned</th><th>Cost/packet</th></tr></thead>
+            <tbody>${rows}</tbody>
+        </table>
+    `;
+}
+
 function applySignatureFilters() {
     currentSignaturePage = 1; // Reset to first page when filtering
     loadSignatures();
@@ -640,6 +891,7 @@ async function editSignature(id) {
         document.getElementById('sigName').value = sig.name;
         document.getElementById('sigPattern').value = sig.pattern;
         document.getElementById('sigDescription').value = sig.description || '';
+        document.getElementById('sigField').value = sig.field || 'any';
         document.getElementById('sigEnabled').checked = sig.enabled;
         
         // Update modal title and button
@@ -662,6 +914,7 @@ document.getElementById('signatureForm').addEventListener('submit', async (e) =>
         pattern: document.getElementById('sigPattern').value,
         action: 'alert',  // Only alert action supported
         description: document.getElementById('sigDescription').value,
+        field: document.getElementById('sigField').value,
         enabled: document.getElementById('sigEnabled').checked
     };
     
@@ -782,6 +1035,47 @@ async function handleYamlFileUpload(event) {
     );
 }
 
+async function handleSnortFileUpload(event) {
+    const file = event.target.files[0];
+    if (!file) return;
+    
+    showConfirmModal(
+        'Import Snort/Suricata Rules',
+        `Import content rules from ${file.name}? Existing signatures with the same name are updated.`,
+        async () => {
+            try {
+                const formData = new FormData();
+                formData.append('file', file);
+                
+                const res = await fetch(`${API_BASE}/signatures/import/snort`, {
+                    method: 'POST',
+                    body: formData
+                });
+                
+                if (!res.ok) {
+                    const errorData = await res.json();
+                    throw new Error(errorData.detail || 'Failed to import rules');
+                }
+                
+                const data = await res.json();
+                const describe = counts => Object.entries(counts).map(([name, count]) => `${name} (${count})`).join(', ');
+                let message = `${data.message} in ${data.elapsed_ms} ms.`;
+                if (Object.keys(data.skipped).length) message += ` Skipped: ${describe(data.skipped)}.`;
+                if (Object.keys(data.unsupported).length) message += ` Unsupported options: ${describe(data.unsupported)}.`;
+                if (data.errors.length) message += ` First error: line ${data.errors[0].line}: ${data.errors[0].error}.`;
+                showConfirmModal('Import Finished', message, null, 'OK');
+                loadSignatures();
+            } catch (error) {
+                console.error('Error importing Snort rules:', error);
+                showConfirmModal('Error', `Error importing rules: ${error.message}`, null, 'OK');
+            } finally {
+                event.target.value = '';
+            }
+        },
+        'Import'
+    );
+}
+
 async function reloadSignatures() {
     // This function is kept for backward compatibility but now triggers file input
     document.getElementById('yamlFileInput').click();